@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import DebateRoom, DebateTurn
+from .models import ArchivedDebate, DebateReplay, DebateRoom, DebateTurn, PlayerRating, RoomEvent
 
 
 @admin.register(DebateRoom)
 class DebateRoomAdmin(admin.ModelAdmin):
-    list_display = ("room_code", "attacker_email", "defender_email", "created_at", "winner_email")
+    list_display = ("room_code", "attacker_email", "defender_email", "created_at", "winner_email", "state")
+    list_filter = ("state",)
     search_fields = ("room_code", "attacker_email", "defender_email")
 
 
@@ -12,3 +13,30 @@ class DebateRoomAdmin(admin.ModelAdmin):
 class DebateTurnAdmin(admin.ModelAdmin):
     list_display = ("room", "turn_number", "speaker", "speaker_role", "timestamp", "turn_score")
     list_filter = ("room", "speaker_role")
+
+
+@admin.register(PlayerRating)
+class PlayerRatingAdmin(admin.ModelAdmin):
+    list_display = ("email", "rating", "games", "wins", "losses", "draws", "updated_at")
+    search_fields = ("email",)
+
+
+@admin.register(ArchivedDebate)
+class ArchivedDebateAdmin(admin.ModelAdmin):
+    list_display = ("room", "turn_count", "attacker_score", "defender_score", "archived_at")
+    search_fields = ("room__room_code",)
+    exclude = ("payload",)
+
+
+@admin.register(DebateReplay)
+class DebateReplayAdmin(admin.ModelAdmin):
+    list_display = ("room", "turn_count", "duration_seconds", "version", "built_at")
+    search_fields = ("room__room_code",)
+    exclude = ("payload",)
+
+
+@admin.register(RoomEvent)
+class RoomEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "room", "kind", "actor", "created_at")
+    list_filter = ("kind",)
+    search_fields = ("room__room_code", "actor")
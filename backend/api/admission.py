@@ -0,0 +1,239 @@
+"""
+Admission control and load shedding.
+
+Under saturation, accepting more work slows everyone down; refusing a few
+new connects and expensive requests early keeps the rest fast. The
+controller watches three signals:
+
+  - loop lag: how late a short sleep on the event loop wakes up, measured
+    by one LoopLagMonitor task per loop (fast to rise, slow to decay);
+  - thread queue: work waiting for asgiref's sync_to_async executors, i.e.
+    sync views and database_sync_to_async calls that have no thread yet;
+  - in flight: HTTP requests and WebSocket connects being handled.
+
+``check(kind, priority)`` refuses when a signal is past its limit
+(ADMISSION_MAX_LOOP_LAG_MS, ADMISSION_MAX_THREAD_QUEUE,
+ADMISSION_MAX_INFLIGHT; 0 disables one) scaled by the priority's headroom:
+players reconnecting to a room that is live here get
+ADMISSION_RECONNECT_HEADROOM, new rooms and players 1, spectators
+ADMISSION_LOW_HEADROOM. Refusals carry a retry-after that grows with the
+overload. Consumers use AdmissionMixin (close code 1013, "try again
+later"). Views declare AdmissionThrottle, or LiveAdmissionThrottle for work
+inside a running debate (turns), in throttle_classes; AdmissionMiddleware
+reads the declaration and answers 503 with Retry-After before the request is
+queued for a thread. That is the only place HTTP requests are checked.
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import ADMISSION_INFLIGHT, ADMISSION_LOOP_LAG, ADMISSION_REJECTED, ADMISSION_THREAD_QUEUE
+
+PRIORITY_RECONNECT = "reconnect"
+PRIORITY_NEW = "new"
+PRIORITY_LOW = "low"
+
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.05, decay: float = 0.2):
+        self.interval = interval
+        self.decay = decay
+        self.lag = 0.0
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            late = max(0.0, time.monotonic() - started - self.interval)
+            self.lag = late if late > self.lag else self.lag + self.decay * (late - self.lag)
+
+
+_monitors = weakref.WeakKeyDictionary()
+_monitor_tasks = weakref.WeakKeyDictionary()
+
+
+def ensure_lag_monitor():
+    """Start the lag monitor of the running event loop if it is not running yet."""
+    loop = asyncio.get_running_loop()
+    task = _monitor_tasks.get(loop)
+    if task is None or task.done():
+        monitor = _monitors.setdefault(loop, LoopLagMonitor())
+        _monitor_tasks[loop] = loop.create_task(monitor.run())
+
+
+def loop_lag() -> float:
+    return max((monitor.lag for monitor in list(_monitors.values())), default=0.0)
+
+
+def thread_queue_depth() -> int:
+    """
+    Callables queued on asgiref's executors (and the loops' default executors)
+    without a thread yet. These are private attributes of asgiref and
+    ThreadPoolExecutor, so any that are missing or changed count as 0.
+    """
+    executors = [getattr(SyncToAsync, "single_thread_executor", None)]
+    try:
+        executors += list(getattr(SyncToAsync, "context_to_thread_executor", {}).values())
+    except (AttributeError, TypeError, RuntimeError):
+        # Resized by another thread while copying, or not a mapping; skip the per-request executors.
+        pass
+    executors += [getattr(loop, "_default_executor", None) for loop in list(_monitors.keys())]
+    depth = 0
+    for executor in executors:
+        try:
+            depth += int(executor._work_queue.qsize())
+        except (AttributeError, TypeError, ValueError, NotImplementedError):
+            continue
+    return depth
+
+
+@dataclass(frozen=True)
+class Decision:
+    admitted: bool
+    reason: str = ""
+    retry_after: float = 0.0
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_loop_lag: float = 0.25,
+        max_thread_queue: int = 64,
+        max_inflight: int = 400,
+        headroom: dict | None = None,
+        retry_after: float = 2.0,
+        max_retry_after: float = 30.0,
+        enabled: bool = True,
+    ):
+        self.limits = {"loop_lag": max_loop_lag, "thread_queue": max_thread_queue, "inflight": max_inflight}
+        self.headroom = headroom or {PRIORITY_RECONNECT: 2.0, PRIORITY_NEW: 1.0, PRIORITY_LOW: 0.5}
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.enabled = enabled
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_loop_lag=getattr(settings, "ADMISSION_MAX_LOOP_LAG_MS", 250) / 1000,
+            max_thread_queue=getattr(settings, "ADMISSION_MAX_THREAD_QUEUE", 64),
+            max_inflight=getattr(settings, "ADMISSION_MAX_INFLIGHT", 400),
+            headroom={
+                PRIORITY_RECONNECT: getattr(settings, "ADMISSION_RECONNECT_HEADROOM", 2.0),
+                PRIORITY_NEW: 1.0,
+                PRIORITY_LOW: getattr(settings, "ADMISSION_LOW_HEADROOM", 0.5),
+            },
+            retry_after=getattr(settings, "ADMISSION_RETRY_AFTER", 2),
+            max_retry_after=getattr(settings, "ADMISSION_MAX_RETRY_AFTER", 30),
+            enabled=getattr(settings, "ADMISSION_ENABLED", True),
+        )
+
+    @contextmanager
+    def tracking(self):
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def signals(self) -> dict:
+        return {"loop_lag": loop_lag(), "thread_queue": thread_queue_depth(), "inflight": self.inflight}
+
+    def check(self, kind: str, priority: str = PRIORITY_NEW) -> Decision:
+        """Admit or refuse one unit of ``kind`` work ("ws.connect", "http.<view>")."""
+        if not self.enabled:
+            return Decision(True)
+        headroom = self.headroom.get(priority, 1.0)
+        reason, worst = "", 1.0
+        for name, value in self.signals().items():
+            limit = self.limits[name]
+            if limit and value > limit * headroom:
+                ratio = value / (limit * headroom)
+                if ratio > worst or not reason:
+                    reason, worst = name, ratio
+        if not reason:
+            return Decision(True)
+        ADMISSION_REJECTED.labels(kind, reason).inc()
+        return Decision(False, reason, min(self.max_retry_after, self.retry_after * worst))
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController.from_settings()
+        return _controller
+
+
+def reset_admission():
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+
+class AdmissionThrottle(BaseThrottle):
+    """
+    Put in throttle_classes of expensive views to have AdmissionMiddleware
+    shed their writes (503 and Retry-After) while the process is overloaded.
+    The middleware does the check, before the view is queued for a thread,
+    so the throttle itself always allows.
+    """
+
+    priority = PRIORITY_NEW
+
+    def allow_request(self, request, view):
+        return True
+
+
+class LiveAdmissionThrottle(AdmissionThrottle):
+    """AdmissionThrottle for work in a debate already under way, which is shed last."""
+
+    priority = PRIORITY_RECONNECT
+
+
+class AdmissionMixin:
+    """
+    Consumer guard: ``if not await self.admit(priority): return`` at the top of
+    connect(). A refused socket gets an ``overloaded`` frame with retryAfter and
+    is closed with 1013. Connect handlers count as in flight while they run.
+    """
+
+    async def websocket_connect(self, message):
+        with get_admission().tracking():
+            await super().websocket_connect(message)
+
+    async def admit(self, priority: str = PRIORITY_NEW) -> bool:
+        ensure_lag_monitor()
+        decision = get_admission().check("ws.connect", priority)
+        if decision.admitted:
+            return True
+        await self.accept()
+        await self.send(text_data=json.dumps({
+            "type": "overloaded",
+            "reason": decision.reason,
+            "retryAfter": round(decision.retry_after, 1),
+        }))
+        await self.close(code=CLOSE_TRY_AGAIN_LATER)
+        return False
+
+
+ADMISSION_LOOP_LAG.set_function(loop_lag)
+ADMISSION_THREAD_QUEUE.set_function(thread_queue_depth)
+ADMISSION_INFLIGHT.set_function(lambda: _controller.inflight if _controller else 0)
@@ -6,3 +6,7 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals
+        import api.querybudget  # installs the per-connection query hook
+        from api.metrics import start_flusher
+
+        start_flusher()
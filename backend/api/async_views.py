@@ -0,0 +1,291 @@
+"""
+Async versions of the hot REST endpoints.
+
+DRF's APIView is sync-only, so under ASGI every request to views.py goes
+through asgiref's thread pool. These views are plain async Django views
+using the async ORM, with the same URLs, payloads and status codes as their
+counterparts in views.py. settings.ASYNC_VIEWS (off by default) picks which set urls.py
+serves; ``manage.py bench_async`` compares the two under load.
+"""
+import json
+import random
+import string
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, AuthenticationFailed, ParseError, Throttled
+from rest_framework.utils.encoders import JSONEncoder
+
+from .admission import AdmissionThrottle, LiveAdmissionThrottle
+from .clock import turn_refusal
+from .kinde_auth import verify_kinde_jwt
+from .lifecycle import aroom_turns, atouch, is_active
+from .models import DebateRoom, DebateTurn, UserProfile
+from . import profiling
+from .neon_store import store_transcript
+from .querybudget import query_budget
+from .ratelimit import PolicyThrottle, TurnThrottle, get_limiter
+from .serializers import DebateTurnSerializer
+
+
+def json_response(data, status: int = 200) -> JsonResponse:
+    # DRF's encoder, so dates render exactly as in the sync views.
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def agenerate_room_code(length: int = 6) -> str:
+    """Return a unique room code."""
+    while True:
+        code = "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
+        if not await DebateRoom.objects.filter(room_code=code).aexists():
+            return code
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """
+    Minimal async stand-in for APIView: request.data for JSON and form
+    bodies, DRF throttle classes, and DRF exceptions rendered the way DRF
+    renders them.
+    """
+
+    throttle_classes = []
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            self.data = self.parse(request)
+            await self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except AuthenticationFailed as exc:
+            # DRF answers 403 when the first authenticator sends no WWW-Authenticate.
+            return json_response({"detail": str(exc.detail)}, status=403)
+        except APIException as exc:
+            response = json_response({"detail": str(exc.detail)}, status=exc.status_code)
+            if getattr(exc, "wait", None):
+                response["Retry-After"] = str(int(exc.wait))
+            return response
+
+    async def check_throttles(self, request):
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            # Only policy throttles touch the limiter backend; the rest stay on the loop.
+            if isinstance(throttle, PolicyThrottle) and get_limiter().backend.blocking:
+                allowed = await sync_to_async(
+                    profiling.traced(throttle.allow_request), thread_sensitive=False
+                )(request, self)
+            else:
+                allowed = throttle.allow_request(request, self)
+            if not allowed:
+                raise Throttled(throttle.wait())
+
+    @staticmethod
+    def parse(request):
+        if request.method in ("GET", "HEAD", "OPTIONS"):
+            return {}
+        if request.content_type == "application/json":
+            try:
+                return json.loads(request.body or b"{}")
+            except ValueError as exc:
+                raise ParseError(f"JSON parse error - {exc}")
+        return request.POST
+
+
+class AsyncRoomCreateView(AsyncAPIView):
+    throttle_classes = [AdmissionThrottle]
+
+    @query_budget(3)
+    async def post(self, request):
+        email = self.data.get("email")
+        if not email:
+            return json_response({"detail": "Email is required"}, status=400)
+
+        room = await DebateRoom.objects.acreate(
+            room_code=await agenerate_room_code(),
+            attacker_email=email,
+            defender_email="",
+        )
+        return json_response(
+            {
+                "roomCode": room.room_code,
+                "attackerEmail": room.attacker_email,
+                "defenderEmail": room.defender_email,
+                "winnerEmail": room.winner_email,
+                "youAre": "ATTACKER",
+            },
+            status=201,
+        )
+
+
+class AsyncRoomJoinView(AsyncAPIView):
+    throttle_classes = [AdmissionThrottle]
+
+    @query_budget(2)
+    async def post(self, request, room_code: str):
+        email = self.data.get("email")
+        if not email:
+            return json_response({"detail": "Email is required"}, status=400)
+
+        try:
+            room = await DebateRoom.objects.aget(room_code=room_code)
+        except DebateRoom.DoesNotExist:
+            return json_response({"detail": "Room not found"}, status=404)
+
+        if email == room.attacker_email:
+            you_are = "ATTACKER"
+        elif email == room.defender_email:
+            you_are = "DEFENDER"
+        elif not is_active(room):
+            return json_response({"detail": "Room is closed"}, status=409)
+        elif not room.defender_email:
+            room.defender_email = email
+            room.state = DebateRoom.STATE_LIVE
+            room.last_activity_at = timezone.now()
+            await room.asave(update_fields=["defender_email", "state", "last_activity_at"])
+            you_are = "DEFENDER"
+        else:
+            return json_response({"detail": "Room already full"}, status=400)
+
+        return json_response(
+            {
+                "roomCode": room.room_code,
+                "attackerEmail": room.attacker_email,
+                "defenderEmail": room.defender_email,
+                "winnerEmail": room.winner_email,
+                "youAre": you_are,
+            }
+        )
+
+
+class AsyncRoomDetailView(AsyncAPIView):
+    @query_budget(2)
+    async def get(self, request, room_code: str):
+        try:
+            room = await DebateRoom.objects.aget(room_code=room_code)
+        except DebateRoom.DoesNotExist:
+            return json_response({"detail": "Room not found"}, status=404)
+
+        data = {
+            "roomCode": room.room_code,
+            "attackerEmail": room.attacker_email,
+            "defenderEmail": room.defender_email or None,
+            "winnerEmail": room.winner_email,
+            "createdAt": room.created_at,
+            "closedAt": room.closed_at,
+            "state": room.state,
+        }
+        if request.GET.get("include_turns") == "true":
+            data["turns"] = await aroom_turns(room)
+        return json_response(data)
+
+
+class AsyncRoomTurnsView(AsyncAPIView):
+    throttle_classes = [LiveAdmissionThrottle, TurnThrottle]
+
+    @query_budget(2)
+    async def get(self, request, room_code: str | None = None):
+        code = room_code or request.GET.get("room_code")
+        if not code:
+            return json_response({"error": "room_code is required"}, status=400)
+
+        try:
+            room = await DebateRoom.objects.aget(room_code=code)
+        except DebateRoom.DoesNotExist:
+            return json_response({"error": "Room not found"}, status=404)
+
+        return json_response({"turns": await aroom_turns(room)})
+
+    @query_budget(8)
+    async def post(self, request, room_code: str | None = None):
+        payload = verify_kinde_jwt(request)
+        kinde_id = payload.get("sub")
+        if not kinde_id:
+            raise AuthenticationFailed("Invalid Kinde token")
+
+        code = room_code or self.data.get("room_code")
+        speaker_user_id = self.data.get("speaker_user_id")
+        text = self.data.get("text")
+        speaker_role = (self.data.get("speaker_role") or "").upper()
+        duration = self.data.get("duration_seconds")
+
+        if not code or not speaker_user_id or not text:
+            return json_response(
+                {"error": "room_code, speaker_user_id, and text are required"}, status=400
+            )
+
+        try:
+            room = await DebateRoom.objects.aget(room_code=code)
+        except DebateRoom.DoesNotExist:
+            return json_response({"error": "Room not found"}, status=404)
+
+        if not is_active(room):
+            return json_response({"error": "Room is closed"}, status=409)
+
+        try:
+            speaker = await UserProfile.objects.aget(id=speaker_user_id)
+        except UserProfile.DoesNotExist:
+            return json_response({"error": "Speaker user not found"}, status=404)
+
+        if speaker.kinde_id != kinde_id:
+            return json_response({"error": "Token does not match speaker"}, status=403)
+
+        if duration not in (None, ""):
+            try:
+                duration = float(duration)
+            except (TypeError, ValueError):
+                return json_response({"error": "duration_seconds must be a number"}, status=400)
+            if duration <= 0:
+                duration = None
+        else:
+            duration = None
+
+        last_turn = await DebateTurn.objects.filter(room=room).order_by("-turn_number").afirst()
+        next_turn_number = (last_turn.turn_number + 1) if last_turn else 1
+
+        if speaker_role not in (DebateTurn.SPEAKER_ATTACKER, DebateTurn.SPEAKER_DEFENDER):
+            if speaker.email == room.attacker_email:
+                speaker_role = DebateTurn.SPEAKER_ATTACKER
+            elif speaker.email == room.defender_email:
+                speaker_role = DebateTurn.SPEAKER_DEFENDER
+            else:
+                speaker_role = DebateTurn.SPEAKER_ATTACKER
+
+        # The debate clock checks the seat the speaker holds, not the role claimed.
+        seat_role = {
+            room.attacker_email: DebateTurn.SPEAKER_ATTACKER,
+            room.defender_email: DebateTurn.SPEAKER_DEFENDER,
+        }.get(speaker.email, speaker_role)
+        refusal = turn_refusal(room.room_code, seat_role, duration)
+        if refusal:
+            return json_response({"error": refusal}, status=409)
+
+        turn = await DebateTurn.objects.acreate(
+            room=room,
+            speaker=speaker,
+            speaker_role=speaker_role,
+            text=text,
+            turn_number=next_turn_number,
+            duration_seconds=duration,
+        )
+        await atouch([room.room_code])
+
+        return json_response(
+            {"message": "Turn saved", "turn": DebateTurnSerializer(turn).data}, status=201
+        )
+
+
+class AsyncTextTranscriptView(AsyncAPIView):
+    async def post(self, request):
+        text = (self.data.get("text") or "").strip()
+        if not text:
+            return json_response({"error": "text is required"}, status=400)
+
+        # psycopg2 has no async API; keep the Neon write off the event loop
+        # without serialising it behind the thread-sensitive executor.
+        await sync_to_async(profiling.traced(store_transcript), thread_sensitive=False)(
+            text, speaker=self.data.get("speaker"), room_code=self.data.get("room_code")
+        )
+        return json_response({"stored": True})
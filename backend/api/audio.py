@@ -0,0 +1,273 @@
+"""
+Audio preprocessing before transcription.
+
+Uploads are decoded to mono float samples, downsampled to 16 kHz and passed
+through a NumPy energy-based voice activity pass that cuts leading and
+trailing silence and shortens long internal pauses. The transcriber then
+receives a compact 16-bit PCM WAV instead of the original recording.
+
+WAV is decoded with the standard library; other containers (webm/opus from
+MediaRecorder) are decoded with ffmpeg when it is on PATH. When NumPy or a
+decoder is missing, audio is passed through untouched.
+"""
+import io
+import shutil
+import subprocess
+import time
+import wave
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .optional import optional_import
+from .transcription import TranscriptionResult
+
+np = None  # numpy, set by numpy_available() the first time preprocessing runs
+
+TARGET_RATE = 16000
+FRAME_MS = 30
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+@dataclass
+class VadConfig:
+    threshold_db: float = -45.0
+    noise_margin_db: float = 12.0
+    max_gap: float = 0.6
+    keep_gap: float = 0.25
+    padding: float = 0.15
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            threshold_db=getattr(settings, "TRANSCRIPTION_VAD_THRESHOLD_DB", cls.threshold_db),
+            max_gap=getattr(settings, "TRANSCRIPTION_VAD_MAX_GAP", cls.max_gap),
+            keep_gap=getattr(settings, "TRANSCRIPTION_VAD_KEEP_GAP", cls.keep_gap),
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "threshold_db": self.threshold_db,
+            "noise_margin_db": self.noise_margin_db,
+            "max_gap": self.max_gap,
+            "keep_gap": self.keep_gap,
+            "padding": self.padding,
+        }
+
+
+@dataclass
+class PreprocessedAudio:
+    file: io.BytesIO
+    original_duration: float
+    trimmed_duration: float
+    elapsed_ms: float
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "originalDuration": round(self.original_duration, 3),
+            "trimmedDuration": round(self.trimmed_duration, 3),
+            "removedDuration": round(self.original_duration - self.trimmed_duration, 3),
+            "preprocessMs": round(self.elapsed_ms, 2),
+        }
+
+
+def numpy_available() -> bool:
+    global np
+    if np is None:
+        np = optional_import("numpy")
+    return np is not None
+
+
+def preprocessing_enabled() -> bool:
+    return getattr(settings, "TRANSCRIPTION_PREPROCESS", False) and numpy_available()
+
+
+def decode_wav(data: bytes):
+    """Return (mono float32 samples in [-1, 1], sample rate) for PCM WAV bytes."""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as exc:
+        raise AudioDecodeError(str(exc)) from exc
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width {width}")
+
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def decode_ffmpeg(data: bytes):
+    """Decode any container ffmpeg understands straight to 16 kHz mono."""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise AudioDecodeError("ffmpeg not available")
+    proc = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(TARGET_RATE), "pipe:1"],
+        input=data,
+        capture_output=True,
+        timeout=60,
+    )
+    if proc.returncode != 0:
+        raise AudioDecodeError(proc.stderr.decode("utf-8", "replace").strip())
+    return np.frombuffer(proc.stdout, dtype="<i2").astype(np.float32) / 32768.0, TARGET_RATE
+
+
+def decode(data: bytes):
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return decode_wav(data)
+    return decode_ffmpeg(data)
+
+
+def resample(samples, rate: int, target: int = TARGET_RATE):
+    """Downsample to ``target``: block averaging for integer ratios, else linear interpolation."""
+    if rate == target or len(samples) == 0:
+        return samples
+    if rate % target == 0:
+        factor = rate // target
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1)
+    duration = len(samples) / rate
+    n_out = int(round(duration * target))
+    positions = np.arange(n_out, dtype=np.float64) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def speech_mask(samples, rate: int, config: VadConfig):
+    """
+    Per-frame speech/silence mask. A frame is speech when its RMS level is above
+    both the absolute threshold and the estimated noise floor plus a margin.
+    """
+    frame = rate * FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool), frame
+
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    level_db = 20.0 * np.log10(rms)
+    noise_floor = np.percentile(level_db, 10)
+    threshold = max(config.threshold_db, noise_floor + config.noise_margin_db)
+    mask = level_db > threshold
+
+    # Pad speech by a few frames on each side so word edges are not clipped.
+    pad = int(round(config.padding * 1000 / FRAME_MS))
+    if pad and mask.any():
+        kernel = np.ones(2 * pad + 1, dtype=np.int32)
+        mask = np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+    return mask, frame
+
+
+def trim_silence(samples, rate: int, config: VadConfig | None = None):
+    """
+    Drop leading/trailing silence and shorten internal pauses longer than
+    ``max_gap`` to ``keep_gap`` seconds. Returns the kept samples.
+    """
+    config = config or VadConfig()
+    mask, frame = speech_mask(samples, rate, config)
+    if not mask.any():
+        return samples[:0]
+
+    speech_idx = np.flatnonzero(mask)
+    first, last = speech_idx[0], speech_idx[-1]
+    keep = mask.copy()
+    keep[first:last + 1] = True
+
+    # Find internal silent runs and keep only ``keep_gap`` of the long ones.
+    silent = ~mask[first:last + 1]
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) + first
+    ends = np.flatnonzero(edges == -1) + first
+    max_gap_frames = int(config.max_gap * 1000 / FRAME_MS)
+    keep_frames = int(config.keep_gap * 1000 / FRAME_MS)
+    long_runs = (ends - starts) > max_gap_frames
+    for start, end in zip(starts[long_runs], ends[long_runs]):
+        half = keep_frames // 2
+        keep[start + half:end - (keep_frames - half)] = False
+
+    keep[:first] = False
+    keep[last + 1:] = False
+    frames = samples[: len(mask) * frame].reshape(len(mask), frame)
+    return frames[keep].reshape(-1)
+
+
+def encode_wav(samples, rate: int = TARGET_RATE) -> io.BytesIO:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    out.seek(0)
+    return out
+
+
+def load_samples(audio, config: VadConfig | None = None):
+    """
+    Decode a binary file object, downsample to 16 kHz mono and trim silence.
+    Returns (samples, original duration in seconds).
+    """
+    audio.seek(0)
+    samples, rate = decode(audio.read())
+    original_duration = len(samples) / rate if rate else 0.0
+    samples = resample(samples, rate)
+    return trim_silence(samples, TARGET_RATE, config or VadConfig.from_settings()), original_duration
+
+
+def preprocess(audio, config: VadConfig | None = None) -> PreprocessedAudio:
+    """Decode, downsample to 16 kHz mono and trim silence from a binary file object."""
+    started = time.perf_counter()
+    trimmed, original_duration = load_samples(audio, config)
+    return PreprocessedAudio(
+        file=encode_wav(trimmed),
+        original_duration=original_duration,
+        trimmed_duration=len(trimmed) / TARGET_RATE,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def cache_config() -> dict | None:
+    """Preprocessing settings that change the transcript, for the cache key."""
+    if not preprocessing_enabled():
+        return None
+    return {"rate": TARGET_RATE, **VadConfig.from_settings().as_dict()}
+
+
+def transcribe_audio(audio, transcriber) -> TranscriptionResult:
+    """
+    Transcribe ``audio`` with the preprocessing stage in front when it is
+    enabled and applies (uploads, not URLs). Audio that is entirely silent is
+    answered with an empty transcript without calling the backend.
+    """
+    if isinstance(audio, str) or not preprocessing_enabled():
+        return transcriber.transcribe(audio)
+
+    try:
+        prepared = preprocess(audio)
+    except AudioDecodeError:
+        audio.seek(0)
+        return transcriber.transcribe(audio)
+
+    if prepared.trimmed_duration == 0:
+        result = TranscriptionResult(text="", audio_duration=0.0)
+    else:
+        result = transcriber.transcribe(prepared.file)
+    result.preprocessing = prepared.stats
+    return result
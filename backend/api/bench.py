@@ -0,0 +1,220 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Seeded data uses deterministic identifiers (see bench_email, bench_room_code)
+so a benchmark can pick random existing rows without scanning tables.
+Reports are plain JSON; compare() checks a report against a stored baseline.
+
+run_asgi() drives an ASGI application in-process, the way daphne would call
+it, so sync and async views can be compared under high concurrency.
+"""
+import asyncio
+import json
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+
+BENCH_PREFIX = "B"
+SCRATCH_PREFIX = "S"
+BENCH_KEY = "debateit-benchmark-signing-key-0000"
+
+
+def bench_kinde_id(index: int) -> str:
+    return f"bench-{index}"
+
+
+def bench_email(index: int) -> str:
+    return f"bench{index}@example.com"
+
+
+def bench_room_code(index: int) -> str:
+    return f"{BENCH_PREFIX}{index:09d}"
+
+
+def scratch_room_code(index: int) -> str:
+    """Rooms a benchmark run creates for itself and deletes afterwards."""
+    return f"{SCRATCH_PREFIX}{index:09d}"
+
+
+def bench_token(index: int) -> str:
+    """Bearer token for seeded user ``index`` (verify_kinde_jwt only decodes it)."""
+    return jwt.encode(
+        {"sub": bench_kinde_id(index), "email": bench_email(index)}, BENCH_KEY, algorithm="HS256"
+    )
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: list[float], elapsed: float, queries: list[int], errors: int = 0) -> dict:
+    """Throughput, latency percentiles (ms) and queries per request for one scenario."""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "meanMs": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50Ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99Ms": round(percentile(latencies, 99) * 1000, 2),
+        "maxMs": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        "queriesPerRequest": round(statistics.fmean(queries), 2) if queries else 0.0,
+        "maxQueries": max(queries) if queries else 0,
+    }
+
+
+def run_concurrent(call, requests: int, concurrency: int, setup=None):
+    """
+    Run ``call(state, i)`` ``requests`` times on ``concurrency`` threads, where
+    ``state`` is built once per thread by ``setup()``. ``call`` returns
+    (ok, queries). Returns (latencies, queries, errors, elapsed seconds).
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    latencies: list[float] = []
+    query_counts: list[int] = []
+    errors = 0
+
+    def one(i):
+        nonlocal errors
+        state = getattr(local, "state", None)
+        if state is None:
+            state = local.state = setup() if setup else True
+        started = time.perf_counter()
+        try:
+            ok, queries = call(state, i)
+        except Exception:
+            ok, queries = False, 0
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            query_counts.append(queries)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return latencies, query_counts, errors, time.perf_counter() - started
+
+
+async def asgi_request(app, method: str, path: str, query: str = "", body: bytes = b"", headers=()):
+    """One HTTP request through an ASGI app. Returns (status, response body)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    sent = False
+    never = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await never.wait()
+
+    response = {"status": 500, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["body"]
+
+
+def run_asgi(call, requests: int, concurrency: int):
+    """
+    Await ``call(i)`` ``requests`` times with at most ``concurrency`` in
+    flight on one event loop. ``call`` returns (ok, queries). Returns
+    (latencies, queries, errors, elapsed seconds), like run_concurrent.
+    """
+    latencies: list[float] = []
+    query_counts: list[int] = []
+    errors = 0
+
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            nonlocal errors
+            async with gate:
+                started = time.perf_counter()
+                try:
+                    ok, queries = await call(i)
+                except Exception:
+                    ok, queries = False, 0
+                latencies.append(time.perf_counter() - started)
+                query_counts.append(queries)
+                if not ok:
+                    errors += 1
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return latencies, query_counts, errors, time.perf_counter() - started
+
+
+DEFAULT_THRESHOLDS = {
+    "p50Ms": 0.25,
+    "p99Ms": 0.35,
+    "throughput": 0.20,
+    "queriesPerRequest": 0.0,
+}
+
+
+def compare(report: dict, baseline: dict, thresholds: dict | None = None) -> list[dict]:
+    """
+    Regressions of ``report`` against ``baseline``: latency or queries higher,
+    or throughput lower, by more than the threshold fraction.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+    for name, current in report.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, allowed in thresholds.items():
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == "throughput":
+                worse = old > 0 and new < old * (1 - allowed)
+            else:
+                worse = new > old * (1 + allowed) + 1e-9
+            if worse:
+                regressions.append(
+                    {"scenario": name, "metric": metric, "baseline": old, "current": new, "threshold": allowed}
+                )
+    return regressions
+
+
+def load_json(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(json.dumps(data, indent=2) + "\n")
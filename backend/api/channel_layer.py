@@ -0,0 +1,484 @@
+"""
+Batching channel layer.
+
+BatchingChannelLayer is a drop-in replacement for InMemoryChannelLayer
+(settings.CHANNEL_LAYERS). Every send, group_send, group_add and
+group_discard made on an event loop during one tick is queued and applied
+together at the end of that tick. Each message is JSON-encoded once, however
+many channels it reaches, and each group's members are looked up once per
+message. Callers await the batch, so once group_send returns the message has
+been delivered (locally) or written to the server.
+
+Each channel has a queue of at most ``capacity`` messages (or a
+``channel_capacity`` glob match). Messages past that are dropped and
+counted. A direct send to a full local channel raises ChannelFull, as it
+does with the in-memory layer. Expired messages are dropped when read, and
+a sweep every ``expiry / 2`` seconds removes dead channels (expired
+messages, no reader waiting and none read for ``expiry``) from their
+groups. The in-memory layer instead scans every channel on every send.
+
+With ``server="host:port"`` groups are shared between processes through
+ChannelLayerServer (``manage.py run_channel_server``). A tick's batch
+becomes one frame to the server. The server fans each message out with
+one frame per receiving process, and copies the payload bytes without
+decoding them. Channels are process-specific ("<prefix><client>!<id>"),
+so the server routes a message to the process that owns the channel.
+Messages must be JSON-serializable in both modes; DjangoJSONEncoder
+turns dates into strings.
+"""
+import asyncio
+import json
+import logging
+import random
+import string
+import struct
+import time
+import weakref
+from collections import defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .metrics import CHANNEL_LAYER_BATCH_OPS, CHANNEL_LAYER_DROPPED
+
+logger = logging.getLogger(__name__)
+
+_frame = struct.Struct("!II")  # body size, header size
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def write_frame(writer, header: dict, body: bytes = b""):
+    head = json.dumps(header, separators=(",", ":")).encode()
+    writer.write(_frame.pack(len(head) + len(body), len(head)) + head + body)
+
+
+async def read_frame(reader) -> tuple[dict, bytes]:
+    total, header_size = _frame.unpack(await reader.readexactly(_frame.size))
+    data = await reader.readexactly(total)
+    return json.loads(data[:header_size]), data[header_size:]
+
+
+def channel_client(channel: str) -> str:
+    """The client id in a process-specific channel name, '' for other channels."""
+    head, bang, _ = channel.partition("!")
+    return head.rsplit(".", 1)[-1] if bang else ""
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ChannelQueue:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = deque()  # (deadline, payload)
+        self.waiter = None
+        self.read_at = time.time()  # last receive() on the channel
+
+    def put(self, deadline: float, payload: bytes) -> bool:
+        if len(self.items) >= self.capacity:
+            return False
+        self.items.append((deadline, payload))
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            loop = waiter.get_loop()
+            if _running_loop() is loop:
+                waiter.set_result(None)
+            else:
+                # Delivered from another loop (a worker thread's async_to_sync).
+                loop.call_soon_threadsafe(_wake, waiter)
+        return True
+
+    def expire(self, now: float) -> int:
+        expired = 0
+        while self.items and self.items[0][0] < now:
+            self.items.popleft()
+            expired += 1
+        return expired
+
+
+class _LoopState:
+    """Per event loop: the tick's pending operations and, in server mode, the connection."""
+
+    def __init__(self):
+        self.ops: list[tuple] = []
+        self.done = None
+        self.connection = None
+        self.connect_lock = asyncio.Lock()
+
+
+class BatchingChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        server=None,
+        connect_timeout=5.0,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        self.server = server
+        self.connect_timeout = connect_timeout
+        self.client_id = "".join(random.choices(string.ascii_lowercase + string.digits, k=12))
+        self.queues: dict[str, ChannelQueue] = {}
+        self.groups: dict[str, dict[str, float]] = {}  # this process's memberships
+        self._loops = weakref.WeakKeyDictionary()
+        self._next_sweep = time.monotonic() + self.expiry / 2
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific."):
+        suffix = "".join(random.choices(string.ascii_letters, k=12))
+        return f"{prefix}{self.client_id}!{suffix}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        queue = self.queues.get(channel)
+        if queue is not None and len(queue.items) >= queue.capacity:
+            raise ChannelFull(channel)
+        await self._enqueue("send", channel, None, encode(message))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await self._enqueue("group", group, None, encode(message))
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._enqueue("add", group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._enqueue("discard", group, channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if self.server:
+            # Deliveries for this process arrive on a loop's connection.
+            await self._connect(self._state())
+        queue = self._queue(channel)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                now = queue.read_at = time.time()
+                while queue.items:
+                    deadline, payload = queue.items.popleft()
+                    if deadline >= now:
+                        return json.loads(payload)
+                    CHANNEL_LAYER_DROPPED.labels("expired").inc()
+                queue.waiter = loop.create_future()
+                await queue.waiter
+        finally:
+            queue.waiter = None
+            if not queue.items and self.queues.get(channel) is queue:
+                del self.queues[channel]
+
+    async def flush(self):
+        self.queues = {}
+        self.groups = {}
+        if self.server:
+            state = self._state()
+            connection = await self._connect(state)
+            write_frame(connection[1], {"op": "flush"})
+            await connection[1].drain()
+
+    async def close(self):
+        for state in list(self._loops.values()):
+            if state.connection is not None:
+                state.connection[1].close()
+                state.connection = None
+
+    # Batching
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    async def _enqueue(self, op, target, extra=None, payload=b""):
+        state = self._state()
+        state.ops.append((op, target, extra, payload))
+        # Shielded: one cancelled caller must not cancel the batch for everyone.
+        await asyncio.shield(self._schedule(state))
+
+    def _schedule(self, state: _LoopState):
+        if state.done is None:
+            loop = asyncio.get_running_loop()
+            state.done = loop.create_future()
+            # Callbacks already scheduled for this tick (other tasks' sends) run first.
+            loop.call_soon(self._flush, state)
+        return state.done
+
+    def _flush(self, state: _LoopState):
+        batch, done = state.ops, state.done
+        state.ops, state.done = [], None
+        CHANNEL_LAYER_BATCH_OPS.observe(len(batch))
+        if self.server:
+            task = asyncio.get_running_loop().create_task(self._publish(state, batch))
+            task.add_done_callback(lambda task: self._settle(done, task.exception()))
+            return
+        try:
+            self._apply(batch)
+        except Exception as exc:
+            self._settle(done, exc)
+        else:
+            self._settle(done, None)
+
+    @staticmethod
+    def _settle(done, exc):
+        if done.done():
+            return
+        if exc is None:
+            done.set_result(None)
+        else:
+            done.set_exception(exc)
+            # Retrieved here so a batch nobody awaits any more does not log a warning.
+            done.exception()
+
+    def _apply(self, batch):
+        """Local mode: apply a tick's operations in order."""
+        now = time.time()
+        deadline = now + self.expiry
+        for op, target, extra, payload in batch:
+            if op == "send":
+                self._deliver(target, payload, deadline)
+            elif op == "group":
+                members = self.groups.get(target)
+                if not members:
+                    continue
+                cutoff = now - self.group_expiry
+                for channel, joined in list(members.items()):
+                    if joined < cutoff:
+                        members.pop(channel, None)
+                    else:
+                        self._deliver(channel, payload, deadline)
+            else:
+                self._membership(op, target, extra, now)
+        self._maybe_sweep()
+
+    def _membership(self, op, group, channel, now):
+        if op == "add":
+            self.groups.setdefault(group, {})[channel] = now
+        else:
+            members = self.groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self.groups[group]
+
+    def _queue(self, channel) -> ChannelQueue:
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = ChannelQueue(self.get_capacity(channel))
+        return queue
+
+    def _deliver(self, channel, payload, deadline):
+        if not self._queue(channel).put(deadline, payload):
+            CHANNEL_LAYER_DROPPED.labels("full").inc()
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.expiry / 2
+        wall = time.time()
+        dead, expired = [], 0
+        for channel, queue in list(self.queues.items()):
+            dropped = queue.expire(wall)
+            expired += dropped
+            if dropped and queue.waiter is None and queue.read_at < wall - self.expiry:
+                # Messages expired unread and nobody has read it since: treat the channel as gone.
+                dead.append(channel)
+            if not queue.items and queue.waiter is None:
+                self.queues.pop(channel, None)
+        if expired:
+            CHANNEL_LAYER_DROPPED.labels("expired").inc(expired)
+        if dead:
+            dead = set(dead)
+            for group, members in list(self.groups.items()):
+                for channel in dead.intersection(members):
+                    if self.server:
+                        state = self._state()
+                        state.ops.append(("discard", group, channel, b""))
+                        self._schedule(state)
+                    else:
+                        self._membership("discard", group, channel, wall)
+
+    # Server mode
+
+    async def _connect(self, state: _LoopState):
+        if state.connection is not None:
+            return state.connection
+        async with state.connect_lock:
+            if state.connection is None:
+                host, _, port = self.server.rpartition(":")
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host or "127.0.0.1", int(port)), self.connect_timeout
+                )
+                write_frame(writer, {"op": "hello", "client": self.client_id})
+                # Re-register memberships after a reconnect or for a new loop.
+                items = [("add", group, channel, 0) for group, members in self.groups.items() for channel in members]
+                if items:
+                    write_frame(writer, {"op": "batch", "items": items})
+                await writer.drain()
+                state.connection = (reader, writer)
+                asyncio.get_running_loop().create_task(self._read(state, reader, writer))
+        return state.connection
+
+    async def _publish(self, state: _LoopState, batch):
+        reader, writer = await self._connect(state)
+        now = time.time()
+        for op, target, extra, _ in batch:
+            if op in ("add", "discard"):
+                self._membership(op, target, extra, now)
+        write_frame(
+            writer,
+            {"op": "batch", "items": [(op, target, extra, len(payload)) for op, target, extra, payload in batch]},
+            b"".join(payload for *_, payload in batch),
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            if state.connection is not None and state.connection[1] is writer:
+                state.connection = None
+            raise
+
+    async def _read(self, state: _LoopState, reader, writer):
+        try:
+            while True:
+                header, body = await read_frame(reader)
+                deadline = time.time() + self.expiry
+                offset = 0
+                for channels, size in header.get("items", ()):
+                    payload = body[offset:offset + size]
+                    offset += size
+                    for channel in channels:
+                        self._deliver(channel, payload, deadline)
+                self._maybe_sweep()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # close() drops the connection first; only an unexpected loss is worth a warning.
+            if state.connection is not None and state.connection[1] is writer:
+                logger.warning("Channel layer server connection lost; reconnecting on next use")
+        finally:
+            if state.connection is not None and state.connection[1] is writer:
+                state.connection = None
+            writer.close()
+
+
+class ChannelLayerServer:
+    """
+    Stand-in shared server for BatchingChannelLayer: holds group memberships
+    and routes each batch to the processes owning the target channels. Run
+    with ``manage.py run_channel_server``.
+    """
+
+    def __init__(self, group_expiry: float = 86400, max_buffer: int = 64 * 1024 * 1024):
+        self.group_expiry = group_expiry
+        self.max_buffer = max_buffer
+        self.clients: dict[str, list] = {}
+        self.groups: dict[str, dict[str, float]] = {}
+        self.frames = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        client = None
+        try:
+            while True:
+                header, body = await read_frame(reader)
+                op = header.get("op")
+                if op == "hello":
+                    client = header["client"]
+                    self.clients.setdefault(client, []).append(writer)
+                elif op == "batch":
+                    self.apply(header["items"], body)
+                elif op == "flush":
+                    self.groups.clear()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            if client is not None:
+                self.disconnect(client, writer)
+
+    def disconnect(self, client: str, writer):
+        writers = self.clients.get(client, [])
+        if writer in writers:
+            writers.remove(writer)
+        if writers:
+            return
+        # The process is gone: so are its channels.
+        self.clients.pop(client, None)
+        for group, members in list(self.groups.items()):
+            for channel in [c for c in members if channel_client(c) == client]:
+                del members[channel]
+            if not members:
+                del self.groups[group]
+
+    def apply(self, items, body: bytes):
+        now = time.time()
+        cutoff = now - self.group_expiry
+        outgoing = defaultdict(list)  # client -> [(channels, payload)]
+        offset = 0
+        for op, target, extra, size in items:
+            payload = body[offset:offset + size]
+            offset += size
+            if op == "add":
+                self.groups.setdefault(target, {})[extra] = now
+            elif op == "discard":
+                members = self.groups.get(target)
+                if members is not None:
+                    members.pop(extra, None)
+                    if not members:
+                        del self.groups[target]
+            elif op == "send":
+                outgoing[channel_client(target)].append(([target], payload))
+            elif op == "group":
+                by_client = defaultdict(list)
+                for channel, joined in list(self.groups.get(target, {}).items()):
+                    if joined < cutoff:
+                        del self.groups[target][channel]
+                    else:
+                        by_client[channel_client(channel)].append(channel)
+                for client, channels in by_client.items():
+                    outgoing[client].append((channels, payload))
+
+        for client, entries in outgoing.items():
+            writers = self.clients.get(client)
+            if not writers:
+                continue
+            writer = writers[0]
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                logger.warning("Channel layer client %s is not reading; disconnecting it", client)
+                writer.close()
+                continue
+            self.frames += 1
+            write_frame(
+                writer,
+                {"op": "deliver", "items": [(channels, len(payload)) for channels, payload in entries]},
+                b"".join(payload for _, payload in entries),
+            )
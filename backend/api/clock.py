@@ -0,0 +1,297 @@
+"""
+Server-side debate clock.
+
+Once both seats of a room are connected, the clock gives the floor to the
+attacker for DEBATE_TURN_SECONDS, then to the defender, and so on, sending
+``turn_started`` / ``turn_ended`` to the room group. The speaker can yield
+early with an ``end_turn`` message. While a room's clock runs, the other
+side's speaking status is refused on the socket and its turns are refused by
+the REST API, except for DEBATE_TURN_GRACE_SECONDS after its own turn ended
+so a recording still uploading is not lost.
+
+Deadlines live on one hashed timer wheel per event loop: DEBATE_CLOCK_SLOTS
+buckets that a single task visits every DEBATE_CLOCK_TICK_MS. Scheduling and
+cancelling a room's deadline are dict operations, and a tick only looks at
+the timers in one bucket, so the cost per tick does not grow with the
+number of live rooms the way one asyncio task or call_later handle per room
+does. Deadlines fire up to one tick late, never early. ``manage.py
+bench_clock`` measures both.
+"""
+import asyncio
+import logging
+import math
+import time
+import weakref
+from dataclasses import dataclass
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .eventlog import log_event
+from .metrics import CLOCK_TIMERS, CLOCK_TURNS, GROUP_SENDS
+from .models import DebateTurn, RoomEvent
+
+logger = logging.getLogger(__name__)
+
+SPEAKERS = (DebateTurn.SPEAKER_ATTACKER, DebateTurn.SPEAKER_DEFENDER)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. ``schedule(key, delay, callback)`` replaces any timer
+    with the same key; callbacks are plain callables run on the wheel's task.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 512):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.cursor = 0
+        self.where: dict = {}  # key -> slot
+        self.next_at = time.monotonic() + tick
+        self._wake = None
+        self._task = None
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, delay: float, callback):
+        self.cancel(key)
+        now = time.monotonic()
+        if not self.where and now >= self.next_at:
+            # Idle wheel: nothing has ticked since next_at, so restart the ticks from now.
+            self.next_at = now + self.tick
+        # Count from the last tick so the timer can fire late but never early.
+        since_tick = max(0.0, now - (self.next_at - self.tick))
+        ticks = max(1, math.ceil((delay + since_tick) / self.tick))
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot][key] = [(ticks - 1) // len(self.slots), callback]
+        self.where[key] = slot
+        if self._wake is not None:
+            self._wake.set()
+
+    def cancel(self, key) -> bool:
+        slot = self.where.pop(key, None)
+        if slot is None:
+            return False
+        self.slots[slot].pop(key, None)
+        return True
+
+    def step(self) -> list:
+        """Advance one tick; returns the callbacks that are due."""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        bucket = self.slots[self.cursor]
+        due = []
+        for key, entry in list(bucket.items()):
+            if entry[0]:
+                entry[0] -= 1
+            else:
+                del bucket[key]
+                del self.where[key]
+                due.append(entry[1])
+        return due
+
+    def advance(self, now: float) -> int:
+        """Run every tick up to ``now`` and fire what is due. Returns the number fired."""
+        fired = 0
+        while now >= self.next_at:
+            self.next_at += self.tick
+            for callback in self.step():
+                fired += 1
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Timer callback failed")
+        return fired
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        while True:
+            if not self.where:
+                # Nothing pending: sleep until something is scheduled.
+                self._wake.clear()
+                await self._wake.wait()
+            await asyncio.sleep(max(0.0, self.next_at - time.monotonic()))
+            self.advance(time.monotonic())
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+
+@dataclass
+class RoomClock:
+    room_code: str
+    turn: int = 0
+    speaker: str = ""
+    ends_at: float = 0.0  # wall clock, for clients
+    running: bool = False
+    finished: bool = False
+    previous: str = ""
+    previous_ended: float = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "turnNumber": self.turn,
+            "speakerRole": self.speaker if self.running else None,
+            "endsAt": self.ends_at if self.running else None,
+            "running": self.running,
+            "finished": self.finished,
+        }
+
+
+class DebateClock:
+    def __init__(self, wheel: TimerWheel, turn_seconds: float, max_turns: int = 0, grace: float = 5.0):
+        self.wheel = wheel
+        self.turn_seconds = turn_seconds
+        self.max_turns = max_turns
+        self.grace = grace
+        self.rooms: dict[str, RoomClock] = {}
+        self._sends: set = set()
+
+    @classmethod
+    def from_settings(cls, wheel: TimerWheel):
+        return cls(
+            wheel,
+            turn_seconds=getattr(settings, "DEBATE_TURN_SECONDS", 60),
+            max_turns=getattr(settings, "DEBATE_MAX_TURNS", 0),
+            grace=getattr(settings, "DEBATE_TURN_GRACE_SECONDS", 5),
+        )
+
+    def snapshot(self, room_code: str) -> dict | None:
+        state = self.rooms.get(room_code)
+        return state.snapshot() if state else None
+
+    def start(self, room_code: str) -> bool:
+        """Start (or resume after a stop) the room's clock. False if already running or finished."""
+        state = self.rooms.setdefault(room_code, RoomClock(room_code))
+        if state.running or state.finished:
+            return False
+        state.running = True
+        # A resumed clock gives the floor back to whoever was cut off.
+        self._begin(state, state.speaker or SPEAKERS[0])
+        return True
+
+    def end_turn(self, room_code: str, speaker: str, reason: str = "yielded") -> bool:
+        """End the current turn if ``speaker`` holds the floor, and pass it on."""
+        state = self.rooms.get(room_code)
+        if state is None or not state.running or state.speaker != speaker:
+            return False
+        self.wheel.cancel(room_code)
+        self._finish(state, reason)
+        return True
+
+    def stop(self, room_code: str, reason: str = "stopped"):
+        """Pause the room's clock (a player left); start() gives the cut-off speaker a new turn."""
+        state = self.rooms.get(room_code)
+        if state is None or not state.running:
+            return
+        self.wheel.cancel(room_code)
+        state.running = False
+        self._ended(state, reason)
+
+    def discard(self, room_code: str, reason: str = "closed"):
+        self.stop(room_code, reason)
+        self.rooms.pop(room_code, None)
+
+    def allows(self, room_code: str, speaker: str, now: float | None = None) -> bool:
+        """Whether ``speaker`` may speak or submit a turn in the room right now."""
+        state = self.rooms.get(room_code)
+        if state is None or not state.running:
+            return True
+        if state.speaker == speaker:
+            return True
+        now = time.time() if now is None else now
+        return state.previous == speaker and now - state.previous_ended <= self.grace
+
+    def _begin(self, state: RoomClock, speaker: str):
+        state.turn += 1
+        state.speaker = speaker
+        state.ends_at = time.time() + self.turn_seconds
+        self.wheel.schedule(state.room_code, self.turn_seconds, lambda: self._expire(state.room_code))
+        log_event(state.room_code, RoomEvent.KIND_TURN_STARTED, speaker, data={
+            "turnNumber": state.turn, "seconds": self.turn_seconds,
+        })
+        self._send(state.room_code, {
+            "type": "turn_started",
+            "turn": {
+                "turnNumber": state.turn,
+                "speakerRole": speaker,
+                "endsAt": state.ends_at,
+                "seconds": self.turn_seconds,
+            },
+        })
+
+    def _expire(self, room_code: str):
+        state = self.rooms.get(room_code)
+        if state is not None and state.running:
+            self._finish(state, "timeout")
+
+    def _finish(self, state: RoomClock, reason: str):
+        final = bool(self.max_turns and state.turn >= self.max_turns)
+        self._ended(state, reason, final)
+        if final:
+            state.running = False
+            state.finished = True
+            return
+        self._begin(state, SPEAKERS[1] if state.speaker == SPEAKERS[0] else SPEAKERS[0])
+
+    def _ended(self, state: RoomClock, reason: str, final: bool = False):
+        CLOCK_TURNS.labels(reason).inc()
+        state.previous, state.previous_ended = state.speaker, time.time()
+        log_event(state.room_code, RoomEvent.KIND_TURN_ENDED, state.speaker, data={
+            "turnNumber": state.turn, "reason": reason,
+        })
+        self._send(state.room_code, {
+            "type": "turn_ended",
+            "turn": {
+                "turnNumber": state.turn,
+                "speakerRole": state.speaker,
+                "reason": reason,
+                "final": final,
+            },
+        })
+
+    def _send(self, room_code: str, event: dict):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        GROUP_SENDS.labels(event["type"]).inc()
+        task = asyncio.get_running_loop().create_task(channel_layer.group_send(f"room_{room_code}", event))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+
+_clocks = weakref.WeakKeyDictionary()
+
+
+def get_clock() -> DebateClock:
+    """The clock for the running event loop, its wheel task started on first use."""
+    loop = asyncio.get_running_loop()
+    clock = _clocks.get(loop)
+    if clock is None:
+        wheel = TimerWheel(
+            tick=getattr(settings, "DEBATE_CLOCK_TICK_MS", 100) / 1000,
+            slots=getattr(settings, "DEBATE_CLOCK_SLOTS", 512),
+        )
+        clock = _clocks[loop] = DebateClock.from_settings(wheel)
+    clock.wheel.start()
+    return clock
+
+
+def turn_refusal(room_code: str, speaker: str, duration: float | None = None) -> str | None:
+    """
+    Why a turn by ``speaker`` must be refused, or None. Safe to call from the
+    sync views' worker threads; rooms without a running clock are not checked.
+    """
+    for clock in list(_clocks.values()):
+        state = clock.rooms.get(room_code)
+        if state is None or not state.running:
+            continue
+        if not clock.allows(room_code, speaker):
+            return "Not your turn"
+        if duration is not None and duration > clock.turn_seconds + clock.grace:
+            return "duration_seconds exceeds the speaking window"
+    return None
+
+
+CLOCK_TIMERS.set_function(lambda: sum(len(clock.wheel) for clock in list(_clocks.values())))
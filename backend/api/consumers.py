@@ -1,40 +1,128 @@
+import asyncio
 import json
+import logging
+import time
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 import random
 import string
 from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
-from .models import DebateRoom
+from django.conf import settings
+from django.utils import timezone
+from .admission import PRIORITY_LOW, PRIORITY_NEW, PRIORITY_RECONNECT, AdmissionMixin
+from .clock import get_clock
+from .eventlog import log_event
+from .lifecycle import ACTIVE_STATES, room_states, touch
+from .live_transcripts import LIVE_TRANSCRIPTS, drop_buffer, get_buffer, room_snapshots
+from .models import DebateRoom, DebateTurn, RoomEvent
+from .metrics import ACTIVE_ROOMS, MATCH_QUEUE_DEPTH, MetricsConsumerMixin
+from . import profiling
+from .neon_store import store_transcript
+from .ratelimit import RateLimitMixin
+from .ratings import get_leaderboard, initial_rating
+from .spectators import get_hub
+from .streaming import (
+    ENCODING_OPUS,
+    ENCODING_PCM,
+    OpusDecoder,
+    SessionLimitReached,
+    StreamingUnavailable,
+    get_session_registry,
+    get_streaming_backend,
+)
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------
 # ROOM CONSUMER
 # ---------------------------
 ROOM_PARTICIPANTS = {}  # { "room_<code>": { channel_name: participant_dict, ... } }
+ACTIVE_ROOMS.set_function(lambda: len(ROOM_PARTICIPANTS))
+_participant_janitor = None
 
-class RoomConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.room_code = self.scope['url_route']['kwargs']['room_code']
-        self.room_group_name = f"room_{self.room_code}"
 
+async def sweep_participants():
+    """
+    Drop ROOM_PARTICIPANTS entries that disconnect() never cleaned up: inactive
+    participants, empty rooms, and rooms that were closed, archived or
+    deleted. Rooms that still have players get their activity refreshed so
+    the lifecycle sweeper does not expire a debate that is in progress.
+    """
+    for group, participants in list(ROOM_PARTICIPANTS.items()):
+        for uid in [uid for uid, p in participants.items() if not p.get("isActive", True)]:
+            participants.pop(uid, None)
+        if not participants:
+            ROOM_PARTICIPANTS.pop(group, None)
+
+    codes = [group[len("room_"):] for group in ROOM_PARTICIPANTS]
+    if not codes:
+        return
+    states = await database_sync_to_async(room_states)(codes)
+    live = []
+    for code in codes:
+        if states.get(code) in ACTIVE_STATES:
+            live.append(code)
+        else:
+            ROOM_PARTICIPANTS.pop(f"room_{code}", None)
+    if live:
+        await database_sync_to_async(touch)(live)
+
+    clock = get_clock()
+    for code in list(clock.rooms):
+        if f"room_{code}" not in ROOM_PARTICIPANTS:
+            clock.discard(code)
+
+
+async def run_participant_janitor():
+    interval = getattr(settings, "ROOM_PARTICIPANT_SWEEP_SECONDS", 60)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_participants()
+        except Exception:
+            logger.exception("Participant sweep failed")
+
+
+def ensure_participant_janitor():
+    global _participant_janitor
+    if _participant_janitor is None or _participant_janitor.done():
+        _participant_janitor = asyncio.get_running_loop().create_task(run_participant_janitor())
+
+
+class RoomConsumer(MetricsConsumerMixin, AdmissionMixin, RateLimitMixin, AsyncWebsocketConsumer):
+    async def connect(self):
         # Get email from query
         query_string = self.scope.get("query_string", b"").decode()
         params = parse_qs(query_string)
         email = params.get("email", ["Anonymous"])[0]
-        self.user_name = email
+        room_code = self.scope['url_route']['kwargs']['room_code']
+
+        # Under load, players rejoining a room live on this process go first
+        live = f"room_{room_code}" in ROOM_PARTICIPANTS
+        if not await self.admit(PRIORITY_RECONNECT if live else PRIORITY_NEW):
+            return
+
+        if not await self.enter_room(room_code, email):
+            await self.close()
+
+    async def enter_room(self, room_code, email, accept=True):
+        """
+        Take a seat in the room and join its group. Returns False when the
+        room is full or closed. ``accept`` is False when the socket is already
+        open (HubConsumer moving a matched player in).
+        """
+        room_group_name = f"room_{room_code}"
 
         # 1) Determine role in DB (attacker/defender)
-        room, role = await register_participant(self.room_code, email)
+        room, role = await register_participant(room_code, email)
 
         # 2) If DB says room is full → stop immediately
         if role is None:
-            await self.close()
-            return
-
-        self.user_role = role
-        self.user_id = self.channel_name
+            return False
 
         # 3) Load in-memory list
-        room_participants = ROOM_PARTICIPANTS.setdefault(self.room_group_name, {})
+        room_participants = ROOM_PARTICIPANTS.setdefault(room_group_name, {})
 
         # Cleanup stale entries
         stale = [uid for uid, p in room_participants.items() if not p.get("isActive", True)]
@@ -43,8 +131,18 @@ class RoomConsumer(AsyncWebsocketConsumer):
 
         # 4) ENFORCE 2-PERSON LIMIT BEFORE ANYTHING ELSE
         if len(room_participants) >= 2:
-            await self.close()
-            return
+            return False
+
+        # Seat granted: only now does this socket belong to the room, so a
+        # rejected join leaves a hub socket free to keep matchmaking
+        self.room_code = room_code
+        self.room_group_name = room_group_name
+        self.user_name = email
+        self.rate_identity = email if email != "Anonymous" else None
+        self.rate_limit_room = room_code
+        self.user_role = role
+        self.speaker_role = DebateTurn.SPEAKER_ATTACKER if role == "Challenger" else DebateTurn.SPEAKER_DEFENDER
+        self.user_id = self.channel_name
 
         # 5) Add new participant BEFORE accept()
         self.participant = {
@@ -57,17 +155,22 @@ class RoomConsumer(AsyncWebsocketConsumer):
 
         # 6) NOW it is safe to accept websocket
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        if accept:
+            await self.accept()
+        ensure_participant_janitor()
 
         # 7) Send room state to this user
-        await self.send(json.dumps({
+        await self.send_event({
             "type": "room_state",
             "self": self.participant,
             "participants": list(room_participants.values()),
-        }))
+            "clock": get_clock().snapshot(self.room_code),
+        })
+        for frame in room_snapshots(self.room_code):
+            await self.send_event(frame)
 
         # 8) Announce join to others
-        await self.channel_layer.group_send(
+        await self.group_send(
             self.room_group_name,
             {
                 "type": "participant_joined",
@@ -75,12 +178,24 @@ class RoomConsumer(AsyncWebsocketConsumer):
                 "sender_channel": self.channel_name
             }
         )
+        log_event(self.room_code, RoomEvent.KIND_JOIN, self.user_name, data={"role": self.user_role})
+
+        # 9) Both seats connected: start (or resume) the debate clock
+        if len(room_participants) == 2:
+            get_clock().start(self.room_code)
+        return True
 
     async def disconnect(self, close_code):
+        await self.leave_room()
+
+    async def send_event(self, payload):
+        await self.send(text_data=json.dumps(payload))
+
+    async def leave_room(self):
         """
-        Called when the WebSocket closes.
+        Give up the seat and leave the room group.
 
-        NOTE: This can be called even if connect() bailed out early
+        NOTE: This can be called even if enter_room() bailed out early
         (e.g. room full), so we must guard against missing attributes.
         """
         room_group = getattr(self, "room_group_name", None)
@@ -104,8 +219,25 @@ class RoomConsumer(AsyncWebsocketConsumer):
         if not room_participants and room_group in ROOM_PARTICIPANTS:
             ROOM_PARTICIPANTS.pop(room_group, None)
 
-        # Notify others that participant left
-        await self.channel_layer.group_send(
+        # A seat is empty: pause the clock until the player is back
+        if pdata and len(room_participants) < 2:
+            get_clock().stop(self.room_code, "player_left")
+        if pdata:
+            log_event(self.room_code, RoomEvent.KIND_LEAVE, user_name)
+            # Whatever the player said this turn is kept
+            await self.finish_transcript()
+            drop_buffer(self.room_code, user_name)
+
+        # Leave the channel layer group (first, so a socket that stays open
+        # does not get its own participant_left)
+        await self.channel_layer.group_discard(
+            room_group,
+            self.channel_name,
+        )
+        self.room_group_name = self.user_id = None
+
+        # And notify others that participant left
+        await self.group_send(
             room_group,
             {
                 "type": "participant_left",
@@ -114,19 +246,19 @@ class RoomConsumer(AsyncWebsocketConsumer):
             },
         )
 
-        # And leave the channel layer group
-        await self.channel_layer.group_discard(
-            room_group,
-            self.channel_name,
-        )
-
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        await self.handle_room_message(json.loads(text_data))
+
+    async def handle_room_message(self, data):
         message_type = data.get("type")
 
+        if await self.rate_limited(message_type or "unknown"):
+            return
+
         if message_type == "chat_message":
+            log_event(self.room_code, RoomEvent.KIND_CHAT, self.user_name, text=str(data.get("message") or ""))
             # Broadcast chat message to room group
-            await self.channel_layer.group_send(
+            await self.group_send(
                 self.room_group_name,
                 {
                     'type': 'chat_message_handler',
@@ -138,8 +270,10 @@ class RoomConsumer(AsyncWebsocketConsumer):
             )
 
         elif message_type == "toggle_audio":
+            kind = RoomEvent.KIND_MUTE if data.get("muted") else RoomEvent.KIND_UNMUTE
+            log_event(self.room_code, kind, self.user_name)
             # Broadcast audio toggle status
-            await self.channel_layer.group_send(
+            await self.group_send(
                 self.room_group_name,
                 {
                     'type': 'audio_status_handler',
@@ -148,9 +282,46 @@ class RoomConsumer(AsyncWebsocketConsumer):
                 }
             )
 
+        elif message_type == "end_turn":
+            # The speaker yields the floor before the clock runs out
+            get_clock().end_turn(self.room_code, self.speaker_role)
+
+        elif message_type == "transcript_update":
+            if not get_clock().allows(self.room_code, self.speaker_role):
+                await self.send_event({
+                    'type': 'turn_rejected',
+                    'reason': 'Not your turn',
+                    'clock': get_clock().snapshot(self.room_code),
+                })
+                return
+            buffer = get_buffer(self.room_code, self.user_name, self.user_role)
+            frame = buffer.update(data.get("text"), bool(data.get("final")))
+            if frame is not None:
+                await self.group_send(
+                    self.room_group_name,
+                    {'type': 'transcript_frame', 'frame': frame, 'sender_channel': self.channel_name}
+                )
+
+        elif message_type == "transcript_end":
+            await self.finish_transcript()
+
+        elif message_type == "transcript_resync":
+            for frame in room_snapshots(self.room_code):
+                await self.send_event(frame)
+
         elif message_type == "speaking_status":
+            # Only the side holding the floor may speak while the clock runs
+            clock = get_clock()
+            if data.get("isSpeaking") and not clock.allows(self.room_code, self.speaker_role):
+                await self.send_event({
+                    'type': 'turn_rejected',
+                    'reason': 'Not your turn',
+                    'clock': clock.snapshot(self.room_code),
+                })
+                return
+
             # Broadcast speaking status to others
-            await self.channel_layer.group_send(
+            await self.group_send(
                 self.room_group_name,
                 {
                     'type': 'speaking_status_handler',
@@ -160,45 +331,60 @@ class RoomConsumer(AsyncWebsocketConsumer):
                 }
             )
 
+    async def finish_transcript(self):
+        """Close this speaker's live transcript turn: persist its text once and send the final snapshot."""
+        buffer = LIVE_TRANSCRIPTS.get(self.room_code, {}).get(self.user_name)
+        if buffer is None or not (buffer.text or buffer.sent):
+            return
+        text, frame = buffer.finish()
+        await self.group_send(
+            self.room_group_name,
+            {'type': 'transcript_frame', 'frame': frame, 'sender_channel': None}
+        )
+        if text:
+            await sync_to_async(profiling.traced(store_transcript), thread_sensitive=False)(
+                text, speaker=self.user_name, room_code=self.room_code
+            )
+
     # Handler for participant_joined
     async def participant_joined(self, event):
         # don't echo the join back to the joiner
         if event.get("sender_channel") == self.channel_name:
             return
 
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "participant_joined",
             "participant": event["participant"]
-        }))
+        })
 
     # Handler for participant_left
     async def participant_left(self, event):
         # send left notification to everyone except the socket that left
         if event['user_id'] != self.user_id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'participant_left',
                 'user_id': event['user_id'],
                 'user_name': event['user_name']
-            }))
+            })
 
     # Handler for chat_message
     async def chat_message_handler(self, event):
         # Don't send own messages back
         if event['sender_id'] != self.user_id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'chat_message',
                 'message': event['message'],
                 'sender': event['sender']
-            }))
+            })
 
     # Handler for audio_status
     async def audio_status_handler(self, event):
         if event['user_id'] != self.user_id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'audio_status',
                 'muted': event['muted'],
                 'user_id': event['user_id']
-            }))
+            })
 
     # Handler for speaking_status
     async def speaking_status_handler(self, event):
@@ -207,42 +393,377 @@ class RoomConsumer(AsyncWebsocketConsumer):
             return
 
         # We send a simplified payload to the clients; client maps 'opponent'
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'speaking_status',
             'isSpeaking': event['isSpeaking'],
             'user_id': 'opponent'
+        })
+
+    # Handler for transcription_result (pushed by background transcription jobs)
+    async def transcription_result(self, event):
+        await self.send_event({
+            'type': 'transcription_result',
+            'job': event['job']
+        })
+
+    # Handler for transcription_progress (segmented transcription jobs)
+    async def transcription_progress(self, event):
+        await self.send_event({
+            'type': 'transcription_progress',
+            'job': event['job']
+        })
+
+    # Handler for live_transcript (pushed by TranscriptionStreamConsumer)
+    async def live_transcript(self, event):
+        await self.send_event({
+            'type': 'live_transcript',
+            'speaker': event['speaker'],
+            'role': event['role'],
+            **event['turn'],
+        })
+
+    # Handler for debate_result (sent when the room is closed and scored)
+    async def debate_result(self, event):
+        get_clock().discard(self.room_code)
+        await self.send_event({
+            'type': 'debate_result',
+            **event['result'],
+        })
+
+    # Handler for turn_started (pushed by the debate clock)
+    async def turn_started(self, event):
+        await self.send_event({
+            'type': 'turn_started',
+            **event['turn'],
+        })
+
+    # Handler for turn_ended (pushed by the debate clock)
+    async def turn_ended(self, event):
+        if event['turn'].get('speakerRole') == getattr(self, 'speaker_role', None):
+            await self.finish_transcript()
+        await self.send_event({
+            'type': 'turn_ended',
+            **event['turn'],
+        })
+
+    # Handler for transcript_frame (live transcript delta or snapshot)
+    async def transcript_frame(self, event):
+        # The speaker already shows its own text
+        if event.get('sender_channel') == self.channel_name:
+            return
+        await self.send_event(event['frame'])
+
+    # Handler for turn_saved (a turn was stored through the REST API)
+    async def turn_saved(self, event):
+        await self.send_event({
+            'type': 'turn_saved',
+            'turn': event['turn'],
+        })
+
+
+# ---------------------------
+# SPECTATOR CONSUMER
+# ---------------------------
+SPECTATOR_CLOSE_NOT_FOUND = 4404
+SPECTATOR_CLOSE_FULL = 4429
+
+
+class SpectatorConsumer(MetricsConsumerMixin, AdmissionMixin, AsyncWebsocketConsumer):
+    """
+    Read-only viewer on ws/room/<code>/watch/. Takes no seat; receives the
+    room's events in batches from this process's SpectatorHub (see
+    api.spectators) after an initial spectator_state frame.
+    """
+
+    async def connect(self):
+        self.room_code = self.scope["url_route"]["kwargs"]["room_code"]
+        self.feed = None
+        if not await self.admit(PRIORITY_LOW):
+            return
+        room = await room_summary(self.room_code)
+        if room is None:
+            await self.close(code=SPECTATOR_CLOSE_NOT_FOUND)
+            return
+
+        hub = get_hub()
+        if hub.viewer_count(self.room_code) >= settings.SPECTATOR_MAX_PER_ROOM:
+            await self.close(code=SPECTATOR_CLOSE_FULL)
+            return
+
+        await self.accept()
+        self.feed = await hub.join(self.room_code, self)
+        await self.send(json.dumps({
+            "type": "spectator_state",
+            "room": room,
+            "participants": list(ROOM_PARTICIPANTS.get(f"room_{self.room_code}", {}).values()),
+            "viewers": len(self.feed.viewers),
+            "tickMs": settings.SPECTATOR_TICK_MS,
+            "clock": get_clock().snapshot(self.room_code),
+            "transcripts": room_snapshots(self.room_code),
         }))
 
+    async def disconnect(self, close_code):
+        if self.feed is not None:
+            await get_hub().leave(self.room_code, self)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Spectators are read-only.
+        pass
+
+    async def send_batch(self, message):
+        # The same pre-encoded message is shared by every viewer of the room.
+        await self.base_send(message)
+
+
+# ---------------------------
+# TRANSCRIPTION STREAM CONSUMER
+# ---------------------------
+STREAM_CLOSE_NOT_PARTICIPANT = 4403
+STREAM_CLOSE_IDLE = 4408
+STREAM_CLOSE_EXPIRED = 4410
+STREAM_CLOSE_FRAME_TOO_LARGE = 4413
+STREAM_CLOSE_UNSUPPORTED = 4415
+STREAM_CLOSE_BUSY = 4429
+STREAM_CLOSE_UNAVAILABLE = 4503
+
+
+class TranscriptionStreamConsumer(MetricsConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Relays binary audio frames from one debater to a streaming transcription
+    session and fans partial and final turns out to the room group as
+    live_transcript events. Final turns are persisted once.
+
+    Query params: email, sample_rate (default 16000), encoding (pcm_s16le or opus).
+    Send {"type": "stop"} to end the session and flush the last turn.
+    """
+
+    async def connect(self):
+        self.room_code = self.scope['url_route']['kwargs']['room_code']
+        self.room_group_name = f"room_{self.room_code}"
+        self.session = None
+        self.holds_slot = False
+        self.tasks = []
+
+        params = parse_qs(self.scope.get("query_string", b"").decode())
+        self.user_name = params.get("email", [""])[0]
+        encoding = params.get("encoding", [ENCODING_PCM])[0]
+        try:
+            sample_rate = int(params.get("sample_rate", ["16000"])[0])
+        except ValueError:
+            sample_rate = 0
+
+        self.user_role = await participant_role(self.room_code, self.user_name)
+        if self.user_role is None:
+            await self.close(code=STREAM_CLOSE_NOT_PARTICIPANT)
+            return
+
+        if encoding not in (ENCODING_PCM, ENCODING_OPUS) or not 8000 <= sample_rate <= 48000:
+            await self.close(code=STREAM_CLOSE_UNSUPPORTED)
+            return
+
+        try:
+            get_session_registry().acquire(self.room_code, self.channel_name)
+        except SessionLimitReached:
+            await self.close(code=STREAM_CLOSE_BUSY)
+            return
+        self.holds_slot = True
+
+        loop = asyncio.get_running_loop()
+        self.updates = asyncio.Queue()
+
+        def on_update(update):
+            # Called from the backend's reader thread.
+            loop.call_soon_threadsafe(self.updates.put_nowait, update)
+
+        try:
+            self.decoder = OpusDecoder(sample_rate) if encoding == ENCODING_OPUS else None
+            self.session = await sync_to_async(
+                profiling.traced(get_streaming_backend().open), thread_sensitive=False
+            )(on_update, sample_rate=sample_rate)
+        except StreamingUnavailable as exc:
+            logger.warning("Streaming transcription unavailable: %s", exc)
+            await self._release_slot()
+            await self.close(code=STREAM_CLOSE_UNAVAILABLE)
+            return
+        except Exception:
+            logger.exception("Could not open streaming session for room %s", self.room_code)
+            await self._release_slot()
+            await self.close(code=STREAM_CLOSE_UNAVAILABLE)
+            return
+
+        self.started_at = self.last_frame_at = time.monotonic()
+        await self.accept()
+        self.tasks = [
+            asyncio.create_task(self.pump_updates()),
+            asyncio.create_task(self.watchdog()),
+        ]
+        await self.send(json.dumps({"type": "stream_started", "sampleRate": sample_rate}))
+
+    async def disconnect(self, close_code):
+        await self._shutdown()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.session is None:
+            return
+
+        if bytes_data is not None:
+            if len(bytes_data) > settings.STREAMING_MAX_FRAME_BYTES:
+                await self.close(code=STREAM_CLOSE_FRAME_TOO_LARGE)
+                return
+            self.last_frame_at = time.monotonic()
+            frame = self.decoder.decode(bytes_data) if self.decoder else bytes_data
+            self.session.send_audio(frame)
+            return
+
+        data = json.loads(text_data or "{}")
+        if data.get("type") == "stop":
+            await self._shutdown()
+            await self.close()
+
+    async def pump_updates(self):
+        """Fan backend updates out to the room in arrival order; None stops the pump."""
+        while True:
+            update = await self.updates.get()
+            if update is None:
+                return
+            await self.group_send(
+                self.room_group_name,
+                {
+                    "type": "live_transcript",
+                    "speaker": self.user_name,
+                    "role": self.user_role,
+                    "turn": update.as_dict(),
+                },
+            )
+            if update.end_of_turn and update.formatted and update.transcript:
+                await sync_to_async(profiling.traced(store_transcript), thread_sensitive=False)(
+                    update.transcript, speaker=self.user_name, room_code=self.room_code
+                )
+
+    async def watchdog(self):
+        idle_limit = settings.STREAMING_IDLE_SECONDS
+        max_age = settings.STREAMING_MAX_SESSION_SECONDS
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            if now - self.last_frame_at > idle_limit:
+                code = STREAM_CLOSE_IDLE
+            elif now - self.started_at > max_age:
+                code = STREAM_CLOSE_EXPIRED
+            else:
+                continue
+            await self._shutdown(cancel_watchdog=False)
+            await self.close(code=code)
+            return
+
+    async def _shutdown(self, cancel_watchdog=True):
+        session, self.session = getattr(self, "session", None), None
+        if session is not None:
+            try:
+                await sync_to_async(profiling.traced(session.close), thread_sensitive=False)()
+            except Exception:
+                logger.exception("Error closing streaming session for room %s", self.room_code)
+            # Let the pump fan out whatever the backend flushed on close.
+            self.updates.put_nowait(None)
+            if self.tasks:
+                await self.tasks[0]
+
+        current = asyncio.current_task()
+        for task in getattr(self, "tasks", []):
+            if task is not current and (cancel_watchdog or task is self.tasks[0]):
+                task.cancel()
+        await self._release_slot()
+
+    async def _release_slot(self):
+        if self.holds_slot:
+            self.holds_slot = False
+            get_session_registry().release(self.room_code, self.channel_name)
+
 # ---------------------------
 # MATCHMAKING CONSUMER
 # ---------------------------
-MATCH_QUEUE = []  # simple in-memory queue
+MATCH_QUEUE = []  # simple in-memory queue of waiting players
+MATCH_QUEUE_DEPTH.set_function(lambda: len(MATCH_QUEUE))
+
+
+@database_sync_to_async
+def player_rating(email):
+    # Served from the in-process leaderboard: no query once it is loaded, bar a
+    # version read every LEADERBOARD_VERSION_CHECK_SECONDS.
+    rating = get_leaderboard().rating_of(email) if email else None
+    return rating if rating is not None else initial_rating()
+
+
+def match_window(waited: float) -> float:
+    """Largest rating gap accepted for a player who has waited ``waited`` seconds."""
+    return (
+        getattr(settings, "MATCH_RATING_WINDOW", 150.0)
+        + getattr(settings, "MATCH_RATING_WIDEN_PER_SECOND", 20.0) * waited
+    )
+
 
-class MatchmakingConsumer(AsyncWebsocketConsumer):
+class MatchmakingConsumer(MetricsConsumerMixin, AdmissionMixin, RateLimitMixin, AsyncWebsocketConsumer):
     async def connect(self):
+        if not await self.admit(PRIORITY_NEW):
+            return
+        qs = parse_qs(self.scope["query_string"].decode())
+        self.email = qs.get("email", [None])[0]
+        self.rate_identity = self.email
+        self.rating = await player_rating(self.email)
         await self.accept()
-        print("Matchmaking connected:", self.channel_name)
+        logger.debug("Matchmaking connected: %s", self.channel_name)
 
     async def disconnect(self, close_code):
         # Remove from queue if present
-        if self.channel_name in MATCH_QUEUE:
-            MATCH_QUEUE.remove(self.channel_name)
+        MATCH_QUEUE[:] = [entry for entry in MATCH_QUEUE if entry["channel"] != self.channel_name]
+
+    async def send_event(self, payload):
+        await self.send(text_data=json.dumps(payload))
 
     async def receive(self, text_data):
         data = json.loads(text_data)
 
         if data.get("action") == "find_match":
+            if await self.rate_limited("find_match"):
+                return
             await self.handle_matchmaking()
 
+    def find_opponent(self):
+        """Waiting player with the closest rating inside either player's window."""
+        now = time.monotonic()
+        best = None
+        for entry in MATCH_QUEUE:
+            if entry["channel"] == self.channel_name:
+                continue
+            if self.email and entry["email"] == self.email:
+                continue
+            gap = abs(entry["rating"] - self.rating)
+            if gap > match_window(now - entry["since"]):
+                continue
+            if best is None or gap < abs(best["rating"] - self.rating):
+                best = entry
+        return best
+
     async def handle_matchmaking(self):
-        # No one waiting → add player to queue
-        if not MATCH_QUEUE:
-            MATCH_QUEUE.append(self.channel_name)
-            await self.send(json.dumps({"status": "waiting"}))
-            return
+        """Pair this player or queue them. Returns the new room code when matched."""
+        opponent = self.find_opponent()
+
+        # No one close enough → add player to queue
+        if opponent is None:
+            if not any(entry["channel"] == self.channel_name for entry in MATCH_QUEUE):
+                MATCH_QUEUE.append({
+                    "channel": self.channel_name,
+                    "email": self.email,
+                    "rating": self.rating,
+                    "since": time.monotonic(),
+                })
+            await self.send_event({"status": "waiting", "rating": round(self.rating, 1)})
+            return None
 
         # Pair players
-        player1 = MATCH_QUEUE.pop(0)
+        MATCH_QUEUE.remove(opponent)
+        MATCH_QUEUE[:] = [entry for entry in MATCH_QUEUE if entry["channel"] != self.channel_name]
+        player1 = opponent["channel"]
         player2 = self.channel_name
 
         room_code = self.generate_room_code()
@@ -257,26 +778,133 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         )
 
         # Tell player2
-        await self.send(json.dumps({
+        await self.send_event({
             "status": "matched",
             "room_code": room_code,
-        }))
+        })
+        return room_code
 
     def generate_room_code(self):
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
     async def match_found(self, event):
-        await self.send(json.dumps({
+        await self.send_event({
             "status": "matched",
             "room_code": event["room_code"],
-        }))
+        })
+
+
+# ---------------------------
+# HUB CONSUMER (matchmaking + room on one socket)
+# ---------------------------
+class HubConsumer(RoomConsumer, MatchmakingConsumer):
+    """
+    Matchmaking and the room it leads to over one socket (ws/hub/?email=).
+    Every frame carries a ``stream``: "matchmaking" frames speak
+    MatchmakingConsumer's protocol and "room" frames RoomConsumer's. A match
+    moves the socket straight into the room's group, so room_state follows
+    the match without a second handshake. Room frames may also be
+    {"type": "join", "room_code": ...} and {"type": "leave"}.
+    """
+
+    async def connect(self):
+        self.room_group_name = None
+        if not await self.admit(PRIORITY_NEW):
+            return
+        qs = parse_qs(self.scope["query_string"].decode())
+        self.email = qs.get("email", [None])[0]
+        self.rate_identity = self.email
+        self.rating = await player_rating(self.email)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await MatchmakingConsumer.disconnect(self, close_code)
+        await self.leave_room()
+
+    async def send_event(self, payload, stream=None):
+        stream = stream or ("room" if self.room_group_name else "matchmaking")
+        await self.send(text_data=json.dumps({"stream": stream, **payload}))
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        stream = data.pop("stream", None)
+
+        if stream == "matchmaking":
+            if self.room_group_name:
+                await self.send_event({"status": "error", "error": "Leave the room first"}, "matchmaking")
+                return
+            await MatchmakingConsumer.receive(self, text_data)
+
+        elif stream == "room":
+            message_type = data.get("type")
+            if message_type == "join":
+                await self.move_to_room(data.get("room_code"))
+            elif message_type == "leave":
+                await self.leave_room()
+            elif self.room_group_name:
+                await self.handle_room_message(data)
+
+    async def handle_matchmaking(self):
+        room_code = await super().handle_matchmaking()
+        if room_code:
+            await self.move_to_room(room_code)
+        return room_code
+
+    async def match_found(self, event):
+        await super().match_found(event)
+        await self.move_to_room(event["room_code"])
+
+    async def move_to_room(self, room_code):
+        if not room_code:
+            return
+        MATCH_QUEUE[:] = [entry for entry in MATCH_QUEUE if entry["channel"] != self.channel_name]
+        await self.leave_room()
+        if not await self.enter_room(room_code, self.email or "Anonymous", accept=False):
+            await self.send_event({"type": "join_rejected", "room_code": room_code}, "room")
+
+
+@database_sync_to_async
+def participant_role(room_code, email):
+    """
+    Return 'Challenger' or 'Defender' if email already holds a seat in the room,
+    otherwise None. Unlike register_participant this never creates or fills a room.
+    """
+    if not email:
+        return None
+    room = DebateRoom.objects.filter(room_code=room_code).only(
+        "attacker_email", "defender_email"
+    ).first()
+    if room is None:
+        return None
+    if room.attacker_email == email:
+        return "Challenger"
+    if room.defender_email == email:
+        return "Defender"
+    return None
+
+
+@database_sync_to_async
+def room_summary(room_code):
+    room = DebateRoom.objects.filter(room_code=room_code).values(
+        "attacker_email", "defender_email", "state", "winner_email"
+    ).first()
+    if room is None:
+        return None
+    return {
+        "roomCode": room_code,
+        "attackerEmail": room["attacker_email"],
+        "defenderEmail": room["defender_email"] or None,
+        "state": room["state"],
+        "winnerEmail": room["winner_email"],
+    }
+
 
 @database_sync_to_async
 def register_participant(room_code, email):
     """
     Ensure a DebateRoom row exists and decide this user's role.
     Returns (room, role) where role is 'Challenger' or 'Defender',
-    or None if room is already full.
+    or None if room is already full or no longer active.
     """
     room, created = DebateRoom.objects.get_or_create(
         room_code=room_code,
@@ -286,6 +914,9 @@ def register_participant(room_code, email):
         },
     )
 
+    if room.state not in ACTIVE_STATES:
+        return room, None
+
     # same user reconnecting
     if room.attacker_email == email:
         return room, "Challenger"
@@ -295,7 +926,9 @@ def register_participant(room_code, email):
     # new user joining – fill defender slot if free
     if not room.defender_email:
         room.defender_email = email
-        room.save(update_fields=["defender_email"])
+        room.state = DebateRoom.STATE_LIVE
+        room.last_activity_at = timezone.now()
+        room.save(update_fields=["defender_email", "state", "last_activity_at"])
         return room, "Defender"
 
     # room already has 2 distinct users
@@ -0,0 +1,151 @@
+"""
+Durable room event log.
+
+RoomConsumer and the debate clock record joins, leaves, chat, mute toggles
+and turn changes as RoomEvent rows. ``log_event`` only appends a tuple to
+this event loop's EventLogWriter; the writer's task bulk-inserts the
+pending events every EVENT_LOG_FLUSH_MS, or as soon as EVENT_LOG_BATCH_SIZE
+are waiting, so the socket never waits on the database. At most
+EVENT_LOG_MAX_PENDING events are held; past that, and for events whose
+room was deleted before the flush, events are dropped and counted. Events
+still pending when the process dies are lost.
+
+``read_events`` pages a room's log by sequence number (the row id), so a
+timeline is rebuilt with index range scans on (room, id).
+"""
+import asyncio
+import logging
+import time
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .metrics import EVENT_LOG_DROPPED, EVENT_LOG_FLUSH_SECONDS, EVENT_LOG_PENDING, EVENT_LOG_WRITTEN
+from .models import DebateRoom, RoomEvent
+
+logger = logging.getLogger(__name__)
+
+KIND_NAMES = dict(RoomEvent.KIND_CHOICES)
+
+
+def write_events(rows: list[tuple]) -> int:
+    """Bulk-insert (room_code, kind, actor, text, data, created_at) rows. Returns rows written."""
+
+    def build(rows):
+        return [
+            RoomEvent(room_id=room, kind=kind, actor=actor, text=text, data=data, created_at=at)
+            for room, kind, actor, text, data, at in rows
+        ]
+
+    try:
+        with transaction.atomic():
+            RoomEvent.objects.bulk_create(build(rows), batch_size=500)
+        return len(rows)
+    except IntegrityError:
+        # A room was deleted (idle expiry) while its events were pending.
+        codes = {row[0] for row in rows}
+        existing = set(DebateRoom.objects.filter(room_code__in=codes).values_list("room_code", flat=True))
+        kept = [row for row in rows if row[0] in existing]
+        EVENT_LOG_DROPPED.inc(len(rows) - len(kept))
+        with transaction.atomic():
+            RoomEvent.objects.bulk_create(build(kept), batch_size=500)
+        return len(kept)
+
+
+class EventLogWriter:
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5, max_pending: int = 20000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: list[tuple] = []
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            batch_size=getattr(settings, "EVENT_LOG_BATCH_SIZE", 200),
+            flush_interval=getattr(settings, "EVENT_LOG_FLUSH_MS", 500) / 1000,
+            max_pending=getattr(settings, "EVENT_LOG_MAX_PENDING", 20000),
+        )
+
+    def append(self, room_code: str, kind: int, actor: str = "", text: str = "", data=None):
+        if len(self.pending) >= self.max_pending:
+            EVENT_LOG_DROPPED.inc()
+            return
+        self.pending.append((room_code, kind, actor or "", text or "", data, timezone.now()))
+        if len(self.pending) >= self.batch_size:
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def flush(self) -> int:
+        """Write everything pending now. Returns the number of events written."""
+        async with self._lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                written = await database_sync_to_async(write_events)(batch)
+            except Exception:
+                logger.exception("Writing %d room events failed", len(batch))
+                EVENT_LOG_DROPPED.inc(len(batch))
+                return 0
+            EVENT_LOG_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            EVENT_LOG_WRITTEN.inc(written)
+            return written
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_event_log() -> EventLogWriter:
+    """The writer for the running event loop."""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = EventLogWriter.from_settings()
+    return writer
+
+
+def log_event(room_code: str, kind: int, actor: str = "", text: str = "", data=None):
+    """Queue an event for the room's log; never blocks. Call from the event loop."""
+    if getattr(settings, "EVENT_LOG_ENABLED", True):
+        get_event_log().append(room_code, kind, actor, text, data)
+
+
+def read_events(room_code: str, after: int = 0, limit: int = 200) -> list[dict]:
+    """Up to ``limit`` events of the room with a sequence number above ``after``, oldest first."""
+    rows = (
+        RoomEvent.objects.filter(room_id=room_code, id__gt=after)
+        .order_by("id")
+        .values_list("id", "kind", "actor", "text", "data", "created_at")[:limit]
+    )
+    return [
+        {
+            "seq": seq,
+            "type": KIND_NAMES.get(kind, kind),
+            "actor": actor,
+            "text": text,
+            "data": data,
+            "at": created_at,
+        }
+        for seq, kind, actor, text, data, created_at in rows
+    ]
+
+
+EVENT_LOG_PENDING.set_function(lambda: sum(len(writer.pending) for writer in list(_writers.values())))
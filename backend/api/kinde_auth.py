@@ -1,7 +1,11 @@
-import jwt
+import logging
+
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+
 def verify_kinde_jwt(request):
     """Extract and decode Kinde JWT Access Token"""
 
@@ -12,6 +16,9 @@ def verify_kinde_jwt(request):
 
     token = auth_header.split(" ")[1]
 
+    # PyJWT pulls in cryptography; load it with the first authenticated request.
+    import jwt
+
     try:
         # KINDE_REMOTE_JWKS — not required for development
         payload = jwt.decode(
@@ -23,5 +30,5 @@ def verify_kinde_jwt(request):
         return payload
 
     except Exception as e:
-        print("JWT DECODE ERROR:", e)
+        logger.warning("JWT decode error: %s", e)
         raise AuthenticationFailed("Invalid token")
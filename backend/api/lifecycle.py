@@ -0,0 +1,223 @@
+"""
+Room lifecycle: waiting -> live -> finished -> archived.
+
+  - waiting: created, no defender yet.
+  - live: both seats taken (RoomJoinView, the room socket).
+  - finished: closed by scoring.close_room, by hand or on idle expiry.
+  - archived: turns moved into one compressed ArchivedDebate row.
+
+Closing a room also builds its DebateReplay (api.replay), which outlives
+archiving.
+
+Every turn and join bumps ``last_activity_at``. The sweeper (``manage.py
+sweep_rooms``) deletes waiting rooms that stayed empty for ROOM_WAITING_TTL,
+expires every open room idle for ROOM_LIVE_TTL (deleted if no turn was ever
+taken, closed otherwise), and archives rooms finished more than
+ROOM_ARCHIVE_AFTER ago, ROOM_SWEEP_BATCH rooms per transaction. That keeps
+DebateTurn and its indexes down to debates that can still change, while
+room_turns() serves archived debates through the same API.
+"""
+import json
+import logging
+import zlib
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedDebate, DebateRoom, DebateTurn
+from .scoring import close_room
+from .serializers import DebateTurnSerializer
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = (DebateRoom.STATE_WAITING, DebateRoom.STATE_LIVE)
+
+
+def is_active(room: DebateRoom) -> bool:
+    """Whether the room still accepts players and turns."""
+    return room.state in ACTIVE_STATES
+
+
+def touch(room_codes, state: str | None = None) -> int:
+    """Record activity on the given rooms, optionally moving them to ``state``."""
+    fields = {"last_activity_at": timezone.now()}
+    if state:
+        fields["state"] = state
+    return DebateRoom.objects.filter(room_code__in=list(room_codes), state__in=ACTIVE_STATES).update(**fields)
+
+
+async def atouch(room_codes, state: str | None = None) -> int:
+    fields = {"last_activity_at": timezone.now()}
+    if state:
+        fields["state"] = state
+    return await DebateRoom.objects.filter(
+        room_code__in=list(room_codes), state__in=ACTIVE_STATES
+    ).aupdate(**fields)
+
+
+def room_states(room_codes) -> dict[str, str]:
+    return dict(DebateRoom.objects.filter(room_code__in=list(room_codes)).values_list("room_code", "state"))
+
+
+def encode_turns(turns: list[dict]) -> bytes:
+    return zlib.compress(json.dumps(turns, separators=(",", ":"), default=str).encode(), 6)
+
+
+def decode_turns(payload) -> list[dict]:
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+def room_turns(room: DebateRoom) -> list[dict]:
+    """Serialized turns of a room, from DebateTurn or from its archive."""
+    if room.state == DebateRoom.STATE_ARCHIVED:
+        archive = ArchivedDebate.objects.filter(room=room).only("payload").first()
+        return decode_turns(archive.payload) if archive else []
+    turns = DebateTurn.objects.filter(room=room).select_related("speaker").order_by("turn_number")
+    return DebateTurnSerializer(turns, many=True).data
+
+
+async def aroom_turns(room: DebateRoom) -> list[dict]:
+    if room.state == DebateRoom.STATE_ARCHIVED:
+        archive = await ArchivedDebate.objects.filter(room=room).only("payload").afirst()
+        return decode_turns(archive.payload) if archive else []
+    turns = DebateTurn.objects.filter(room=room).select_related("speaker").order_by("turn_number")
+    return DebateTurnSerializer([turn async for turn in turns], many=True).data
+
+
+def room_scores(room: DebateRoom) -> dict[str, int]:
+    """Total turn score per side."""
+    if room.state == DebateRoom.STATE_ARCHIVED:
+        archive = ArchivedDebate.objects.filter(room=room).only("attacker_score", "defender_score").first()
+        if archive is None:
+            return {"attacker": 0, "defender": 0}
+        return {"attacker": archive.attacker_score, "defender": archive.defender_score}
+    totals = dict(
+        DebateTurn.objects.filter(room=room).values_list("speaker_role").annotate(total=Sum("turn_score"))
+    )
+    return {
+        "attacker": totals.get(DebateTurn.SPEAKER_ATTACKER) or 0,
+        "defender": totals.get(DebateTurn.SPEAKER_DEFENDER) or 0,
+    }
+
+
+def _ttl(name: str, default: float) -> timedelta:
+    return timedelta(seconds=getattr(settings, name, default))
+
+
+def expire_idle_rooms(batch_size: int | None = None, now=None) -> tuple[int, int]:
+    """
+    Delete rooms that never got a turn: waiting rooms idle for
+    ROOM_WAITING_TTL and any open room idle for ROOM_LIVE_TTL (a defender
+    joined but nobody spoke). Close rooms with turns that have been idle for
+    ROOM_LIVE_TTL. At most ``batch_size`` rooms of each kind per call.
+    Returns (deleted, closed).
+    """
+    batch_size = batch_size or getattr(settings, "ROOM_SWEEP_BATCH", 200)
+    now = now or timezone.now()
+    has_turns = Exists(DebateTurn.objects.filter(room=OuterRef("pk")))
+    stale = Q(state=DebateRoom.STATE_WAITING, last_activity_at__lt=now - _ttl("ROOM_WAITING_TTL", 1800)) | Q(
+        state__in=ACTIVE_STATES, last_activity_at__lt=now - _ttl("ROOM_LIVE_TTL", 7200)
+    )
+
+    empty = list(
+        DebateRoom.objects.filter(stale)
+        .filter(~has_turns)
+        .order_by("last_activity_at")
+        .values_list("room_code", flat=True)[:batch_size]
+    )
+    deleted = 0
+    if empty:
+        # Re-check inside the delete so a room joined or spoken in meanwhile survives.
+        _, removed = DebateRoom.objects.filter(stale, room_code__in=empty).filter(~has_turns).delete()
+        deleted = removed.get(DebateRoom._meta.label, 0)
+
+    idle = list(
+        DebateRoom.objects.filter(
+            state__in=ACTIVE_STATES,
+            last_activity_at__lt=now - _ttl("ROOM_LIVE_TTL", 7200),
+        )
+        .filter(has_turns)
+        .order_by("last_activity_at")[:batch_size]
+    )
+    for room in idle:
+        try:
+            close_room(room)
+        except Exception:
+            logger.exception("Closing idle room %s failed", room.room_code)
+    return deleted, len(idle)
+
+
+def archive_finished_rooms(batch_size: int | None = None, now=None) -> int:
+    """
+    Move the turns of up to ``batch_size`` rooms finished more than
+    ROOM_ARCHIVE_AFTER ago into ArchivedDebate rows, in one transaction.
+    Returns the number of rooms archived.
+    """
+    batch_size = batch_size or getattr(settings, "ROOM_SWEEP_BATCH", 200)
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        codes = list(
+            DebateRoom.objects.select_for_update(skip_locked=True)
+            .filter(
+                state=DebateRoom.STATE_FINISHED,
+                closed_at__lt=now - _ttl("ROOM_ARCHIVE_AFTER", 86400),
+            )
+            .order_by("closed_at")
+            .values_list("room_code", flat=True)[:batch_size]
+        )
+        if not codes:
+            return 0
+
+        turns = (
+            DebateTurn.objects.filter(room_id__in=codes)
+            .select_related("speaker")
+            .order_by("room_id", "turn_number")
+        )
+        by_room = {code: [] for code in codes}
+        for code, group in groupby(turns.iterator(chunk_size=2000), key=lambda t: t.room_id):
+            by_room[code] = DebateTurnSerializer(list(group), many=True).data
+
+        archives = []
+        for code, rows in by_room.items():
+            scores = {DebateTurn.SPEAKER_ATTACKER: 0, DebateTurn.SPEAKER_DEFENDER: 0}
+            for row in rows:
+                scores[row["speaker_role"]] = scores.get(row["speaker_role"], 0) + row["turn_score"]
+            archives.append(
+                ArchivedDebate(
+                    room_id=code,
+                    turn_count=len(rows),
+                    attacker_score=scores[DebateTurn.SPEAKER_ATTACKER],
+                    defender_score=scores[DebateTurn.SPEAKER_DEFENDER],
+                    payload=encode_turns(rows),
+                )
+            )
+        ArchivedDebate.objects.bulk_create(archives)
+        DebateTurn.objects.filter(room_id__in=codes).delete()
+        DebateRoom.objects.filter(room_code__in=codes).update(state=DebateRoom.STATE_ARCHIVED)
+    return len(codes)
+
+
+def sweep(batch_size: int | None = None, expire: bool = True, archive: bool = True, replay: bool = True) -> dict:
+    """
+    One sweeper pass: expire idle rooms, build replays a close did not, then
+    archive finished rooms until none are due.
+    """
+    result = {"deleted": 0, "closed": 0, "replayed": 0, "archived": 0}
+    if expire:
+        result["deleted"], result["closed"] = expire_idle_rooms(batch_size)
+    if replay:
+        from .replay import build_missing_replays
+
+        result["replayed"] = build_missing_replays(batch_size)
+    if archive:
+        while True:
+            archived = archive_finished_rooms(batch_size)
+            result["archived"] += archived
+            if not archived:
+                break
+    return result
@@ -0,0 +1,139 @@
+"""
+Live transcript streaming over the room socket.
+
+A speaker's browser sends ``transcript_update`` frames with the recognizer's
+current hypothesis for the segment it is hearing ({"text", "final"}). The
+server keeps the canonical text of the speaker's turn in a TranscriptBuffer
+(final segments plus the current interim one) and fans out only what
+changed since the last frame it sent: a ``transcript_delta`` keeps the
+first ``at`` characters and appends ``text`` (an append when ``at`` is the
+old length, a suffix replacement otherwise). Every
+LIVE_TRANSCRIPT_SNAPSHOT_EVERY updates, on a join and on request, a full
+``transcript_snapshot`` goes out instead, so clients that missed a delta
+(``seq`` not one past the last) can resync. When the turn ends the text is
+persisted once and a final snapshot closes it.
+"""
+from django.conf import settings
+
+LIVE_TRANSCRIPTS = {}  # { room_code: { speaker: TranscriptBuffer } }
+
+
+def common_prefix(a: str, b: str) -> int:
+    size = min(len(a), len(b))
+    if a[:size] == b[:size]:
+        return size
+    low, high = 0, size
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def join_text(head: str, tail: str) -> str:
+    return f"{head} {tail}" if head and tail else head or tail
+
+
+class TranscriptBuffer:
+    """Canonical live text of one speaker's current turn."""
+
+    def __init__(self, speaker: str, role: str, snapshot_every: int = 20, max_chars: int = 20000):
+        self.speaker = speaker
+        self.role = role
+        self.snapshot_every = snapshot_every
+        self.max_chars = max_chars
+        self.committed = ""
+        self.interim = ""
+        self.sent = ""
+        self.seq = 0
+        self.since_snapshot = 0
+
+    @property
+    def text(self) -> str:
+        return join_text(self.committed, self.interim)[: self.max_chars]
+
+    def update(self, text: str, final: bool = False) -> dict | None:
+        """Apply a recognizer result; returns the frame to fan out, or None if nothing changed."""
+        text = " ".join(str(text or "").split())
+        if final:
+            self.committed = join_text(self.committed, text)[: self.max_chars]
+            self.interim = ""
+        else:
+            self.interim = text
+
+        current = self.text
+        if current == self.sent:
+            return None
+        self.seq += 1
+        self.since_snapshot += 1
+        if self.since_snapshot >= self.snapshot_every:
+            return self.snapshot()
+        keep = common_prefix(self.sent, current)
+        self.sent = current
+        return {
+            "type": "transcript_delta",
+            "speaker": self.speaker,
+            "role": self.role,
+            "seq": self.seq,
+            "at": keep,
+            "text": current[keep:],
+        }
+
+    def snapshot(self, final: bool = False) -> dict:
+        self.sent = self.text
+        self.since_snapshot = 0
+        return {
+            "type": "transcript_snapshot",
+            "speaker": self.speaker,
+            "role": self.role,
+            "seq": self.seq,
+            "text": self.sent,
+            "final": final,
+        }
+
+    def finish(self) -> tuple[str, dict]:
+        """End the turn: returns its text and the final snapshot, and starts an empty turn."""
+        text = self.text
+        self.seq += 1
+        frame = self.snapshot(final=True)
+        self.committed = self.interim = self.sent = ""
+        return text, frame
+
+
+def get_buffer(room_code: str, speaker: str, role: str) -> TranscriptBuffer:
+    buffers = LIVE_TRANSCRIPTS.setdefault(room_code, {})
+    buffer = buffers.get(speaker)
+    if buffer is None:
+        buffer = buffers[speaker] = TranscriptBuffer(
+            speaker,
+            role,
+            snapshot_every=getattr(settings, "LIVE_TRANSCRIPT_SNAPSHOT_EVERY", 20),
+            max_chars=getattr(settings, "LIVE_TRANSCRIPT_MAX_CHARS", 20000),
+        )
+    return buffer
+
+
+def drop_buffer(room_code: str, speaker: str) -> TranscriptBuffer | None:
+    buffers = LIVE_TRANSCRIPTS.get(room_code, {})
+    buffer = buffers.pop(speaker, None)
+    if not buffers:
+        LIVE_TRANSCRIPTS.pop(room_code, None)
+    return buffer
+
+
+def room_snapshots(room_code: str) -> list[dict]:
+    """Current snapshot of every speaker with live text in the room (for joins and resyncs)."""
+    return [
+        {
+            "type": "transcript_snapshot",
+            "speaker": buffer.speaker,
+            "role": buffer.role,
+            "seq": buffer.seq,
+            "text": buffer.sent,
+            "final": False,
+        }
+        for buffer in list(LIVE_TRANSCRIPTS.get(room_code, {}).values())
+        if buffer.sent
+    ]
@@ -0,0 +1,139 @@
+import json
+import time
+import types
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from api.bench import asgi_request, bench_email, run_asgi, scratch_room_code, summarize, write_json
+from api.querybudget import audit_queries
+from api.urls import build_urlpatterns
+
+from .bench_rest import Command as BenchRestCommand
+
+SCENARIOS = (
+    "room_create",
+    "room_join",
+    "room_detail",
+    "room_detail_turns",
+    "turns_get",
+    "turns_post",
+    "text_transcript",
+)
+MODES = ("sync", "async")
+
+
+def urlconf(use_async: bool):
+    module = types.ModuleType(f"bench_urls_{'async' if use_async else 'sync'}")
+    module.urlpatterns = [path("api/", include(build_urlpatterns(use_async)))]
+    return module
+
+
+class Command(BenchRestCommand):
+    help = (
+        "Compare the sync (DRF) and async implementations of the hot REST views "
+        "through the ASGI handler at high concurrency, against seed_bench data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Timed requests per scenario and mode.")
+        parser.add_argument("--concurrency", type=int, default=256, help="Requests in flight at once.")
+        parser.add_argument("--warmup", type=int, default=50)
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Repeatable; default all.")
+        parser.add_argument("--mode", action="append", choices=MODES, help="Repeatable; default both.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        self.load_seed(options["seed"])
+        app = get_asgi_application()
+        modes = options["mode"] or MODES
+        report = {
+            "database": connection.vendor,
+            "seededRooms": self.rooms,
+            "seededUsers": self.users,
+            "concurrency": options["concurrency"],
+            "requestsPerScenario": options["requests"],
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scenarios": {},
+        }
+        total = options["requests"] + options["warmup"]
+        for name in options["scenario"] or SCENARIOS:
+            results = {}
+            for mode in modes:
+                prepare = getattr(self, f"prepare_{name}", None)
+                prepared = prepare(total) if prepare else None
+                call = self.make_async_call(app, getattr(self, f"spec_{name}"), prepared, name)
+                try:
+                    with override_settings(ROOT_URLCONF=urlconf(mode == "async")):
+                        if options["warmup"]:
+                            run_asgi(call, options["warmup"], options["concurrency"])
+                        latencies, queries, errors, elapsed = run_asgi(
+                            lambda i: call(i + options["warmup"]), options["requests"], options["concurrency"]
+                        )
+                finally:
+                    self.cleanup(prepared if name == "room_create" else ())
+                results[mode] = summarize(latencies, elapsed, queries, errors)
+                self.stdout.write(f"{name} [{mode}]: {results[mode]}")
+            if "sync" in results and "async" in results and results["sync"]["throughput"]:
+                results["speedup"] = round(results["async"]["throughput"] / results["sync"]["throughput"], 2)
+                self.stdout.write(f"{name}: async/sync throughput x{results['speedup']}")
+            report["scenarios"][name] = results
+
+        if options["output"]:
+            write_json(options["output"], report)
+
+    def make_async_call(self, app, spec, prepared, name):
+        async def call(i):
+            method, url, data, headers = spec(i, prepared)
+            url, _, query = url.partition("?")
+            body = b""
+            headers = [("host", self.host), *headers]
+            if data is not None:
+                body = urlencode(data).encode()
+                headers += [
+                    ("content-type", "application/x-www-form-urlencoded"),
+                    ("content-length", str(len(body))),
+                ]
+            with audit_queries("bench", report=False) as queries:
+                status, content = await asgi_request(app, method, url, query, body, headers)
+            if name == "room_create" and status == 201:
+                prepared.append(json.loads(content)["roomCode"])
+            return status < 400, queries.count
+
+        return call
+
+    def bearer(self, user):
+        return [("authorization", self.auth(user)["HTTP_AUTHORIZATION"])]
+
+    # Scenarios: spec_<name>(i, prepared) -> (method, url, form data or None, headers).
+    # prepare_<name> and cleanup come from bench_rest.
+    def spec_room_create(self, i, created):
+        return "POST", "/api/rooms/", {"email": bench_email(self.user())}, []
+
+    def spec_room_join(self, i, users):
+        return "POST", f"/api/rooms/{scratch_room_code(i)}/join/", {"email": bench_email(users[i])}, []
+
+    def spec_room_detail(self, i, _):
+        return "GET", f"/api/rooms/{self.room()}/", None, []
+
+    def spec_room_detail_turns(self, i, _):
+        return "GET", f"/api/rooms/{self.room()}/?include_turns=true", None, []
+
+    def spec_turns_get(self, i, _):
+        return "GET", f"/api/rooms/{self.room()}/turns/", None, []
+
+    def spec_turns_post(self, i, speakers):
+        user, profile_id = speakers[i]
+        return (
+            "POST",
+            f"/api/rooms/{scratch_room_code(i)}/turns/",
+            {"speaker_user_id": profile_id, "text": "Benchmark turn text with a few words in it."},
+            self.bearer(user),
+        )
+
+    def spec_text_transcript(self, i, _):
+        return "POST", "/api/transcribe_text/", {"text": "Benchmark transcript line.", "room_code": self.room()}, []
@@ -0,0 +1,121 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench import percentile, write_json
+from api.channel_layer import BatchingChannelLayer
+
+LAYERS = ("inmemory", "batching", "batching-server")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark channel layer fan-out: rooms of a few sockets each exchanging "
+        "group messages concurrently, on the in-memory layer against the batching "
+        "layer, locally and through its shared server (started as a subprocess)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", default="10,100,300", help="Comma-separated room counts.")
+        parser.add_argument("--members", type=int, default=3, help="Channels per room group.")
+        parser.add_argument("--messages", type=int, default=50, help="Group sends per room.")
+        parser.add_argument("--layer", action="append", choices=LAYERS, help="Repeatable; default all.")
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        try:
+            counts = sorted({int(value) for value in options["rooms"].split(",") if value.strip()})
+        except ValueError:
+            raise CommandError("--rooms must be comma-separated integers")
+        layers = options["layer"] or LAYERS
+
+        server = None
+        if "batching-server" in layers:
+            server = subprocess.Popen(
+                [sys.executable, "manage.py", "run_channel_server", "--port", "0"],
+                cwd=settings.BASE_DIR,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            address = server.stdout.readline().split()[-1]
+
+        report = {"members": options["members"], "messages": options["messages"], "runs": []}
+        try:
+            for count in counts:
+                for name in layers:
+                    if name == "inmemory":
+                        layer = InMemoryChannelLayer(capacity=options["messages"] + 10)
+                    else:
+                        layer = BatchingChannelLayer(
+                            capacity=options["messages"] + 10, server=address if name == "batching-server" else None
+                        )
+                    run = {"rooms": count, "layer": name}
+                    run.update(asyncio.run(self.measure(layer, count, options)))
+                    report["runs"].append(run)
+                    self.stdout.write(str(run))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        if options["output"]:
+            write_json(options["output"], report)
+
+    async def measure(self, layer, count: int, options) -> dict:
+        members, messages = options["members"], options["messages"]
+        expected = count * members * messages
+        latencies = []
+        done = asyncio.get_running_loop().create_future()
+
+        async def receive(channel):
+            for _ in range(messages):
+                message = await layer.receive(channel)
+                latencies.append(time.perf_counter() - message["sentAt"])
+                if len(latencies) == expected and not done.done():
+                    done.set_result(None)
+
+        async def talk(room: int):
+            for index in range(messages):
+                await layer.group_send(f"room_{room}", {
+                    "type": "chat_message_handler",
+                    "message": f"Point {index}: the evidence does not support that claim.",
+                    "sender": f"player{index % members}@example.com",
+                    "sentAt": time.perf_counter(),
+                })
+
+        channels = []
+        for room in range(count):
+            for _ in range(members):
+                channel = await layer.new_channel()
+                await layer.group_add(f"room_{room}", channel)
+                channels.append(channel)
+        readers = [asyncio.create_task(receive(channel)) for channel in channels]
+        await asyncio.sleep(0)
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.gather(*(talk(room) for room in range(count)))
+        try:
+            await asyncio.wait_for(done, timeout=max(30.0, expected / 1000))
+        except asyncio.TimeoutError:
+            pass
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        for reader in readers:
+            reader.cancel()
+        if hasattr(layer, "close"):
+            await layer.close()
+
+        latencies = [value * 1000 for value in latencies]
+        return {
+            "delivered": len(latencies),
+            "lost": expected - len(latencies),
+            "sendsPerSec": round(count * messages / wall),
+            "deliveredPerSec": round(len(latencies) / wall),
+            "cpuUsPerDelivery": round(cpu / len(latencies) * 1e6, 2) if latencies else None,
+            "latencyP50Ms": round(percentile(latencies, 50), 2),
+            "latencyP99Ms": round(percentile(latencies, 99), 2),
+        }
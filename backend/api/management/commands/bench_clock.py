@@ -0,0 +1,162 @@
+import asyncio
+import random
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench import percentile, write_json
+from api.clock import TimerWheel
+
+STRATEGIES = ("wheel", "call_later", "tasks")
+
+
+class Rooms:
+    """Rooms whose turn deadlines keep rolling over: each expiry schedules the next turn."""
+
+    def __init__(self, count: int, turn_min: float, turn_max: float, seed: int):
+        self.rng = random.Random(seed)
+        self.count = count
+        self.turn_min = turn_min
+        self.turn_max = turn_max
+        self.due = [0.0] * count
+        self.lateness: list[float] = []
+
+    def next_turn(self, room: int) -> float:
+        delay = self.rng.uniform(self.turn_min, self.turn_max)
+        self.due[room] = time.monotonic() + delay
+        return delay
+
+    def expired(self, room: int):
+        self.lateness.append(time.monotonic() - self.due[room])
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark debate clock overhead as the number of live rooms grows: one "
+        "shared timer wheel against a call_later handle or a task per room."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", default="1000,10000,50000", help="Comma-separated room counts.")
+        parser.add_argument("--seconds", type=float, default=3.0, help="Measured wall time per run.")
+        parser.add_argument("--turn-min", type=float, default=0.5, help="Shortest simulated turn, seconds.")
+        parser.add_argument("--turn-max", type=float, default=2.0, help="Longest simulated turn, seconds.")
+        parser.add_argument("--strategy", action="append", choices=STRATEGIES, help="Repeatable; default all.")
+        parser.add_argument("--seed", type=int, default=11)
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        try:
+            counts = sorted({int(value) for value in options["rooms"].split(",") if value.strip()})
+        except ValueError:
+            raise CommandError("--rooms must be comma-separated integers")
+
+        report = {
+            "tickMs": getattr(settings, "DEBATE_CLOCK_TICK_MS", 100),
+            "slots": getattr(settings, "DEBATE_CLOCK_SLOTS", 512),
+            "seconds": options["seconds"],
+            "turnSeconds": [options["turn_min"], options["turn_max"]],
+            "runs": [],
+        }
+        for count in counts:
+            for strategy in options["strategy"] or STRATEGIES:
+                run = {"rooms": count, "strategy": strategy}
+                run.update(asyncio.run(self.measure(strategy, count, options)))
+                run["bytesPerRoom"] = self.memory(strategy, count, options)
+                report["runs"].append(run)
+                self.stdout.write(str(run))
+
+        if options["output"]:
+            write_json(options["output"], report)
+
+    def rooms(self, count, options):
+        return Rooms(count, options["turn_min"], options["turn_max"], options["seed"])
+
+    def wheel(self):
+        return TimerWheel(
+            tick=getattr(settings, "DEBATE_CLOCK_TICK_MS", 100) / 1000,
+            slots=getattr(settings, "DEBATE_CLOCK_SLOTS", 512),
+        )
+
+    async def start(self, strategy: str, rooms: Rooms):
+        """Schedule every room's first deadline; returns what to cancel afterwards."""
+        loop = asyncio.get_running_loop()
+        if strategy == "wheel":
+            wheel = self.wheel()
+
+            def callback(room):
+                def fire():
+                    rooms.expired(room)
+                    wheel.schedule(room, rooms.next_turn(room), callback(room))
+                return fire
+
+            for room in range(rooms.count):
+                wheel.schedule(room, rooms.next_turn(room), callback(room))
+            wheel.start()
+            return [wheel._task]
+
+        if strategy == "call_later":
+            handles = {}
+
+            def fire(room):
+                rooms.expired(room)
+                handles[room] = loop.call_later(rooms.next_turn(room), fire, room)
+
+            for room in range(rooms.count):
+                handles[room] = loop.call_later(rooms.next_turn(room), fire, room)
+            return handles
+
+        async def turn_loop(room):
+            while True:
+                await asyncio.sleep(rooms.next_turn(room))
+                rooms.expired(room)
+
+        return [loop.create_task(turn_loop(room)) for room in range(rooms.count)]
+
+    @staticmethod
+    def cancel(handles):
+        for handle in handles.values() if isinstance(handles, dict) else handles:
+            handle.cancel()
+
+    async def measure(self, strategy: str, count: int, options) -> dict:
+        rooms = self.rooms(count, options)
+        started = time.perf_counter()
+        handles = await self.start(strategy, rooms)
+        setup = time.perf_counter() - started
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.sleep(options["seconds"])
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        self.cancel(handles)
+        await asyncio.sleep(0)
+
+        lateness = [value * 1000 for value in rooms.lateness]
+        return {
+            "setupUsPerRoom": round(setup / count * 1e6, 3) if count else 0,
+            "fired": len(lateness),
+            "cpuPercent": round(cpu / wall * 100, 1),
+            "cpuUsPerFire": round(cpu / len(lateness) * 1e6, 2) if lateness else None,
+            "lateP50Ms": round(percentile(lateness, 50), 2) if lateness else None,
+            "lateP99Ms": round(percentile(lateness, 99), 2) if lateness else None,
+        }
+
+    def memory(self, strategy: str, count: int, options) -> int:
+        """Bytes allocated per room to hold its pending deadline."""
+
+        async def allocate():
+            rooms = self.rooms(count, options)
+            # Far enough out that nothing fires while measuring.
+            rooms.turn_min = rooms.turn_max = 3600
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            handles = await self.start(strategy, rooms)
+            await asyncio.sleep(0)
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            self.cancel(handles)
+            await asyncio.sleep(0)
+            return used
+
+        return round(asyncio.run(allocate()) / count) if count else 0
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from api.bench import percentile, write_json
+from api.models import DebateRoom
+
+MODES = ("reconnect", "hub")
+ORIGIN = [(b"origin", b"http://localhost")]
+
+
+async def receive_until(communicator, predicate, timeout: float = 10.0) -> dict:
+    while True:
+        message = json.loads(await communicator.receive_from(timeout=timeout))
+        if predicate(message):
+            return message
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark time from match_found to the first room event: closing the "
+        "matchmaking socket and opening ws/room/<code>/, against staying on ws/hub/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pairs", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=20, help="Pairs matched at once.")
+        parser.add_argument("--mode", action="append", choices=MODES, help="Repeatable; default both.")
+        parser.add_argument(
+            "--rtt-ms",
+            type=float,
+            default=0.0,
+            help="Client round trip to add per handshake round (not measured in-process).",
+        )
+        parser.add_argument(
+            "--handshake-rtts",
+            type=int,
+            default=3,
+            help="Round trips a new socket costs before its first frame (TCP, TLS 1.3, upgrade).",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        # The full websocket stack, including origin validation and session auth.
+        from debate_hub.asgi import application
+
+        report = {"pairs": options["pairs"], "concurrency": options["concurrency"], "modes": {}}
+        for mode in options["mode"] or MODES:
+            self.rooms = []
+            try:
+                latencies = asyncio.run(self.run_mode(application, mode, options))
+            finally:
+                DebateRoom.objects.filter(room_code__in=self.rooms).delete()
+            extra = options["rtt_ms"] * options["handshake_rtts"] if mode == "reconnect" else 0.0
+            result = {
+                "p50Ms": round(percentile(latencies, 50), 2),
+                "p99Ms": round(percentile(latencies, 99), 2),
+                "meanMs": round(sum(latencies) / len(latencies), 2),
+                "networkMs": extra,
+                "p50WithNetworkMs": round(percentile(latencies, 50) + extra, 2),
+            }
+            report["modes"][mode] = result
+            self.stdout.write(f"{mode}: time to first room event {result}")
+
+        if options["output"]:
+            write_json(options["output"], report)
+
+    async def run_mode(self, application, mode: str, options) -> list[float]:
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        # The queue pairs any two waiting players; queue one pair at a time so
+        # every pair matches with itself.
+        self.queue_lock = asyncio.Lock()
+        latencies: list[float] = []
+
+        async def pair(index):
+            async with semaphore:
+                latencies.extend(await self.match_pair(application, mode, index))
+
+        await asyncio.gather(*(pair(index) for index in range(options["pairs"])))
+        return [value * 1000 for value in latencies]
+
+    async def match_pair(self, application, mode: str, index: int) -> list[float]:
+        """Match two fresh players and time each one's first room event after the match."""
+        path = "/ws/hub/" if mode == "hub" else "/ws/matchmaking/"
+        emails = [f"bench-match-{mode}-{index}-{side}@debateit.local" for side in ("a", "b")]
+        players = [WebsocketCommunicator(application, f"{path}?email={email}", headers=ORIGIN) for email in emails]
+        for player in players:
+            await player.connect()
+
+        def matched(message):
+            return message.get("status") == "matched"
+
+        async with self.queue_lock:
+            await players[0].send_to(json.dumps({"stream": "matchmaking", "action": "find_match"}))
+            await receive_until(players[0], lambda message: message.get("status") == "waiting")
+            await players[1].send_to(json.dumps({"stream": "matchmaking", "action": "find_match"}))
+            second = await receive_until(players[1], matched)
+            second_at = time.perf_counter()
+
+        async def first_room_event(player, email):
+            if player is players[1]:
+                room_code, started = second["room_code"], second_at
+            else:
+                room_code = (await receive_until(player, matched))["room_code"]
+                started = time.perf_counter()
+            if mode == "hub":
+                await receive_until(player, lambda message: message.get("type") == "room_state")
+                return player, room_code, time.perf_counter() - started
+            await player.disconnect()
+            room = WebsocketCommunicator(application, f"/ws/room/{room_code}/?email={email}", headers=ORIGIN)
+            await room.connect()
+            await receive_until(room, lambda message: message.get("type") == "room_state")
+            return room, room_code, time.perf_counter() - started
+
+        results = await asyncio.gather(*(first_room_event(p, e) for p, e in zip(players, emails)))
+        self.rooms.append(results[0][1])
+        for socket, _, _ in results:
+            await socket.disconnect()
+        return [elapsed for _, _, elapsed in results]
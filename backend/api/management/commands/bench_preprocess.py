@@ -0,0 +1,125 @@
+import io
+import json
+import statistics
+import time
+import wave
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import audio as audio_stage
+from api.transcription import get_transcriber
+
+
+def synth_recording(seconds: float, rate: int, speech_ratio: float, seed: int):
+    """
+    Stereo WAV bytes alternating voiced bursts (harmonic tones with an
+    amplitude envelope) and low-level background noise.
+    """
+    np = audio_stage.np
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    signal = rng.normal(0, 0.002, total).astype(np.float32)
+
+    pos = int(rng.uniform(1.0, 4.0) * rate)
+    while pos < total:
+        burst = int(rng.uniform(0.8, 3.0) * rate)
+        end = min(total, pos + burst)
+        t = np.arange(end - pos) / rate
+        f0 = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+        signal[pos:end] += (0.2 * voiced * envelope).astype(np.float32)
+        gap = burst * (1 - speech_ratio) / speech_ratio
+        pos = end + int(gap * rng.uniform(0.5, 1.5))
+
+    stereo = np.repeat(signal[:, None], 2, axis=1)
+    pcm = (np.clip(stereo, -1, 1) * 32767).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark audio preprocessing (decode, 16 kHz downsample, VAD trim) "
+        "against the transcription time it saves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=60.0)
+        parser.add_argument("--rate", type=int, default=48000)
+        parser.add_argument("--speech-ratio", type=float, default=0.4)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument(
+            "--provider-rtf",
+            type=float,
+            default=0.3,
+            help="Provider processing seconds per second of audio, used to estimate time saved.",
+        )
+        parser.add_argument(
+            "--measure",
+            action="store_true",
+            help="Also time the configured transcriber on the original and the trimmed audio.",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        if not audio_stage.numpy_available():
+            raise CommandError("numpy is required for audio preprocessing")
+
+        data = synth_recording(
+            options["seconds"], options["rate"], options["speech_ratio"], options["seed"]
+        )
+        config = audio_stage.VadConfig.from_settings()
+
+        timings = []
+        prepared = None
+        for _ in range(options["repeat"]):
+            prepared = audio_stage.preprocess(io.BytesIO(data), config)
+            timings.append(prepared.elapsed_ms)
+
+        removed = prepared.original_duration - prepared.trimmed_duration
+        preprocess_ms = statistics.median(timings)
+        saved_ms = removed * options["provider_rtf"] * 1000
+        report = {
+            "input": {
+                "seconds": options["seconds"],
+                "rate": options["rate"],
+                "channels": 2,
+                "bytes": len(data),
+                "speechRatio": options["speech_ratio"],
+            },
+            "output": {
+                "bytes": len(prepared.file.getvalue()),
+                **prepared.stats,
+            },
+            "preprocessMs": {"median": round(preprocess_ms, 2), "min": round(min(timings), 2)},
+            "estimatedTranscriptionSavedMs": round(saved_ms, 1),
+            "netSavedMs": round(saved_ms - preprocess_ms, 1),
+        }
+
+        if options["measure"]:
+            transcriber = get_transcriber()
+            started = time.perf_counter()
+            transcriber.transcribe(io.BytesIO(data))
+            original_ms = (time.perf_counter() - started) * 1000
+            trimmed = audio_stage.preprocess(io.BytesIO(data), config).file
+            started = time.perf_counter()
+            transcriber.transcribe(trimmed)
+            trimmed_ms = (time.perf_counter() - started) * 1000
+            report["measured"] = {
+                "originalMs": round(original_ms, 1),
+                "preprocessedMs": round(trimmed_ms, 1),
+                "savedMs": round(original_ms - trimmed_ms, 1),
+            }
+
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(text + "\n")
+        self.stdout.write(text)
@@ -0,0 +1,213 @@
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from api.bench import (
+    BENCH_PREFIX,
+    SCRATCH_PREFIX,
+    bench_email,
+    bench_kinde_id,
+    bench_room_code,
+    bench_token,
+    compare,
+    load_json,
+    run_concurrent,
+    scratch_room_code,
+    summarize,
+    write_json,
+)
+from api.models import DebateRoom, UserProfile
+from api.querybudget import audit_queries
+
+SCENARIOS = (
+    "room_create",
+    "room_join",
+    "room_detail",
+    "room_detail_turns",
+    "turns_get",
+    "turns_post",
+    "protected",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the REST views in-process under concurrent load against data "
+        "from seed_bench, and compare the results to a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Timed requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Repeatable; default all.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+        parser.add_argument("--baseline", help="Baseline JSON to compare against.")
+        parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline.")
+        parser.add_argument(
+            "--threshold",
+            action="append",
+            default=[],
+            metavar="METRIC=FRACTION",
+            help="Allowed regression, e.g. p99Ms=0.5 or throughput=0.1 (repeatable).",
+        )
+        parser.add_argument("--no-fail", action="store_true", help="Report regressions without failing.")
+
+    def handle(self, *args, **options):
+        thresholds = {}
+        for item in options["threshold"]:
+            metric, _, value = item.partition("=")
+            try:
+                thresholds[metric] = float(value)
+            except ValueError:
+                raise CommandError(f"Bad --threshold {item!r}")
+
+        self.load_seed(options["seed"])
+        report = {
+            "database": connection.vendor,
+            "seededRooms": self.rooms,
+            "seededUsers": self.users,
+            "concurrency": options["concurrency"],
+            "requestsPerScenario": options["requests"],
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scenarios": {},
+        }
+        total = options["requests"] + options["warmup"]
+        for name in options["scenario"] or SCENARIOS:
+            prepare = getattr(self, f"prepare_{name}", None)
+            args = prepare(total) if prepare else None
+            call = self.make_call(getattr(self, f"request_{name}"), args)
+            try:
+                if options["warmup"]:
+                    run_concurrent(call, options["warmup"], options["concurrency"], self.client)
+                latencies, queries, errors, elapsed = run_concurrent(
+                    lambda state, i: call(state, i + options["warmup"]),
+                    options["requests"],
+                    options["concurrency"],
+                    self.client,
+                )
+            finally:
+                self.cleanup(args if name == "room_create" else ())
+            report["scenarios"][name] = summarize(latencies, elapsed, queries, errors)
+            self.stdout.write(f"{name}: {report['scenarios'][name]}")
+
+        regressions = []
+        baseline_path = options["baseline"]
+        if baseline_path and os.path.exists(baseline_path) and not options["save_baseline"]:
+            regressions = compare(report, load_json(baseline_path), thresholds)
+            report["regressions"] = regressions
+        if options["output"]:
+            write_json(options["output"], report)
+        if baseline_path and options["save_baseline"]:
+            write_json(baseline_path, report)
+            self.stdout.write(f"Baseline written to {baseline_path}")
+
+        for r in regressions:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                    f"(threshold {r['threshold']:.0%})"
+                )
+            )
+        if regressions and not options["no_fail"]:
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
+
+    def load_seed(self, seed):
+        last = (
+            DebateRoom.objects.filter(room_code__startswith=BENCH_PREFIX)
+            .order_by("-room_code")
+            .values_list("room_code", flat=True)
+            .first()
+        )
+        if last is None:
+            raise CommandError("No benchmark data; run seed_bench first")
+        self.rooms = int(last[len(BENCH_PREFIX):]) + 1
+        self.users = UserProfile.objects.filter(kinde_id__startswith="bench-").count()
+        self.rng = random.Random(seed)
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost"
+        self.host = "localhost" if host in ("*", "") else host
+
+    def client(self):
+        return Client(HTTP_HOST=self.host)
+
+    def make_call(self, request, args):
+        def call(client, i):
+            with audit_queries("bench", report=False) as queries:
+                response = request(client, i, args)
+            return response.status_code < 400, queries.count
+
+        return call
+
+    def user(self):
+        return self.rng.randrange(self.users)
+
+    def room(self):
+        return bench_room_code(self.rng.randrange(self.rooms))
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {bench_token(user)}"}
+
+    def cleanup(self, created=()):
+        DebateRoom.objects.filter(room_code__startswith=SCRATCH_PREFIX).delete()
+        if created:
+            DebateRoom.objects.filter(room_code__in=created).delete()
+
+    # Scenarios: prepare_<name>(count) runs untimed; request_<name>(client, i, prepared) is timed.
+    def prepare_room_create(self, count):
+        return []
+
+    def request_room_create(self, client, i, created):
+        response = client.post("/api/rooms/", {"email": bench_email(self.user())})
+        if response.status_code == 201:
+            created.append(response.json()["roomCode"])
+        return response
+
+    def prepare_room_join(self, count):
+        DebateRoom.objects.bulk_create(
+            [DebateRoom(room_code=scratch_room_code(i), attacker_email=bench_email(0)) for i in range(count)],
+            batch_size=1000,
+        )
+        return [self.user() or 1 for _ in range(count)]
+
+    def request_room_join(self, client, i, users):
+        return client.post(f"/api/rooms/{scratch_room_code(i)}/join/", {"email": bench_email(users[i])})
+
+    def request_room_detail(self, client, i, _):
+        return client.get(f"/api/rooms/{self.room()}/")
+
+    def request_room_detail_turns(self, client, i, _):
+        return client.get(f"/api/rooms/{self.room()}/", {"include_turns": "true"})
+
+    def request_turns_get(self, client, i, _):
+        return client.get(f"/api/rooms/{self.room()}/turns/")
+
+    def prepare_turns_post(self, count):
+        speakers = [self.user() for _ in range(count)]
+        DebateRoom.objects.bulk_create(
+            [
+                DebateRoom(room_code=scratch_room_code(i), attacker_email=bench_email(user))
+                for i, user in enumerate(speakers)
+            ],
+            batch_size=1000,
+        )
+        ids = dict(
+            UserProfile.objects.filter(kinde_id__in={bench_kinde_id(u) for u in speakers}).values_list("kinde_id", "id")
+        )
+        return [(user, ids[bench_kinde_id(user)]) for user in speakers]
+
+    def request_turns_post(self, client, i, speakers):
+        user, profile_id = speakers[i]
+        return client.post(
+            f"/api/rooms/{scratch_room_code(i)}/turns/",
+            {"speaker_user_id": profile_id, "text": "Benchmark turn text with a few words in it."},
+            **self.auth(user),
+        )
+
+    def request_protected(self, client, i, _):
+        return client.get("/api/protected/", **self.auth(self.user()))
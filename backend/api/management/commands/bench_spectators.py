@@ -0,0 +1,138 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench import write_json
+from api.spectators import RoomFeed, spectator_event
+
+
+class Viewer:
+    """Stands in for a SpectatorConsumer: counts what would go down the socket."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_batch(self, message):
+        self.frames += 1
+        self.bytes += len(message["text"])
+
+
+def room_events(rng: random.Random, count: int, turn: int):
+    """A tick's worth of room group events: chat, speaking toggles and live transcript partials."""
+    speakers = ("attacker-1", "defender-1")
+    words = []
+    for _ in range(count):
+        roll = rng.random()
+        speaker = rng.choice(speakers)
+        if roll < 0.3:
+            yield {"type": "chat_message_handler", "message": "Good point, but " * rng.randint(1, 4), "sender": speaker}
+        elif roll < 0.6:
+            yield {"type": "speaking_status_handler", "user_id": speaker, "isSpeaking": rng.random() < 0.5}
+        else:
+            words.append(rng.choice(("therefore", "evidence", "however", "policy", "costs", "the")))
+            yield {
+                "type": "live_transcript",
+                "speaker": speaker,
+                "role": "ATTACKER" if speaker == speakers[0] else "DEFENDER",
+                "turn": {"turnOrder": turn, "text": " ".join(words), "endOfTurn": False},
+            }
+
+
+def slope(xs, ys):
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark spectator fan-out: flush cost per tick and per additional viewer "
+        "for batched, encode-once delivery against one frame per event per viewer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--viewers", default="0,100,1000,5000", help="Comma-separated viewer counts.")
+        parser.add_argument("--ticks", type=int, default=40)
+        parser.add_argument("--events-per-tick", type=int, default=20)
+        parser.add_argument("--no-naive", action="store_true", help="Skip the per-viewer baseline.")
+        parser.add_argument("--seed", type=int, default=3)
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        try:
+            counts = sorted({int(value) for value in options["viewers"].split(",") if value.strip()})
+        except ValueError:
+            raise CommandError("--viewers must be comma-separated integers")
+        if len(counts) < 2:
+            raise CommandError("Give at least two viewer counts to estimate the per-viewer cost")
+
+        tick_ms = getattr(settings, "SPECTATOR_TICK_MS", 250)
+        report = {
+            "tickMs": tick_ms,
+            "ticks": options["ticks"],
+            "eventsPerTick": options["events_per_tick"],
+            "runs": [],
+        }
+        for count in counts:
+            run = asyncio.run(self.measure(count, options, naive=False))
+            if not options["no_naive"]:
+                run["naive"] = asyncio.run(self.measure(count, options, naive=True))
+            report["runs"].append(run)
+            self.stdout.write(f"{count} viewers: {run}")
+
+        xs = [run["viewers"] for run in report["runs"]]
+        report["usPerViewer"] = round(slope(xs, [run["flushMs"] * 1000 for run in report["runs"]]), 3)
+        report["bytesPerViewerPerSecond"] = report["runs"][-1]["bytesPerViewerPerSecond"]
+        self.stdout.write(
+            f"batched: {report['usPerViewer']} us per extra viewer per tick, "
+            f"{report['bytesPerViewerPerSecond']} B/s per viewer"
+        )
+        if not options["no_naive"]:
+            report["naiveUsPerViewer"] = round(
+                slope(xs, [run["naive"]["flushMs"] * 1000 for run in report["runs"]]), 3
+            )
+            self.stdout.write(f"per-event, per-viewer: {report['naiveUsPerViewer']} us per extra viewer per tick")
+
+        if options["output"]:
+            write_json(options["output"], report)
+
+    async def measure(self, count: int, options, naive: bool) -> dict:
+        rng = random.Random(options["seed"])
+        feed = RoomFeed("BENCH")
+        viewers = [Viewer() for _ in range(count)]
+        feed.viewers.update(viewers)
+
+        timings = []
+        for tick in range(options["ticks"]):
+            events = list(room_events(rng, options["events_per_tick"], tick // 10))
+            started = time.perf_counter()
+            if naive:
+                # What joining every spectator to the room group would cost:
+                # each viewer maps and encodes each event on its own.
+                for viewer in viewers:
+                    for event in events:
+                        mapped = spectator_event(event)
+                        if mapped is not None:
+                            await viewer.send_batch({"type": "websocket.send", "text": json.dumps(mapped[1])})
+            else:
+                for event in events:
+                    feed.add(event)
+                await feed.flush()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        seconds = options["ticks"] * getattr(settings, "SPECTATOR_TICK_MS", 250) / 1000
+        sent = sum(viewer.bytes for viewer in viewers)
+        frames = sum(viewer.frames for viewer in viewers)
+        return {
+            "viewers": count,
+            "flushMs": round(statistics.fmean(timings), 3),
+            "p99FlushMs": round(sorted(timings)[int(0.99 * (len(timings) - 1))], 3),
+            "framesPerViewerPerSecond": round(frames / count / seconds, 2) if count else 0,
+            "bytesPerViewerPerSecond": round(sent / count / seconds) if count else 0,
+        }
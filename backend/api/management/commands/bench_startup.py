@@ -0,0 +1,164 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench import compare, load_json, write_json
+
+TARGETS = ("python", "setup", "asgi", "urls")
+
+# Heavy or optional packages whose presence after startup is reported.
+WATCHED = (
+    "assemblyai",
+    "psycopg2",
+    "numpy",
+    "requests",
+    "jwt",
+    "cryptography",
+    "opuslib",
+    "yaml",
+)
+
+THRESHOLDS = {"wallMs": 0.25, "importMs": 0.25, "maxRssMb": 0.15, "modules": 0.10}
+
+# Run in a fresh interpreter: python is the bare interpreter, setup is what
+# every management command pays, asgi a daphne worker before its first
+# request, urls a worker after its first HTTP request.
+CHILD = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+target = sys.argv[1]
+if target != "python":
+    import django
+    django.setup()
+if target in ("asgi", "urls"):
+    import debate_hub.asgi
+if target == "urls":
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+# ru_maxrss survives exec on Linux and would report the parent's peak; VmHWM does not.
+try:
+    with open("/proc/self/status") as fh:
+        peak = next(int(line.split()[1]) for line in fh if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "ms": elapsed * 1000,
+    "maxRssKb": peak,
+    "modules": len(sys.modules),
+    "loaded": sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every line -X importtime wrote."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark worker startup: wall time, peak RSS and modules loaded by "
+        "django.setup(), the ASGI application and the URLconf, each in a fresh "
+        "interpreter, with an -X importtime breakdown by package. Compare "
+        "against a stored baseline to track startup across releases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target; medians are reported.")
+        parser.add_argument("--target", action="append", choices=TARGETS, help="Repeatable; default all.")
+        parser.add_argument("--top", type=int, default=10, help="Packages to list by import time.")
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+        parser.add_argument("--baseline", help="Baseline JSON to compare against.")
+        parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline.")
+        parser.add_argument("--no-fail", action="store_true", help="Report regressions without failing.")
+
+    def handle(self, *args, **options):
+        if options["runs"] < 1:
+            raise CommandError("--runs must be at least 1")
+
+        report = {
+            "python": sys.version.split()[0],
+            "runs": options["runs"],
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scenarios": {},
+        }
+        for target in options["target"] or TARGETS:
+            samples = [self.run_child(target) for _ in range(options["runs"])]
+            result = {
+                "wallMs": round(statistics.median(s["wallMs"] for s in samples), 1),
+                "importMs": round(statistics.median(s["ms"] for s in samples), 1),
+                "maxRssMb": round(statistics.median(s["maxRssKb"] for s in samples) / 1024, 1),
+                "modules": int(statistics.median(s["modules"] for s in samples)),
+                "watchedLoaded": samples[-1]["loaded"],
+            }
+            if target != "python":
+                result["topPackages"] = self.top_packages(target, options["top"])
+            report["scenarios"][target] = result
+            self.stdout.write(
+                f"{target}: {result['wallMs']} ms process, {result['importMs']} ms imports, "
+                f"{result['maxRssMb']} MB RSS, {result['modules']} modules, "
+                f"loaded {', '.join(result['watchedLoaded']) or '-'}"
+            )
+            for package, ms in result.get("topPackages", {}).items():
+                self.stdout.write(f"    {package:<24} {ms:>8.1f} ms")
+
+        regressions = []
+        baseline_path = options["baseline"]
+        if baseline_path and os.path.exists(baseline_path) and not options["save_baseline"]:
+            regressions = compare(report, load_json(baseline_path), THRESHOLDS)
+            report["regressions"] = regressions
+        if options["output"]:
+            write_json(options["output"], report)
+        if baseline_path and options["save_baseline"]:
+            write_json(baseline_path, report)
+            self.stdout.write(f"Baseline written to {baseline_path}")
+
+        for r in regressions:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                    f"(threshold {r['threshold']:.0%})"
+                )
+            )
+        if regressions and not options["no_fail"]:
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
+
+    def run_child(self, target: str, importtime: bool = False) -> dict:
+        command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD]
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [*command, target, json.dumps(WATCHED)],
+            cwd=settings.BASE_DIR,
+            env={"DJANGO_SETTINGS_MODULE": "debate_hub.settings", **os.environ},
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode:
+            raise CommandError(f"{target} startup failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["wallMs"] = (time.perf_counter() - started) * 1000
+        if importtime:
+            result["importtime"] = parse_importtime(proc.stderr)
+        return result
+
+    def top_packages(self, target: str, count: int) -> dict:
+        """Self import time summed per top-level package, slowest first (ms)."""
+        totals = defaultdict(int)
+        for name, own, _ in self.run_child(target, importtime=True)["importtime"]:
+            totals[name.split(".")[0]] += own
+        slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+        return {package: round(us / 1000, 1) for package, us in slowest}
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import DebateRoom, PlayerRating
+from api.ratings import elo_update, initial_rating, invalidate, record_game
+
+
+class Command(BaseCommand):
+    help = "Rebuild PlayerRating from scratch by replaying closed debates in order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rooms read per query.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        players: dict[str, PlayerRating] = {}
+
+        def player(email):
+            if email not in players:
+                players[email] = PlayerRating(email=email, rating=initial_rating())
+            return players[email]
+
+        rooms = (
+            DebateRoom.objects.filter(closed_at__isnull=False)
+            .exclude(defender_email="")
+            .order_by("closed_at", "room_code")
+            .values_list("attacker_email", "defender_email", "winner_email")
+        )
+        rated = 0
+        for attacker_email, defender_email, winner_email in rooms.iterator(chunk_size=options["chunk_size"]):
+            if attacker_email == defender_email:
+                continue
+            attacker, defender = player(attacker_email), player(defender_email)
+            if winner_email == attacker_email:
+                score = 1.0
+            elif winner_email == defender_email:
+                score = 0.0
+            else:
+                score = 0.5
+            attacker.rating, defender.rating = elo_update(attacker.rating, defender.rating, score)
+            record_game(attacker, score)
+            record_game(defender, 1.0 - score)
+            rated += 1
+
+        with transaction.atomic():
+            PlayerRating.objects.all().delete()
+            PlayerRating.objects.bulk_create(players.values(), batch_size=1000)
+            transaction.on_commit(invalidate)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rated {rated} debates for {len(players)} players in {time.perf_counter() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import DebateRoom
+from api.replay import store_replay
+from api.scoring import decide_winner, rescore_room_turns
+
+
+class Command(BaseCommand):
+    help = (
+        "Rescore stored debate turns room by room, in chunks of rooms, and rebuild "
+        "the replays of closed rooms whose scores or winner changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=200, help="Rooms per transaction.")
+        parser.add_argument("--room", action="append", default=[], help="Only rescore this room (repeatable).")
+        parser.add_argument(
+            "--redecide",
+            action="store_true",
+            help="Also recompute winner_email for rooms that are already closed, and rebuild "
+            "ratings if any winner changed.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        rooms = DebateRoom.objects.order_by("room_code")
+        if options["room"]:
+            rooms = rooms.filter(room_code__in=options["room"])
+
+        started = time.perf_counter()
+        last_code = ""
+        total_rooms = total_turns = total_winners = total_replays = 0
+        while True:
+            chunk = list(rooms.filter(room_code__gt=last_code)[:chunk_size])
+            if not chunk:
+                break
+            last_code = chunk[-1].room_code
+
+            with transaction.atomic():
+                changed = rescore_room_turns([room.room_code for room in chunk])
+                total_turns += sum(changed.values())
+                stale = {
+                    room.room_code for room in chunk if room.closed_at is not None and room.room_code in changed
+                }
+                if options["redecide"]:
+                    for room in chunk:
+                        # Archived rooms have no turns left to decide from.
+                        if room.closed_at is None or room.state == DebateRoom.STATE_ARCHIVED:
+                            continue
+                        winner = decide_winner(room)
+                        if winner != room.winner_email:
+                            room.winner_email = winner
+                            room.save(update_fields=["winner_email"])
+                            stale.add(room.room_code)
+                            total_winners += 1
+
+            # Replays hold the turn scores and the winner; rebuild them once the chunk is committed.
+            for room in chunk:
+                if room.room_code in stale:
+                    store_replay(room)
+                    total_replays += 1
+
+            total_rooms += len(chunk)
+            self.stdout.write(f"{total_rooms} rooms, {total_turns} turns updated")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rescored {total_rooms} rooms in {time.perf_counter() - started:.2f}s: "
+                f"{total_turns} turns changed, {total_winners} winners changed, "
+                f"{total_replays} replays rebuilt"
+            )
+        )
+        if total_winners:
+            # Ratings were applied in closing order from the old winners; replay them all.
+            call_command("rebuild_ratings", stdout=self.stdout, stderr=self.stderr)
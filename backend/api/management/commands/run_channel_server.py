@@ -0,0 +1,30 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from api.channel_layer import ChannelLayerServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the shared server for BatchingChannelLayer, so several daphne "
+        "processes share groups (point CHANNEL_LAYER_SERVER at it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=6380, help="0 picks a free port.")
+        parser.add_argument("--group-expiry", type=float, default=86400, help="Seconds a membership lasts.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.serve(options))
+
+    async def serve(self, options):
+        server = await ChannelLayerServer(group_expiry=options["group_expiry"]).start(
+            options["host"], options["port"]
+        )
+        host, port = server.sockets[0].getsockname()[:2]
+        self.stdout.write(f"Channel layer server listening on {host}:{port}")
+        self.stdout.flush()
+        async with server:
+            await server.serve_forever()
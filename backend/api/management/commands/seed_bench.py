@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.bench import BENCH_PREFIX, bench_email, bench_kinde_id, bench_room_code
+from api.models import DebateRoom, DebateTurn, UserProfile
+
+WORDS = (
+    "policy evidence argument claim rebuttal economy energy nuclear climate education tax "
+    "freedom security privacy data market growth risk cost benefit study source fact "
+    "because therefore however although clearly suggests shows proves ignores assumes "
+    "the a of and to in that is for it on with as this are be not by"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed benchmark users, rooms and turns with deterministic identifiers "
+        "(emails bench<N>@example.com, room codes B<N>). Signals are not fired."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--rooms", type=int, default=1_000_000)
+        parser.add_argument("--turns-per-room", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--clear", action="store_true", help="Delete earlier benchmark data first.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("--users must be at least 2")
+        batch = options["batch_size"]
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+
+        if options["clear"]:
+            self.clear()
+        elif DebateRoom.objects.filter(room_code__startswith=BENCH_PREFIX).exists():
+            raise CommandError("Benchmark data already present; rerun with --clear")
+
+        self.seed_users(options["users"], batch)
+        profile_ids = dict(
+            UserProfile.objects.filter(kinde_id__startswith="bench-").values_list("kinde_id", "id")
+        )
+        self.seed_rooms(options["rooms"], options["users"], options["turns_per_room"], batch, rng, profile_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s"))
+
+    def clear(self):
+        self.stdout.write("Deleting earlier benchmark data...")
+        rooms = DebateRoom.objects.filter(room_code__startswith=BENCH_PREFIX)
+        DebateTurn.objects.filter(room__in=rooms).delete()
+        rooms.delete()
+        User.objects.filter(username__startswith="bench-").delete()
+
+    def seed_users(self, count, batch):
+        for start in range(0, count, batch):
+            indexes = range(start, min(count, start + batch))
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [User(username=bench_kinde_id(i), email=bench_email(i)) for i in indexes]
+                )
+                UserProfile.objects.bulk_create(
+                    [
+                        UserProfile(user=user, email=bench_email(i), kinde_id=bench_kinde_id(i))
+                        for i, user in zip(indexes, users)
+                    ]
+                )
+            self.stdout.write(f"users: {indexes.stop}/{count}")
+
+    def seed_rooms(self, count, users, turns_per_room, batch, rng, profile_ids):
+        rooms_per_batch = max(1, batch // max(1, turns_per_room))
+        for start in range(0, count, rooms_per_batch):
+            rooms, turns = [], []
+            for r in range(start, min(count, start + rooms_per_batch)):
+                attacker, defender = rng.sample(range(users), 2)
+                rooms.append(
+                    DebateRoom(
+                        room_code=bench_room_code(r),
+                        attacker_email=bench_email(attacker),
+                        defender_email=bench_email(defender),
+                        state=DebateRoom.STATE_LIVE,
+                    )
+                )
+                for n in range(1, turns_per_room + 1):
+                    speaker = attacker if n % 2 else defender
+                    words = rng.randint(20, 120)
+                    turns.append(
+                        DebateTurn(
+                            room_id=bench_room_code(r),
+                            speaker_id=profile_ids[bench_kinde_id(speaker)],
+                            speaker_role=DebateTurn.SPEAKER_ATTACKER if n % 2 else DebateTurn.SPEAKER_DEFENDER,
+                            text=" ".join(rng.choices(WORDS, k=words)),
+                            turn_number=n,
+                            turn_score=rng.randint(20, 90),
+                            duration_seconds=round(words / rng.uniform(2.0, 3.0), 1),
+                        )
+                    )
+            with transaction.atomic():
+                DebateRoom.objects.bulk_create(rooms, batch_size=batch)
+                DebateTurn.objects.bulk_create(turns, batch_size=batch)
+            done = start + len(rooms)
+            if done == count or (start // rooms_per_batch) % 20 == 0:
+                self.stdout.write(f"rooms: {done}/{count}")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.lifecycle import sweep
+
+
+class Command(BaseCommand):
+    help = "Expire idle rooms, build missing replays and archive finished debates (once, or every --loop seconds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rooms per transaction (ROOM_SWEEP_BATCH).")
+        parser.add_argument("--loop", type=float, default=0, help="Keep running, sweeping every N seconds.")
+        parser.add_argument("--no-expire", action="store_true", help="Skip idle expiry.")
+        parser.add_argument("--no-archive", action="store_true", help="Skip archiving.")
+        parser.add_argument("--no-replay", action="store_true", help="Skip building missing replays.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            result = sweep(
+                options["batch_size"],
+                expire=not options["no_expire"],
+                archive=not options["no_archive"],
+                replay=not options["no_replay"],
+            )
+            self.stdout.write(
+                f"deleted {result['deleted']} empty rooms, closed {result['closed']} idle rooms, "
+                f"built {result['replayed']} replays, "
+                f"archived {result['archived']} rooms in {time.perf_counter() - started:.2f}s"
+            )
+            if not options["loop"]:
+                break
+            close_old_connections()
+            time.sleep(options["loop"])
@@ -0,0 +1,546 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms live in a module-level registry and are
+updated from the hot paths (HTTP middleware, consumers, transcription client,
+Neon writes). Each update is a dict lookup plus a short lock, so instrumenting
+a handler costs well under a microsecond.
+
+With several daphne workers, set settings.METRICS_MULTIPROC_DIR to a shared
+directory: every process writes its snapshot there every
+METRICS_FLUSH_SECONDS, and the metrics endpoint merges all snapshots.
+Counters and histograms are summed across processes; gauges are summed over
+processes that flushed within METRICS_STALE_SECONDS. On collection, the
+snapshots of processes on this host that have exited are folded into one
+``<host>-dead.json`` file (counters and histograms only) and removed, so the
+directory does not grow with every worker restart and totals never go back.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def collect(self) -> dict:
+        """JSON-serializable snapshot of every metric in this process."""
+        return {name: metric.collect() for name, metric in list(self._metrics.items())}
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: Registry | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabeled(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "samples": [[list(key), child.value()] for key, child in list(self._children.items())],
+        }
+
+
+class _Value:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def value(self) -> float:
+        return self._value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = None
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabeled().dec(amount)
+
+    def set(self, value: float):
+        self._unlabeled().set(value)
+
+    def set_function(self, function):
+        """Read the (unlabeled) value from ``function`` at collection time."""
+        self._function = function
+
+    def collect(self) -> dict:
+        if self._function is not None:
+            try:
+                self._unlabeled().set(self._function())
+            except Exception:
+                logger.exception("Gauge %s callback failed", self.name)
+        return super().collect()
+
+
+class _HistogramValue:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, amount: float):
+        index = bisect_left(self._bounds, amount)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += amount
+
+    def value(self) -> dict:
+        with self._lock:
+            return {"counts": list(self._counts), "sum": self._sum}
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, amount: float):
+        self._unlabeled().observe(amount)
+
+    def time(self, *labelvalues):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self.labels(*labelvalues))
+
+    def collect(self) -> dict:
+        data = super().collect()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+# ---------------------------
+# Exposition
+# ---------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(snapshot: dict) -> str:
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labels"]
+        for values, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, values)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            bounds = [*metric["buckets"], float("inf")]
+            for bound, count in zip(bounds, value["counts"]):
+                cumulative += count
+                labels = _format_labels(labelnames, values, [("le", _format_number(bound))])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_number(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Multi-process aggregation
+# ---------------------------
+def multiproc_dir() -> str:
+    return getattr(settings, "METRICS_MULTIPROC_DIR", "")
+
+
+def _snapshot_path(directory: str) -> str:
+    return os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}.json")
+
+
+def flush(registry: Registry = REGISTRY):
+    """Write this process's snapshot to the multi-process directory."""
+    directory = multiproc_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(registry.collect(), fh)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _dead_snapshots(directory: str, host: str) -> list[str]:
+    """Snapshot files of processes on ``host`` that are no longer running."""
+    prefix = f"{host}-"
+    dead = []
+    for entry in os.scandir(directory):
+        pid = entry.name[len(prefix):-len(".json")]
+        if not entry.name.startswith(prefix) or not entry.name.endswith(".json") or not pid.isdigit():
+            continue
+        if int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            dead.append(entry.path)
+    return dead
+
+
+def prune_dead(directory: str) -> int:
+    """
+    Fold the snapshots of exited processes on this host into
+    ``<host>-dead.json`` and delete them. Returns the number folded.
+    """
+    host = socket.gethostname()
+    if not _dead_snapshots(directory, host):
+        return 0
+    archive = os.path.join(directory, f"{host}-dead.json")
+    with open(os.path.join(directory, f".{host}.lock"), "w") as lock:
+        # Another worker may be folding the same files; re-list under the lock.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshots, folded = [], []
+        for path in [archive, *_dead_snapshots(directory, host)]:
+            try:
+                with open(path) as fh:
+                    snapshots.append((json.load(fh), False))
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                logger.warning("Dropping unreadable metrics snapshot %s", path)
+            if path != archive:
+                folded.append(path)
+        if not folded:
+            return 0
+        tmp = f"{archive}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(merge(snapshots), fh)
+        os.replace(tmp, archive)
+        for path in folded:
+            os.remove(path)
+    return len(folded)
+
+
+def merge(snapshots: list[tuple[dict, bool]]) -> dict:
+    """
+    Combine (snapshot, fresh) pairs from several processes. Gauges from
+    processes that stopped flushing (not fresh) are left out.
+    """
+    merged: dict = {}
+    for snapshot, fresh in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == "gauge" and not fresh:
+                continue
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            samples = target["samples"]
+            for values, value in metric["samples"]:
+                key = tuple(values)
+                if key not in samples:
+                    samples[key] = json.loads(json.dumps(value))
+                elif metric["type"] == "histogram":
+                    current = samples[key]
+                    current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                    current["sum"] += value["sum"]
+                else:
+                    samples[key] += value
+    for metric in merged.values():
+        metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+    return merged
+
+
+def collect_all(registry: Registry = REGISTRY) -> dict:
+    """This process's metrics, merged with every other process when configured."""
+    directory = multiproc_dir()
+    if not directory:
+        return registry.collect()
+
+    flush(registry)
+    try:
+        prune_dead(directory)
+    except OSError:
+        logger.exception("Pruning dead metrics snapshots failed")
+    stale_after = getattr(settings, "METRICS_STALE_SECONDS", 60)
+    now = time.time()
+    snapshots = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as fh:
+                snapshots.append((json.load(fh), now - entry.stat().st_mtime <= stale_after))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+_flusher = None
+
+
+def start_flusher():
+    """Flush periodically (and at exit) when multi-process mode is on."""
+    global _flusher
+    if _flusher is not None or not multiproc_dir():
+        return
+    interval = getattr(settings, "METRICS_FLUSH_SECONDS", 5)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except Exception:
+                logger.exception("Flushing metrics failed")
+
+    _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+# ---------------------------
+# Channels instrumentation
+# ---------------------------
+class MetricsConsumerMixin:
+    """
+    Count WebSocket connects/disconnects, time every handler by event type,
+    audit its queries against any @query_budget on the handler and profile a
+    sample of events (see api.profiling). Put it first in
+    a consumer's bases and send to groups with ``self.group_send`` so sends are
+    counted per event type.
+    """
+
+    async def websocket_connect(self, message):
+        WS_CONNECTS.labels(type(self).__name__).inc()
+        WS_OPEN.labels(type(self).__name__).inc()
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        WS_DISCONNECTS.labels(type(self).__name__).inc()
+        WS_OPEN.labels(type(self).__name__).dec()
+        await super().websocket_disconnect(message)
+
+    async def group_send(self, group, event):
+        GROUP_SENDS.labels(event["type"]).inc()
+        await self.channel_layer.group_send(group, event)
+
+    async def dispatch(self, message):
+        from . import profiling
+        from .querybudget import audit_queries, budget_for
+
+        consumer = type(self).__name__
+        event = message.get("type", "")
+        handler = event.replace(".", "_")
+        path = self.scope.get("path", "")
+        session = None
+        if profiling.should_profile(path, self._profile_forced()):
+            session = profiling.start(f"{consumer}.{handler} {path}")
+        started = time.perf_counter()
+        try:
+            if session is not None:
+                # database_sync_to_async work runs on asgiref's sync thread.
+                await profiling.attach_sync_thread()
+            with audit_queries(f"{consumer}.{handler}", budget_for(self, handler)):
+                await super().dispatch(message)
+        finally:
+            WS_HANDLER_SECONDS.labels(consumer, event).observe(time.perf_counter() - started)
+            if session is not None:
+                profiling.stop(session)
+
+    def _profile_forced(self) -> bool:
+        forced = getattr(self, "_profiling_forced", None)
+        if forced is None:
+            from .profiling import header_forces
+
+            value = dict(self.scope.get("headers", ())).get(b"x-profile")
+            forced = self._profiling_forced = header_forces(value.decode("latin-1") if value else None)
+        return forced
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+HTTP_REQUESTS = Counter(
+    "debateit_http_requests_total", "HTTP requests by view, method and status.", ["view", "method", "status"]
+)
+HTTP_SECONDS = Histogram("debateit_http_request_seconds", "HTTP request latency by view.", ["view"])
+HTTP_QUERIES = Histogram(
+    "debateit_http_request_queries",
+    "Database queries per HTTP request by view.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+WS_CONNECTS = Counter("debateit_ws_connects_total", "WebSocket connections opened.", ["consumer"])
+WS_DISCONNECTS = Counter("debateit_ws_disconnects_total", "WebSocket connections closed.", ["consumer"])
+WS_OPEN = Gauge("debateit_ws_open", "WebSocket connections currently open.", ["consumer"])
+WS_HANDLER_SECONDS = Histogram(
+    "debateit_ws_handler_seconds",
+    "Consumer handler latency by event type.",
+    ["consumer", "event"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0),
+)
+GROUP_SENDS = Counter("debateit_group_send_total", "Channel layer group_send calls by event type.", ["event"])
+ACTIVE_ROOMS = Gauge("debateit_active_rooms", "Rooms with at least one connected participant.")
+MATCH_QUEUE_DEPTH = Gauge("debateit_matchmaking_queue_depth", "Players waiting for a match.")
+
+TRANSCRIPTION_SECONDS = Histogram(
+    "debateit_transcription_seconds", "Outbound transcription call latency by outcome.", ["outcome"]
+)
+TRANSCRIPTION_REJECTED = Counter(
+    "debateit_transcription_rejected_total", "Transcription calls rejected by the limiter or breaker."
+)
+NEON_SECONDS = Histogram("debateit_neon_write_seconds", "Neon transcript write latency by outcome.", ["outcome"])
+
+RATE_LIMITED = Counter(
+    "debateit_rate_limited_total", "Requests and messages rejected by a rate limit policy.", ["policy"]
+)
+RATE_LIMIT_BUCKETS = Gauge("debateit_rate_limit_buckets", "Token buckets held by the in-memory rate limiter.")
+
+SPECTATORS = Gauge("debateit_spectators", "Spectator sockets connected to this process.")
+SPECTATOR_BATCHES = Counter("debateit_spectator_batches_total", "Spectator batches encoded and fanned out.")
+SPECTATOR_DROPPED = Counter(
+    "debateit_spectator_dropped_total", "Room events left out of spectator batches past the per-tick cap."
+)
+
+CLOCK_TIMERS = Gauge("debateit_clock_timers", "Turn deadlines pending on this process's timer wheel.")
+CLOCK_TURNS = Counter("debateit_clock_turns_ended_total", "Debate clock turns ended, by reason.", ["reason"])
+
+EVENT_LOG_WRITTEN = Counter("debateit_event_log_written_total", "Room events written to the event log.")
+EVENT_LOG_DROPPED = Counter(
+    "debateit_event_log_dropped_total", "Room events dropped: writer full, room deleted or write failed."
+)
+EVENT_LOG_PENDING = Gauge("debateit_event_log_pending", "Room events queued for the next batch write.")
+EVENT_LOG_FLUSH_SECONDS = Histogram("debateit_event_log_flush_seconds", "Event log batch write latency.")
+
+ADMISSION_REJECTED = Counter(
+    "debateit_admission_rejected_total", "Connects and requests shed by admission control.", ["kind", "reason"]
+)
+ADMISSION_LOOP_LAG = Gauge("debateit_event_loop_lag_seconds", "Smoothed event loop lag seen by admission control.")
+ADMISSION_THREAD_QUEUE = Gauge("debateit_thread_queue_depth", "Sync work queued for a sync_to_async thread.")
+ADMISSION_INFLIGHT = Gauge("debateit_admission_inflight", "HTTP requests and WebSocket connects being handled.")
+
+CHANNEL_LAYER_BATCH_OPS = Histogram(
+    "debateit_channel_layer_batch_ops",
+    "Channel layer operations applied (or published) together in one event loop tick.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+CHANNEL_LAYER_DROPPED = Counter(
+    "debateit_channel_layer_dropped_total", "Channel layer messages dropped: channel full or expired.", ["reason"]
+)
+
+REPLAYS_BUILT = Counter("debateit_replays_built_total", "Debate replays built and stored.")
+REPLAY_BUILD_SECONDS = Histogram("debateit_replay_build_seconds", "Time to build and store one debate replay.")
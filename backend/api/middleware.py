@@ -1,10 +1,19 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from urllib.parse import parse_qs
-import jwt
-import requests
 from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from .admission import AdmissionThrottle, ensure_lag_monitor, get_admission
+from .metrics import HTTP_QUERIES, HTTP_REQUESTS, HTTP_SECONDS
+from . import profiling
+from .querybudget import audit_queries, budget_for
 
 class KindeAuthMiddleware(BaseMiddleware):
     """
@@ -32,6 +41,8 @@ class KindeAuthMiddleware(BaseMiddleware):
         Verify Kinde JWT token and return user info
         You might want to create a User object or just return user data
         """
+        import jwt  # only loaded where this middleware is installed
+
         try:
             # Decode the JWT token (without verification for now)
             # In production, verify with Kinde's public key
@@ -87,4 +98,172 @@ class KindeSessionAuthMiddleware(BaseMiddleware):
         except:
             pass
         
-        return AnonymousUser()
\ No newline at end of file
+        return AnonymousUser()
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs in both modes, so async views stay on the
+    event loop under ASGI. Subclasses implement __call__ and __acall__.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Record latency, status and database query count for every HTTP request,
+    labelled by the resolved view name.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with audit_queries("http", report=False) as queries:
+            response = self.get_response(request)
+        return self.record(request, response, started, queries)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with audit_queries("http", report=False) as queries:
+            response = await self.get_response(request)
+        return self.record(request, response, started, queries)
+
+    def record(self, request, response, started, queries):
+        elapsed = time.perf_counter() - started
+        view = view_name(request)
+        HTTP_REQUESTS.labels(view, request.method, response.status_code).inc()
+        HTTP_SECONDS.labels(view).observe(elapsed)
+        HTTP_QUERIES.labels(view).observe(queries.count)
+        return response
+
+
+class AdmissionMiddleware(HybridMiddleware):
+    """
+    Count requests in flight for admission control (see api.admission) and
+    shed writes to views guarded by AdmissionThrottle before they are queued
+    for a sync_to_async thread, with a 503 and Retry-After. This is the only
+    admission check for HTTP requests; the throttle just declares the priority.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        controller = get_admission()
+        with controller.tracking():
+            return self.shed(request, controller) or self.get_response(request)
+
+    async def __acall__(self, request):
+        ensure_lag_monitor()
+        controller = get_admission()
+        with controller.tracking():
+            return self.shed(request, controller) or await self.get_response(request)
+
+    @staticmethod
+    def shed(request, controller):
+        if request.method in ("GET", "HEAD", "OPTIONS"):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        view = getattr(match.func, "view_class", None)
+        throttles = getattr(view, "throttle_classes", None) or ()
+        guard = next((t for t in throttles if issubclass(t, AdmissionThrottle)), None)
+        if guard is None:
+            return None
+        decision = controller.check(f"http.{view.__name__}", guard.priority)
+        if decision.admitted:
+            return None
+        response = JsonResponse({"detail": "Server is busy, try again later."}, status=503)
+        response["Retry-After"] = str(math.ceil(decision.retry_after))
+        return response
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """
+    Audit the ORM queries of each request: log slow queries and likely N+1
+    patterns, and enforce budgets declared with @query_budget on the view.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with audit_queries(f"{request.method} {request.path}", report=False) as queries:
+            response = self.get_response(request)
+        return self.check(request, response, queries)
+
+    async def __acall__(self, request):
+        with audit_queries(f"{request.method} {request.path}", report=False) as queries:
+            response = await self.get_response(request)
+        return self.check(request, response, queries)
+
+    def check(self, request, response, queries):
+        match = getattr(request, "resolver_match", None)
+        budget = None
+        if match is not None:
+            view = getattr(match.func, "view_class", match.func)
+            budget = budget_for(view, request.method.lower())
+            queries.label = f"{request.method} {match.view_name}"
+        queries.report(budget)
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Sample the stack of a share of requests (see api.profiling). Requests
+    forced with the X-Profile header get the profile file name back in
+    X-Profile-Id. Async requests are sampled on the event loop thread and
+    on the thread that runs their sync work.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        forced = profiling.header_forces(request.META.get("HTTP_X_PROFILE"))
+        if not profiling.should_profile(request.path, forced):
+            return self.get_response(request)
+
+        session = profiling.start(f"{request.method} {request.path}")
+        try:
+            response = self.get_response(request)
+        finally:
+            name = profiling.stop(session)
+        if forced and name:
+            response["X-Profile-Id"] = name
+        return response
+
+    async def __acall__(self, request):
+        forced = profiling.header_forces(request.META.get("HTTP_X_PROFILE"))
+        if not profiling.should_profile(request.path, forced):
+            return await self.get_response(request)
+
+        session = profiling.start(f"{request.method} {request.path}")
+        try:
+            # Sync views and database calls run on the request's own thread.
+            await profiling.attach_sync_thread()
+            response = await self.get_response(request)
+        finally:
+            name = profiling.stop(session)
+        if forced and name:
+            response["X-Profile-Id"] = name
+        return response
+
+
+def view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unmatched"
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_update_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='debateroom',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='debateturn',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-19 16:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_initial_state(apps, schema_editor):
+    DebateRoom = apps.get_model("api", "DebateRoom")
+    DebateRoom.objects.filter(closed_at__isnull=False).update(state="finished")
+    DebateRoom.objects.filter(closed_at__isnull=True).exclude(defender_email="").update(state="live")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_player_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDebate',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='api.debateroom')),
+                ('turn_count', models.PositiveIntegerField(default=0)),
+                ('attacker_score', models.IntegerField(default=0)),
+                ('defender_score', models.IntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='debateroom',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='debateroom',
+            name='state',
+            field=models.CharField(choices=[('waiting', 'Waiting'), ('live', 'Live'), ('finished', 'Finished'), ('archived', 'Archived')], default='waiting', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='debateroom',
+            index=models.Index(fields=['state', 'last_activity_at'], name='api_room_state_activity_idx'),
+        ),
+        migrations.RunPython(set_initial_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 17:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_room_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'join'), (2, 'leave'), (3, 'chat'), (4, 'mute'), (5, 'unmute'), (6, 'turn_started'), (7, 'turn_ended')])),
+                ('actor', models.CharField(blank=True, default='', max_length=255)),
+                ('text', models.TextField(blank=True, default='')),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.debateroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'id'], name='api_roomevent_room_seq_idx')],
+            },
+        ),
+    ]
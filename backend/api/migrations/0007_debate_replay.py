@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_room_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebateReplay',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='replay', serialize=False, to='api.debateroom')),
+                ('version', models.PositiveSmallIntegerField(default=1)),
+                ('turn_count', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('payload', models.BinaryField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class UserProfile(models.Model):
@@ -18,11 +19,28 @@ class UserProfile(models.Model):
 
 
 class DebateRoom(models.Model):
+    STATE_WAITING = "waiting"
+    STATE_LIVE = "live"
+    STATE_FINISHED = "finished"
+    STATE_ARCHIVED = "archived"
+    STATE_CHOICES = [
+        (STATE_WAITING, "Waiting"),
+        (STATE_LIVE, "Live"),
+        (STATE_FINISHED, "Finished"),
+        (STATE_ARCHIVED, "Archived"),
+    ]
+
     room_code = models.CharField(max_length=16, primary_key=True)
     attacker_email = models.EmailField()
     defender_email = models.EmailField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     winner_email = models.EmailField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_WAITING)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["state", "last_activity_at"], name="api_room_state_activity_idx")]
 
     def __str__(self):
         return f"Room {self.room_code}"
@@ -45,6 +63,8 @@ class DebateTurn(models.Model):
     turn_number = models.PositiveIntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
     turn_score = models.IntegerField(default=0)
+    # Length of the spoken turn, when it came from a recording.
+    duration_seconds = models.FloatField(null=True, blank=True)
 
     class Meta:
         unique_together = ("room", "turn_number")
@@ -52,3 +72,117 @@ class DebateTurn(models.Model):
 
     def __str__(self):
         return f"{self.room.room_code} - Turn {self.turn_number} ({self.speaker_role})"
+
+
+class PlayerRating(models.Model):
+    """
+    Elo rating per player email, updated when a debate is closed.
+    Rebuild from history with ``manage.py rebuild_ratings``.
+    """
+
+    email = models.EmailField(primary_key=True)
+    rating = models.FloatField(default=1200.0)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-rating", "email"]
+        indexes = [models.Index(fields=["-rating", "email"], name="api_rating_rank_idx")]
+
+    def __str__(self):
+        return f"{self.email} ({self.rating:.0f})"
+
+
+class LeaderboardVersion(models.Model):
+    """
+    Single row counting rating changes, so every process can tell when its
+    in-memory leaderboard is stale. See api.ratings.
+    """
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Leaderboard version {self.version}"
+
+
+class ArchivedDebate(models.Model):
+    """
+    Turns of an archived room, moved out of DebateTurn as zlib-compressed JSON
+    in the API's turn format. See api.lifecycle.
+    """
+
+    room = models.OneToOneField(
+        DebateRoom, primary_key=True, related_name="archive", on_delete=models.CASCADE
+    )
+    turn_count = models.PositiveIntegerField(default=0)
+    attacker_score = models.IntegerField(default=0)
+    defender_score = models.IntegerField(default=0)
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of {self.room_id} ({self.turn_count} turns)"
+
+
+class DebateReplay(models.Model):
+    """
+    Replay of a finished room, precomputed by api.replay when it closes:
+    timeline, speaking intervals, talk time, score progression and top turns
+    as column arrays, stored as zlib-compressed JSON and served as is.
+    """
+
+    room = models.OneToOneField(
+        DebateRoom, primary_key=True, related_name="replay", on_delete=models.CASCADE
+    )
+    version = models.PositiveSmallIntegerField(default=1)
+    turn_count = models.PositiveIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    payload = models.BinaryField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Replay of {self.room_id} ({self.turn_count} turns)"
+
+
+class RoomEvent(models.Model):
+    """
+    Append-only log of what happened in a room's socket: joins, leaves, chat,
+    mute toggles and the debate clock. ``id`` is the sequence number; events
+    are written in batches by api.eventlog.
+    """
+
+    KIND_JOIN = 1
+    KIND_LEAVE = 2
+    KIND_CHAT = 3
+    KIND_MUTE = 4
+    KIND_UNMUTE = 5
+    KIND_TURN_STARTED = 6
+    KIND_TURN_ENDED = 7
+    KIND_CHOICES = [
+        (KIND_JOIN, "join"),
+        (KIND_LEAVE, "leave"),
+        (KIND_CHAT, "chat"),
+        (KIND_MUTE, "mute"),
+        (KIND_UNMUTE, "unmute"),
+        (KIND_TURN_STARTED, "turn_started"),
+        (KIND_TURN_ENDED, "turn_ended"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # Covered by the (room, id) index below.
+    room = models.ForeignKey(DebateRoom, related_name="events", on_delete=models.CASCADE, db_index=False)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    actor = models.CharField(max_length=255, blank=True, default="")
+    text = models.TextField(blank=True, default="")
+    data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["room", "id"], name="api_roomevent_room_seq_idx")]
+
+    def __str__(self):
+        return f"{self.room_id} #{self.id} {self.get_kind_display()}"
@@ -1,6 +1,8 @@
 import os
-import psycopg2
-from psycopg2.extras import execute_values
+import time
+
+from .metrics import NEON_SECONDS
+from .optional import optional_import
 
 
 def store_transcript(text: str, speaker: str | None = None, room_code: str | None = None):
@@ -15,7 +17,15 @@ def store_transcript(text: str, speaker: str | None = None, room_code: str | Non
     if not dsn:
         return
 
+    # Only deployments with Neon configured load the driver.
+    psycopg2 = optional_import("psycopg2")
+    extras = optional_import("psycopg2.extras")
+    if psycopg2 is None or extras is None:
+        return
+
     conn = None
+    started = time.perf_counter()
+    outcome = "failure"
     try:
         conn = psycopg2.connect(dsn)
         with conn:
@@ -31,14 +41,16 @@ def store_transcript(text: str, speaker: str | None = None, room_code: str | Non
                     )
                     """
                 )
-                execute_values(
+                extras.execute_values(
                     cur,
                     "INSERT INTO transcripts (room_code, speaker, content) VALUES %s",
                     [(room_code, speaker, text)],
                 )
+        outcome = "ok"
     except Exception:
         # Silent fail to avoid breaking user flow
         pass
     finally:
         if conn:
             conn.close()
+        NEON_SECONDS.labels(outcome).observe(time.perf_counter() - started)
@@ -0,0 +1,31 @@
+"""
+Optional integrations, imported on first use.
+
+The AssemblyAI SDK (transcription and streaming) and psycopg2 (Neon
+transcript storage) are only needed by the features that call them.
+Importing them at module level made every worker, management command and
+test run load them during django.setup(), configured or not.
+``optional_import`` imports a module the first time a feature asks for it
+and remembers a missing one as None. ``manage.py bench_startup`` tracks
+what startup still imports.
+"""
+import importlib
+import threading
+
+_modules = {}
+_lock = threading.Lock()
+
+
+def optional_import(name: str):
+    """The module ``name``, or None if it is not installed or fails to import."""
+    try:
+        return _modules[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _modules:
+            try:
+                _modules[name] = importlib.import_module(name)
+            except Exception:
+                _modules[name] = None
+        return _modules[name]
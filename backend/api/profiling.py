@@ -0,0 +1,322 @@
+"""
+Opt-in sampling profiler for HTTP requests and consumer events.
+
+A profiled request or event registers its thread with a shared sampler
+thread, which reads ``sys._current_frames()`` every PROFILING_INTERVAL_MS and
+counts the stacks it sees. The session is also carried in a ContextVar, so
+the threads that run the request's sync work are sampled too:
+``attach_sync_thread()`` registers the thread that runs this request's or
+event's thread-sensitive work (sync views, database_sync_to_async), and
+``attach()`` / ``traced(func)`` register any other executor thread for as long
+as the work runs there. When the request or event finishes, the counts are
+written as collapsed stacks (``frame;frame;frame count``, ready for
+flamegraph.pl or speedscope) to PROFILING_DIR, which keeps only the newest
+PROFILING_MAX_FILES files.
+
+What gets profiled:
+  - a PROFILING_SAMPLE_RATE share of requests/events whose path starts with
+    one of PROFILING_PATHS, while profiling is enabled (settings default,
+    switchable at runtime from the admin toggle endpoint), and
+  - any request, or any event of a WebSocket opened, with an ``X-Profile``
+    header equal to PROFILING_TOKEN.
+
+The event loop thread and asgiref's shared sync thread also run other work,
+so a profile shows whatever else ran there while it was being taken.
+
+The runtime toggle lives in the PROFILING_CACHE cache. With a shared backend
+(Redis, Memcached, the database cache) it switches every worker; with the
+default per-process LocMem cache it only switches the worker that served
+the toggle request, which the endpoint reports as ``"shared": false``.
+
+When profiling is off the check is a cached flag and a dict lookup.
+"""
+import functools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "profiling:state"
+STATE_REFRESH_SECONDS = 5.0
+_label_re = re.compile(r"[^A-Za-z0-9_.-]+")
+_LOCAL_CACHES = ("locmem.LocMemCache", "dummy.DummyCache")
+
+
+def state_cache():
+    return caches[getattr(settings, "PROFILING_CACHE", "default")]
+
+
+def state_shared() -> bool:
+    """Whether the toggle reaches other worker processes (the cache is not per-process)."""
+    backend = type(state_cache())
+    return not f"{backend.__module__}.{backend.__name__}".endswith(_LOCAL_CACHES)
+
+
+@dataclass
+class ProfilingState:
+    enabled: bool
+    sample_rate: float
+    paths: tuple[str, ...]
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            enabled=getattr(settings, "PROFILING_ENABLED", False),
+            sample_rate=getattr(settings, "PROFILING_SAMPLE_RATE", 0.01),
+            paths=tuple(getattr(settings, "PROFILING_PATHS", ("/api/", "/ws/"))),
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sampleRate": self.sample_rate,
+            "paths": list(self.paths),
+            "shared": state_shared(),
+        }
+
+
+_state = None
+_state_checked = 0.0
+
+
+def get_state() -> ProfilingState:
+    """Runtime state: the admin override from the cache, else settings. Re-read every few seconds."""
+    global _state, _state_checked
+    now = time.monotonic()
+    if _state is None or now - _state_checked > STATE_REFRESH_SECONDS:
+        override = state_cache().get(STATE_KEY)
+        _state = ProfilingState(**override) if override else ProfilingState.from_settings()
+        _state_checked = now
+    return _state
+
+
+def set_state(enabled: bool, sample_rate: float | None = None, paths=None) -> ProfilingState:
+    """Switch profiling for every process sharing PROFILING_CACHE (only this one with LocMem)."""
+    global _state
+    current = get_state()
+    _state = ProfilingState(
+        enabled=enabled,
+        sample_rate=current.sample_rate if sample_rate is None else min(1.0, max(0.0, sample_rate)),
+        paths=current.paths if paths is None else tuple(paths),
+    )
+    state_cache().set(STATE_KEY, {"enabled": _state.enabled, "sample_rate": _state.sample_rate,
+                          "paths": _state.paths}, None)
+    return _state
+
+
+def reset_state():
+    global _state
+    state_cache().delete(STATE_KEY)
+    _state = None
+
+
+def header_forces(value: str | None) -> bool:
+    token = getattr(settings, "PROFILING_TOKEN", "")
+    return bool(token and value and value == token)
+
+
+def should_profile(path: str, forced: bool = False) -> bool:
+    if forced:
+        return True
+    state = get_state()
+    if not state.enabled or not path.startswith(state.paths):
+        return False
+    return random.random() < state.sample_rate
+
+
+@dataclass
+class ProfileSession:
+    label: str
+    threads: set = field(default_factory=set)
+    started: float = field(default_factory=time.perf_counter)
+    stacks: dict = field(default_factory=dict)
+    samples: int = 0
+    token: object = None
+
+    def add(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            stack.append(f"{module}:{getattr(code, 'co_qualname', code.co_name)}")
+            frame = frame.f_back
+        key = tuple(reversed(stack))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        root = self.label.replace(";", ":")
+        return "".join(
+            f"{root};{';'.join(stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+
+class Sampler:
+    """One background thread sampling every registered session's thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sessions: dict[int, ProfileSession] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, session: ProfileSession):
+        with self._lock:
+            self._sessions[id(session)] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.pop(id(session), None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self._wakeup.clear()
+            # Sample under the lock so a session is never touched after remove().
+            with self._lock:
+                if self._sessions:
+                    frames = sys._current_frames()
+                    for session in self._sessions.values():
+                        for thread_id in tuple(session.threads):
+                            frame = frames.get(thread_id)
+                            if frame is not None and thread_id != me:
+                                session.add(frame)
+                    del frames
+                    idle = False
+                else:
+                    idle = True
+            if idle:
+                self._wakeup.wait()
+            else:
+                time.sleep(self.interval)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+_sequence = count(1)
+
+
+def get_sampler() -> Sampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler(getattr(settings, "PROFILING_INTERVAL_MS", 5) / 1000)
+        return _sampler
+
+
+_current: ContextVar = ContextVar("profile_session", default=None)
+
+
+def start(label: str) -> ProfileSession:
+    """Start sampling the calling thread; the session is current in this context until stop()."""
+    session = ProfileSession(label=label, threads={threading.get_ident()})
+    session.token = _current.set(session)
+    get_sampler().add(session)
+    return session
+
+
+@contextmanager
+def attach():
+    """Sample the calling thread for the context's session (if any) while the block runs."""
+    session = _current.get()
+    ident = threading.get_ident()
+    if session is None or ident in session.threads:
+        yield
+        return
+    session.threads.add(ident)
+    try:
+        yield
+    finally:
+        session.threads.discard(ident)
+
+
+def traced(func):
+    """``func`` wrapped in attach(), for sync_to_async(..., thread_sensitive=False) calls."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with attach():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _attach_thread(session: ProfileSession):
+    session.threads.add(threading.get_ident())
+
+
+async def attach_sync_thread():
+    """
+    Register the thread that runs this context's thread-sensitive sync work:
+    the request's own thread under Django's ASGI handler, asgiref's shared
+    sync thread for consumers. It is sampled until the session stops.
+    """
+    session = _current.get()
+    if session is not None:
+        await sync_to_async(_attach_thread, thread_sensitive=True)(session)
+
+
+def stop(session: ProfileSession) -> str | None:
+    """Stop sampling and queue the collapsed stacks for writing. Returns the file name."""
+    get_sampler().remove(session)
+    if session.token is not None:
+        try:
+            _current.reset(session.token)
+        except ValueError:
+            # Stopped from another context than the one that started it.
+            pass
+        session.token = None
+    if not session.samples:
+        return None
+    elapsed_ms = (time.perf_counter() - session.started) * 1000
+    name = (
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}-"
+        f"{_label_re.sub('_', session.label).strip('_')[:80]}-{elapsed_ms:.0f}ms.folded"
+    )
+    _writer.submit(_write, name, session.collapsed())
+    return name
+
+
+def _write(name: str, data: str):
+    directory = getattr(settings, "PROFILING_DIR", "")
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{name}.tmp")
+        with open(tmp, "w") as fh:
+            fh.write(data)
+        os.replace(tmp, os.path.join(directory, name))
+        _rotate(directory, getattr(settings, "PROFILING_MAX_FILES", 200))
+    except OSError:
+        logger.exception("Could not write profile %s", name)
+
+
+def _rotate(directory: str, keep: int):
+    entries = [e for e in os.scandir(directory) if e.name.endswith(".folded")]
+    if len(entries) <= keep:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[: len(entries) - keep]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,134 @@
+"""
+Per-request and per-event ORM query auditing.
+
+Every database connection gets an execute hook that reports each query to
+the audits active in the current context (a ContextVar, so it follows
+sync_to_async/database_sync_to_async into worker threads). An audit counts
+and times queries and groups them by shape (SQL with parameters and IN lists
+collapsed). When it finishes it:
+
+  - logs queries slower than settings.QUERY_SLOW_MS to the ``api.queries``
+    logger,
+  - flags a shape repeated settings.QUERY_N_PLUS_ONE_THRESHOLD or more times
+    as a likely N+1,
+  - compares the count to the budget declared with @query_budget and, with
+    settings.QUERY_BUDGET_STRICT on (tests), raises QueryBudgetExceeded.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger("api.queries")
+
+_active: ContextVar[tuple] = ContextVar("query_audits", default=())
+
+_whitespace_re = re.compile(r"\s+")
+_in_list_re = re.compile(r"IN \((?:%s, )*%s\)")
+_literal_re = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_shape(sql: str) -> str:
+    sql = _whitespace_re.sub(" ", sql).strip()
+    sql = _in_list_re.sub("IN (...)", sql)
+    return _literal_re.sub("?", sql)
+
+
+def query_budget(limit: int):
+    """
+    Declare the most queries a view (class, function or HTTP method) or a
+    consumer handler may run.
+    """
+    def decorate(target):
+        target.query_budget = limit
+        return target
+
+    return decorate
+
+
+def budget_for(target, method: str | None = None) -> int | None:
+    """Budget declared on ``method`` of ``target`` if any, else on ``target``."""
+    if method:
+        budget = getattr(getattr(target, method, None), "query_budget", None)
+        if budget is not None:
+            return budget
+    return getattr(target, "query_budget", None)
+
+
+class QueryAudit:
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+        self.slow: list[tuple[float, str]] = []
+        self._slow_seconds = getattr(settings, "QUERY_SLOW_MS", 100) / 1000
+
+    def record(self, sql: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[query_shape(sql)] += 1
+        if elapsed >= self._slow_seconds:
+            self.slow.append((elapsed, sql))
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        threshold = threshold or getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 5)
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self, budget: int | None = None):
+        for elapsed, sql in self.slow:
+            logger.warning("Slow query in %s (%.1f ms): %s", self.label, elapsed * 1000, sql)
+        repeated = self.repeated()
+        for shape, n in repeated:
+            logger.warning("Possible N+1 in %s: %d x %s", self.label, n, shape)
+
+        if budget is not None and self.count > budget:
+            message = f"{self.label} ran {self.count} queries (budget {budget})"
+            if repeated:
+                message += "; repeated: " + "; ".join(f"{n} x {shape}" for shape, n in repeated)
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+@contextmanager
+def audit_queries(label: str, budget: int | None = None, report: bool = True):
+    """Audit every query run in this context (and threads it hands off to)."""
+    audit = QueryAudit(label)
+    token = _active.set((*_active.get(), audit))
+    try:
+        yield audit
+    finally:
+        _active.reset(token)
+    if report:
+        audit.report(budget)
+
+
+def _execute_hook(execute, sql, params, many, context):
+    audits = _active.get()
+    if not audits:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for audit in audits:
+            audit.record(sql, elapsed)
+
+
+@receiver(connection_created)
+def install_hook(sender, connection, **kwargs):
+    if _execute_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_hook)
+
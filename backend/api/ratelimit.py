@@ -0,0 +1,268 @@
+"""
+Token-bucket rate limiting for REST views and WebSocket messages.
+
+A policy ("ws.chat_message", "http.turns", ...) is a rate and a burst,
+written "<count>/<s|m|h>[:<burst>]" in settings.RATE_LIMITS. Each
+(policy, key) pair has its own bucket that holds up to ``burst`` tokens and
+refills at ``rate``; a request or message spends one. Keys are an identity
+(Kinde subject, email or client IP) or a room code, so a policy can cap one
+client and, separately, everything fanned out to one room.
+
+Backends:
+  - memory: buckets in a dict in this process, O(1) per check, the least
+    recently used bucket evicted past RATE_LIMIT_MAX_KEYS. The default.
+  - cache: buckets in a Django cache (RATE_LIMIT_CACHE) shared by every
+    worker. Read-modify-write, so concurrent checks on one key may let a
+    token or two through; locmem stands in for Redis locally.
+
+Used as DRF throttles (PolicyThrottle subclasses) and from consumers
+(RateLimitMixin). Rejections are counted in debateit_rate_limited_total.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import RATE_LIMIT_BUCKETS, RATE_LIMITED
+
+PERIODS = {"s": 1.0, "m": 60.0, "h": 3600.0}
+_rate_re = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d*)\s*([smh])\s*(?::\s*(\d+))?\s*$")
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    rate: float  # tokens per second
+    burst: float
+
+    @classmethod
+    def parse(cls, name: str, spec: str):
+        match = _rate_re.match(spec)
+        if not match:
+            raise ValueError(f"Bad rate limit {name}={spec!r}; expected e.g. '5/s:10' or '30/m'")
+        count, multiple, unit, burst = match.groups()
+        period = PERIODS[unit] * (int(multiple) if multiple else 1)
+        count = float(count)
+        return cls(name=name, rate=count / period, burst=float(burst) if burst else max(1.0, count))
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+def take(state, policy: Policy, now: float, cost: float = 1.0):
+    """Refill ``state`` ((tokens, stamp) or None) and spend ``cost``. Returns (decision, new state)."""
+    if state is None:
+        tokens = policy.burst
+    else:
+        tokens, stamp = state
+        tokens = min(policy.burst, tokens + (now - stamp) * policy.rate)
+    if tokens >= cost:
+        tokens -= cost
+        return Decision(True, tokens, 0.0), (tokens, now)
+    wait = (cost - tokens) / policy.rate if policy.rate > 0 else float("inf")
+    return Decision(False, tokens, wait), (tokens, now)
+
+
+class MemoryBackend:
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def consume(self, key: str, policy: Policy, cost: float = 1.0) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            decision, state = take(self._buckets.get(key), policy, now, cost)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return decision
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    blocking = True
+
+    def __init__(self, alias: str = "default"):
+        self.cache = caches[alias]
+
+    def consume(self, key: str, policy: Policy, cost: float = 1.0) -> Decision:
+        key = f"ratelimit:{key}"
+        now = time.time()
+        decision, state = take(self.cache.get(key), policy, now, cost)
+        # Keep the key until the bucket would be full again anyway.
+        ttl = (policy.burst - state[0]) / policy.rate if policy.rate > 0 else None
+        self.cache.set(key, state, max(1, int(ttl) + 1) if ttl is not None else None)
+        return decision
+
+
+class RateLimiter:
+    def __init__(self, backend, policies: dict[str, Policy], enabled: bool = True):
+        self.backend = backend
+        self.policies = policies
+        self.enabled = enabled
+
+    def check(self, policy_name: str, key: str, cost: float = 1.0) -> Decision:
+        """Spend from ``key``'s bucket for ``policy_name``. Unknown policies always pass."""
+        policy = self.policies.get(policy_name)
+        if not self.enabled or policy is None or key is None:
+            return Decision(True, float("inf"), 0.0)
+        decision = self.backend.consume(f"{policy_name}:{key}", policy, cost)
+        if not decision.allowed:
+            RATE_LIMITED.labels(policy_name).inc()
+        return decision
+
+    def check_all(self, checks) -> Decision:
+        """Check several (policy, key) pairs; the first rejection wins."""
+        for policy_name, key in checks:
+            decision = self.check(policy_name, key)
+            if not decision.allowed:
+                return decision
+        return Decision(True, float("inf"), 0.0)
+
+
+def load_policies(specs: dict) -> dict[str, Policy]:
+    return {name: Policy.parse(name, spec) for name, spec in specs.items() if spec}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            if getattr(settings, "RATE_LIMIT_BACKEND", "memory") == "cache":
+                backend = CacheBackend(getattr(settings, "RATE_LIMIT_CACHE", "default"))
+            else:
+                backend = MemoryBackend(getattr(settings, "RATE_LIMIT_MAX_KEYS", 100_000))
+                RATE_LIMIT_BUCKETS.set_function(lambda: len(backend))
+            _limiter = RateLimiter(
+                backend,
+                load_policies(getattr(settings, "RATE_LIMITS", {})),
+                enabled=getattr(settings, "RATE_LIMIT_ENABLED", True),
+            )
+        return _limiter
+
+
+def reset_limiter():
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+def token_subject(request) -> str | None:
+    """Kinde subject from the bearer token, unverified; only used as a bucket key."""
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    import jwt
+
+    try:
+        return jwt.decode(header[7:], options={"verify_signature": False}).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+
+class PolicyThrottle(BaseThrottle):
+    """
+    DRF throttle backed by a rate limit policy. ``policy`` buckets per caller
+    (token subject, else client IP); ``room_policy``, if set, also buckets per
+    room code from the URL, query string or body. Only ``methods`` are limited.
+    """
+
+    policy: str = ""
+    room_policy: str = ""
+    methods = ("POST",)
+
+    def allow_request(self, request, view):
+        if request.method not in self.methods:
+            return True
+        checks = [(self.policy, token_subject(request) or self.get_ident(request))]
+        if self.room_policy:
+            room = self.room_code(request, view)
+            if room:
+                checks.append((self.room_policy, room))
+        self.decision = get_limiter().check_all(checks)
+        return self.decision.allowed
+
+    def wait(self):
+        return self.decision.retry_after
+
+    @staticmethod
+    def room_code(request, view):
+        kwargs = getattr(view, "kwargs", None) or {}
+        if kwargs.get("room_code"):
+            return kwargs["room_code"]
+        data = getattr(view, "data", None)
+        if data is None:
+            data = getattr(request, "data", {})
+        return request.GET.get("room_code") or data.get("room_code")
+
+
+class TranscribeThrottle(PolicyThrottle):
+    policy = "http.transcribe"
+
+
+class TurnThrottle(PolicyThrottle):
+    policy = "http.turns"
+    room_policy = "http.room.turns"
+
+
+class RateLimitMixin:
+    """
+    Consumer guard: ``await self.rate_limited(message_type)`` spends from
+    this identity's ``ws.message`` (every frame) and ``ws.<type>`` buckets and
+    from the ``ws.room.<type>`` bucket of self.rate_limit_room, and tells the
+    client (at most once a second, through the consumer's send_event) when a
+    message is dropped.
+    """
+
+    rate_limit_room = None
+    _rate_notice_at = 0.0
+
+    def rate_limit_identity(self):
+        return getattr(self, "rate_identity", None) or self.channel_name
+
+    async def rate_limited(self, message_type: str) -> bool:
+        limiter = get_limiter()
+        identity = self.rate_limit_identity()
+        checks = [("ws.message", identity), (f"ws.{message_type}", identity)]
+        if self.rate_limit_room:
+            checks.append((f"ws.room.{message_type}", self.rate_limit_room))
+        if limiter.backend.blocking:
+            decision = await sync_to_async(limiter.check_all, thread_sensitive=False)(checks)
+        else:
+            decision = limiter.check_all(checks)
+        if decision.allowed:
+            return False
+
+        now = time.monotonic()
+        if now - self._rate_notice_at >= 1.0:
+            self._rate_notice_at = now
+            await self.send_event({
+                "type": "rate_limited",
+                "messageType": message_type,
+                "retryAfter": round(decision.retry_after, 2),
+            })
+        return True
@@ -0,0 +1,253 @@
+"""
+Player ratings and leaderboard.
+
+PlayerRating holds an Elo rating per email and is updated once per closed
+debate (see signals.rate_closed_debate). Each process keeps a Leaderboard: an
+email -> rating map, a Fenwick tree over integer rating buckets and the
+emails sorted by (-rating, email). It answers rank-of-player in O(log n),
+rating lookups with no query (what MatchmakingConsumer uses) and the emails
+on any leaderboard page by slicing, so a page is one primary-key query.
+
+The LeaderboardVersion row counts rating changes. Every process compares it
+with its leaderboard's version (one primary-key read) at most once every
+settings.LEADERBOARD_VERSION_CHECK_SECONDS, so a leaderboard changed by
+another process reloads itself within that time and warm lookups run no
+query. Changes made by this process apply at once. Pages are cached per
+version.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LeaderboardVersion, PlayerRating
+
+logger = logging.getLogger(__name__)
+
+RATING_BUCKETS = 4096
+MAX_PAGE_SIZE = 100
+
+
+def initial_rating() -> float:
+    return float(getattr(settings, "RATING_INITIAL", 1200.0))
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((opponent - rating) / 400.0))
+
+
+def elo_update(attacker: float, defender: float, attacker_score: float, k: float | None = None):
+    """New (attacker, defender) ratings; ``attacker_score`` is 1, 0.5 or 0."""
+    k = k if k is not None else getattr(settings, "RATING_K_FACTOR", 32.0)
+    delta = k * (attacker_score - expected_score(attacker, defender))
+    return attacker + delta, defender - delta
+
+
+class FenwickTree:
+    """Counts per bucket with O(log n) point updates and prefix sums."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int):
+        i = index + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """Sum of buckets 0..index inclusive."""
+        total = 0
+        i = min(index, self.size - 1) + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+def bucket(rating: float) -> int:
+    return min(RATING_BUCKETS - 1, max(0, int(round(rating))))
+
+
+class Leaderboard:
+    """
+    In-memory rating map, rank index and leaderboard order. Players with the
+    same rounded rating share a rank.
+    """
+
+    def __init__(self, rows=(), version: int = 0):
+        self._lock = threading.Lock()
+        self._ratings: dict[str, float] = {}
+        self._tree = FenwickTree(RATING_BUCKETS)
+        self.version = version
+        for email, rating in rows:
+            self._ratings[email] = rating
+            self._tree.add(bucket(rating), 1)
+        self._order = sorted((-rating, email) for email, rating in self._ratings.items())
+
+    def __len__(self):
+        return len(self._ratings)
+
+    def set(self, email: str, rating: float):
+        with self._lock:
+            old = self._ratings.get(email)
+            if old is not None:
+                self._tree.add(bucket(old), -1)
+                del self._order[bisect_left(self._order, (-old, email))]
+            self._ratings[email] = rating
+            self._tree.add(bucket(rating), 1)
+            insort(self._order, (-rating, email))
+
+    def rating_of(self, email: str) -> float | None:
+        return self._ratings.get(email)
+
+    def rank_of_rating(self, rating: float) -> int:
+        with self._lock:
+            return 1 + len(self._ratings) - self._tree.prefix(bucket(rating))
+
+    def rank_of(self, email: str) -> int | None:
+        rating = self._ratings.get(email)
+        return None if rating is None else self.rank_of_rating(rating)
+
+    def emails(self, offset: int, limit: int) -> list[str]:
+        """Emails in leaderboard order, ``limit`` of them from position ``offset``."""
+        with self._lock:
+            return [email for _, email in self._order[offset:offset + limit]]
+
+
+_board = None
+_board_checked_at = 0.0
+_board_lock = threading.Lock()
+
+
+def _current_version() -> int:
+    return LeaderboardVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+def _bump_version() -> int:
+    with transaction.atomic():
+        if not LeaderboardVersion.objects.filter(pk=1).update(version=F("version") + 1):
+            LeaderboardVersion.objects.get_or_create(pk=1)
+            LeaderboardVersion.objects.filter(pk=1).update(version=F("version") + 1)
+        return LeaderboardVersion.objects.values_list("version", flat=True).get(pk=1)
+
+
+def get_leaderboard() -> Leaderboard:
+    """
+    Return this process's leaderboard, loading it (one query) on first use or
+    after another process changed ratings. The version check (one primary-key
+    read) runs at most once per LEADERBOARD_VERSION_CHECK_SECONDS.
+    """
+    global _board, _board_checked_at
+    ttl = getattr(settings, "LEADERBOARD_VERSION_CHECK_SECONDS", 2.0)
+    with _board_lock:
+        if _board is not None and time.monotonic() - _board_checked_at < ttl:
+            return _board
+
+    version = _current_version()
+    with _board_lock:
+        if _board is None or _board.version != version:
+            rows = PlayerRating.objects.values_list("email", "rating").iterator(chunk_size=5000)
+            _board = Leaderboard(rows, version=version)
+        _board_checked_at = time.monotonic()
+        return _board
+
+
+def invalidate(changes=()):
+    """
+    Publish rating changes. ``changes`` ((email, rating) pairs) are applied to
+    this process's leaderboard when it was current; otherwise it reloads.
+    """
+    global _board
+    version = _bump_version()
+    with _board_lock:
+        if _board is None:
+            return
+        if changes and _board.version == version - 1:
+            for email, rating in changes:
+                _board.set(email, rating)
+            _board.version = version
+        else:
+            _board = None
+
+
+def apply_result(room) -> tuple[PlayerRating, PlayerRating] | None:
+    """
+    Update both players' ratings for a closed room. A room without a
+    defender is not rated; no winner counts as a draw.
+    """
+    attacker_email, defender_email = room.attacker_email, room.defender_email
+    if not attacker_email or not defender_email or attacker_email == defender_email:
+        return None
+
+    if room.winner_email == attacker_email:
+        attacker_score = 1.0
+    elif room.winner_email == defender_email:
+        attacker_score = 0.0
+    else:
+        attacker_score = 0.5
+
+    with transaction.atomic():
+        # First games create both rows in one INSERT; existing rows are left alone.
+        PlayerRating.objects.bulk_create(
+            [PlayerRating(email=email, rating=initial_rating()) for email in sorted((attacker_email, defender_email))],
+            ignore_conflicts=True,
+        )
+        players = PlayerRating.objects.select_for_update().in_bulk([attacker_email, defender_email])
+        attacker, defender = players[attacker_email], players[defender_email]
+        attacker.rating, defender.rating = elo_update(attacker.rating, defender.rating, attacker_score)
+        record_game(attacker, attacker_score)
+        record_game(defender, 1.0 - attacker_score)
+        attacker.updated_at = defender.updated_at = timezone.now()
+        PlayerRating.objects.bulk_update(
+            [attacker, defender], ["rating", "games", "wins", "losses", "draws", "updated_at"]
+        )
+
+        changes = [(attacker.email, attacker.rating), (defender.email, defender.rating)]
+        transaction.on_commit(lambda: invalidate(changes))
+    return attacker, defender
+
+
+def record_game(player: PlayerRating, score: float):
+    player.games += 1
+    if score == 1.0:
+        player.wins += 1
+    elif score == 0.0:
+        player.losses += 1
+    else:
+        player.draws += 1
+
+
+def top_page(page: int = 1, page_size: int = 50) -> dict:
+    """One leaderboard page, cached until the next rating change."""
+    page = max(1, page)
+    page_size = min(MAX_PAGE_SIZE, max(1, page_size))
+    board = get_leaderboard()
+    key = f"leaderboard:page:{board.version}:{page}:{page_size}"
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    # The leaderboard already holds the order: no OFFSET scan, only the page's rows.
+    emails = board.emails((page - 1) * page_size, page_size)
+    rows = {
+        row["email"]: row
+        for row in PlayerRating.objects.filter(email__in=emails).values(
+            "email", "rating", "games", "wins", "losses", "draws"
+        )
+    }
+    players = [
+        {**row, "rank": board.rank_of_rating(row["rating"]), "rating": round(row["rating"], 1)}
+        for row in (rows.get(email) for email in emails)
+        if row is not None
+    ]
+    data = {"page": page, "pageSize": page_size, "total": len(board), "players": players}
+    cache.set(key, data, getattr(settings, "LEADERBOARD_CACHE_SECONDS", 60))
+    return data
@@ -0,0 +1,232 @@
+"""
+Debate replays.
+
+Replaying a finished debate needs its turns (from DebateTurn or the
+archive), their scores and the room's event log, lined up in time. Rather
+than join those on every view, ``build_replay`` assembles one document when
+the room closes and stores it as a DebateReplay row. The replay endpoint then
+serves the stored bytes with a single primary-key read.
+
+The document is column-oriented: every series is a set of parallel arrays,
+and times are seconds since the room was created (createdAt and closedAt are
+ISO 8601, as in the room endpoints).
+
+  - turns: turnNumber, role, speaker, at (when saved), duration, score,
+    words, text;
+  - scores: running attacker and defender totals after each turn;
+  - speaking: role, start, end of each turn on the debate clock (derived
+    from turn durations for rooms that never ran the clock);
+  - talkTime: seconds spoken per side;
+  - timeline: at, type, actor of each logged event (chat text is left out);
+  - topTurns: indexes of the REPLAY_TOP_TURNS best-scoring turns.
+
+The debate_closed signal schedules the build on a one-thread pool after
+REPLAY_DELAY_SECONDS, so the event log has flushed the room's last events.
+``sweep_rooms`` builds any replay that is still missing.
+"""
+import json
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from .eventlog import KIND_NAMES
+from .lifecycle import room_turns
+from .metrics import REPLAY_BUILD_SECONDS, REPLAYS_BUILT
+from .models import DebateReplay, DebateRoom, DebateTurn, RoomEvent
+
+logger = logging.getLogger(__name__)
+
+REPLAY_VERSION = 2
+ROLES = (DebateTurn.SPEAKER_ATTACKER, DebateTurn.SPEAKER_DEFENDER)
+
+
+def encode_replay(document: dict) -> bytes:
+    # DRF's encoder, so createdAt/closedAt read like the room endpoints' ("...T...Z").
+    return zlib.compress(json.dumps(document, separators=(",", ":"), cls=JSONEncoder).encode(), 6)
+
+
+def decode_replay(payload) -> bytes:
+    """The stored document as JSON bytes, ready to send."""
+    return zlib.decompress(bytes(payload))
+
+
+def _offset(origin, moment) -> float | None:
+    if isinstance(moment, str):
+        moment = parse_datetime(moment)
+    if moment is None:
+        return None
+    return round((moment - origin).total_seconds(), 3)
+
+
+def speaking_intervals(events, closed_at: float) -> list[tuple[str, float, float]]:
+    """(role, start, end) per clock turn from (type, actor, at) events; a turn still open ends at ``closed_at``."""
+    intervals, open_turn = [], None
+    for kind, actor, at in events:
+        if kind == RoomEvent.KIND_TURN_STARTED:
+            if open_turn is not None:
+                intervals.append((open_turn[0], open_turn[1], at))
+            open_turn = (actor, at)
+        elif kind == RoomEvent.KIND_TURN_ENDED and open_turn is not None:
+            intervals.append((open_turn[0], open_turn[1], at))
+            open_turn = None
+    if open_turn is not None:
+        intervals.append((open_turn[0], open_turn[1], max(open_turn[1], closed_at)))
+    return intervals
+
+
+def build_replay(room: DebateRoom, top: int | None = None) -> dict:
+    """The replay document of ``room`` (see the module docstring)."""
+    top = getattr(settings, "REPLAY_TOP_TURNS", 3) if top is None else top
+    origin = room.created_at
+    closed = _offset(origin, room.closed_at) if room.closed_at else 0.0
+
+    turns = {key: [] for key in ("turnNumber", "role", "speaker", "at", "duration", "score", "words", "text")}
+    scores = {"attacker": [], "defender": []}
+    totals = dict.fromkeys(ROLES, 0)
+    seats = {DebateTurn.SPEAKER_ATTACKER: room.attacker_email, DebateTurn.SPEAKER_DEFENDER: room.defender_email}
+    for turn in room_turns(room):
+        role = turn["speaker_role"]
+        turns["turnNumber"].append(turn["turn_number"])
+        turns["role"].append(role)
+        turns["speaker"].append(turn.get("speaker_email") or seats.get(role) or None)
+        turns["at"].append(_offset(origin, turn["timestamp"]))
+        turns["duration"].append(turn["duration_seconds"])
+        turns["score"].append(turn["turn_score"])
+        turns["words"].append(len(turn["text"].split()))
+        turns["text"].append(turn["text"])
+        totals[role] = totals.get(role, 0) + turn["turn_score"]
+        scores["attacker"].append(totals[DebateTurn.SPEAKER_ATTACKER])
+        scores["defender"].append(totals[DebateTurn.SPEAKER_DEFENDER])
+
+    timeline = {"at": [], "type": [], "actor": []}
+    clock_events = []
+    rows = RoomEvent.objects.filter(room=room).order_by("id").values_list("kind", "actor", "created_at")
+    for kind, actor, created_at in rows.iterator(chunk_size=2000):
+        at = _offset(origin, created_at)
+        timeline["at"].append(at)
+        timeline["type"].append(KIND_NAMES.get(kind, kind))
+        timeline["actor"].append(actor)
+        if kind in (RoomEvent.KIND_TURN_STARTED, RoomEvent.KIND_TURN_ENDED):
+            clock_events.append((kind, actor, at))
+
+    intervals = speaking_intervals(clock_events, closed)
+    if not intervals:
+        # No clock: a turn was spoken for its recorded duration before it was saved.
+        intervals = [
+            (role, max(0.0, round(at - duration, 3)), at)
+            for role, at, duration in zip(turns["role"], turns["at"], turns["duration"])
+            if at is not None and duration
+        ]
+    speaking = {"role": [], "start": [], "end": []}
+    talk_time = {"attacker": 0.0, "defender": 0.0}
+    for role, start, end in intervals:
+        speaking["role"].append(role)
+        speaking["start"].append(start)
+        speaking["end"].append(end)
+        side = "attacker" if role == DebateTurn.SPEAKER_ATTACKER else "defender"
+        talk_time[side] = round(talk_time[side] + end - start, 3)
+
+    order = sorted(range(len(turns["score"])), key=lambda index: (-turns["score"][index], index))
+    return {
+        "version": REPLAY_VERSION,
+        "roomCode": room.room_code,
+        "attackerEmail": room.attacker_email,
+        "defenderEmail": room.defender_email or None,
+        "winnerEmail": room.winner_email,
+        "createdAt": origin,
+        "closedAt": room.closed_at,
+        "durationSeconds": closed,
+        "turns": turns,
+        "scores": scores,
+        "speaking": speaking,
+        "talkTime": talk_time,
+        "timeline": timeline,
+        "topTurns": order[:top],
+    }
+
+
+def store_replay(room: DebateRoom) -> DebateReplay:
+    """Build the room's replay and save it, replacing an older one."""
+    started = time.perf_counter()
+    document = build_replay(room)
+    replay, _ = DebateReplay.objects.update_or_create(
+        room=room,
+        defaults={
+            "version": REPLAY_VERSION,
+            "turn_count": len(document["turns"]["turnNumber"]),
+            "duration_seconds": document["durationSeconds"] or 0,
+            "payload": encode_replay(document),
+        },
+    )
+    REPLAY_BUILD_SECONDS.observe(time.perf_counter() - started)
+    REPLAYS_BUILT.inc()
+    return replay
+
+
+def build_missing_replays(batch_size: int | None = None) -> int:
+    """Build replays for up to ``batch_size`` closed rooms that have none. Returns the number built."""
+    batch_size = batch_size or getattr(settings, "ROOM_SWEEP_BATCH", 200)
+    rooms = (
+        DebateRoom.objects.filter(state__in=(DebateRoom.STATE_FINISHED, DebateRoom.STATE_ARCHIVED))
+        .filter(~Exists(DebateReplay.objects.filter(room=OuterRef("pk"))))
+        .order_by("closed_at")[:batch_size]
+    )
+    built = 0
+    for room in rooms:
+        try:
+            store_replay(room)
+            built += 1
+        except Exception:
+            logger.exception("Building the replay of %s failed", room.room_code)
+    return built
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replay")
+        return _executor
+
+
+def _build_in_background(room_code: str, due: float):
+    try:
+        time.sleep(max(0.0, due - time.monotonic()))
+        room = DebateRoom.objects.filter(room_code=room_code).first()
+        if room is not None:
+            store_replay(room)
+    except Exception:
+        logger.exception("Building the replay of %s failed", room_code)
+    finally:
+        from django.db import connection
+
+        connection.close()
+
+
+def schedule_replay(room_code: str):
+    """
+    Build the room's replay once the surrounding transaction commits, in the
+    background unless settings.REPLAY_ASYNC is False.
+    """
+    def run():
+        if getattr(settings, "REPLAY_ASYNC", True):
+            due = time.monotonic() + getattr(settings, "REPLAY_DELAY_SECONDS", 2.0)
+            _get_executor().submit(_build_in_background, room_code, due)
+        else:
+            room = DebateRoom.objects.filter(room_code=room_code).first()
+            if room is not None:
+                store_replay(room)
+
+    transaction.on_commit(run)
@@ -1,7 +1,10 @@
 from django.urls import re_path
-from .consumers import RoomConsumer, MatchmakingConsumer
+from .consumers import HubConsumer, RoomConsumer, MatchmakingConsumer, SpectatorConsumer, TranscriptionStreamConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/room/(?P<room_code>\w+)/$", RoomConsumer.as_asgi()),
+    re_path(r"ws/room/(?P<room_code>\w+)/transcribe/$", TranscriptionStreamConsumer.as_asgi()),
+    re_path(r"ws/room/(?P<room_code>\w+)/watch/$", SpectatorConsumer.as_asgi()),
     re_path(r"ws/matchmaking/$", MatchmakingConsumer.as_asgi()),
+    re_path(r"ws/hub/$", HubConsumer.as_asgi()),
 ]
@@ -0,0 +1,231 @@
+"""
+Turn scoring.
+
+Each turn gets a 0-100 score from four features:
+  - length: word count against a target turn length
+  - diversity: type/token ratio of the turn's words
+  - rebuttal: share of the opponent's previous content words the turn picks up
+  - rate: words per minute against a comfortable speaking rate (needs duration)
+
+Features are extracted into NumPy arrays and scored in one vectorized pass,
+so the same code scores a single new turn (incrementally, after the turn is
+committed and off the request path) or a whole room at once.
+
+When a debate is closed the turns are rescored and the side with the higher
+total becomes the room's winner.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DebateRoom, DebateTurn
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_WORDS = 150
+TARGET_WPM = 150.0
+WEIGHTS = (0.3, 0.25, 0.3, 0.15)  # length, diversity, rebuttal, rate
+
+_token_re = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an the and or but if then so to of in on at by for with from as is are was were be been "
+    "it its this that these those i you he she we they me my your our their not no do does did "
+    "have has had will would can could should there here what which who whom just very".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return _token_re.findall((text or "").lower())
+
+
+def content_words(tokens: list[str]) -> set[str]:
+    return {t for t in tokens if t not in STOPWORDS and len(t) > 2}
+
+
+def extract_features(turns) -> "np.ndarray":
+    """
+    Feature matrix for ``turns``, an iterable of (speaker_role, text,
+    duration_seconds) in turn order. Columns: words, unique words,
+    rebuttal overlap (NaN with no previous opponent turn), words per minute
+    (NaN without a duration).
+    """
+    # numpy is imported on first scoring, not when the worker starts.
+    import numpy as np
+
+    rows = []
+    last_content = {}
+    for role, text, duration in turns:
+        tokens = tokenize(text)
+        content = content_words(tokens)
+        opponent = next((c for r, c in last_content.items() if r != role), None)
+        if opponent:
+            overlap = len(content & opponent) / len(opponent)
+        else:
+            overlap = np.nan
+        wpm = len(tokens) * 60.0 / duration if duration else np.nan
+        rows.append((len(tokens), len(set(tokens)), overlap, wpm))
+        last_content[role] = content
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+
+def score_features(features: "np.ndarray") -> "np.ndarray":
+    """Vectorized 0-100 integer scores for a feature matrix from extract_features()."""
+    import numpy as np
+
+    if len(features) == 0:
+        return np.zeros(0, dtype=np.int64)
+    words, unique, overlap, wpm = features.T
+    length = np.minimum(words / TARGET_WORDS, 1.0)
+    diversity = np.clip((np.divide(unique, words, out=np.zeros_like(words), where=words > 0) - 0.3) / 0.5, 0, 1)
+    rebuttal = np.where(np.isnan(overlap), 0.5, np.minimum(np.nan_to_num(overlap) * 2.0, 1.0))
+    rate = np.where(np.isnan(wpm), 0.5, 1.0 - np.minimum(np.abs(np.nan_to_num(wpm) - TARGET_WPM) / 100.0, 1.0))
+    parts = np.stack([length, diversity, rebuttal, rate], axis=1)
+    scores = np.rint(100.0 * parts @ np.array(WEIGHTS)).astype(np.int64)
+    return np.where(words > 0, scores, 0)
+
+
+def score_turn(turn_id: int) -> int | None:
+    """
+    Score one turn against the turns before it and store the result. Only the
+    turn itself and the opponent's previous turn matter, so two rows are read.
+    """
+    turn = (
+        DebateTurn.objects.filter(pk=turn_id)
+        .values("room_id", "speaker_role", "text", "duration_seconds", "turn_number")
+        .first()
+    )
+    if turn is None:
+        return None
+
+    previous = (
+        DebateTurn.objects.filter(room_id=turn["room_id"], turn_number__lt=turn["turn_number"])
+        .exclude(speaker_role=turn["speaker_role"])
+        .order_by("-turn_number")
+        .values_list("speaker_role", "text", "duration_seconds")
+        .first()
+    )
+    rows = [previous] if previous else []
+    rows.append((turn["speaker_role"], turn["text"], turn["duration_seconds"]))
+    score = int(score_features(extract_features(rows))[-1])
+    DebateTurn.objects.filter(pk=turn_id).update(turn_score=score)
+    return score
+
+
+def rescore_rooms(room_codes, batch_size: int = 500) -> int:
+    """
+    Rescore every turn of the given rooms: one query for all their turns, one
+    vectorized scoring pass per room, and a bulk_update of the scores that
+    changed. Returns the number of turns updated.
+    """
+    return sum(rescore_room_turns(room_codes, batch_size).values())
+
+
+def rescore_room_turns(room_codes, batch_size: int = 500) -> dict[str, int]:
+    """rescore_rooms(), returning the number of turns updated per room that had any."""
+    rows = (
+        DebateTurn.objects.filter(room_id__in=list(room_codes))
+        .order_by("room_id", "turn_number")
+        .values_list("room_id", "id", "speaker_role", "text", "duration_seconds", "turn_score")
+    )
+    changed, per_room = [], {}
+    for room_code, group in groupby(rows.iterator(chunk_size=2000), key=itemgetter(0)):
+        group = list(group)
+        scores = score_features(extract_features(row[2:5] for row in group))
+        updates = [
+            DebateTurn(id=row[1], turn_score=int(score))
+            for row, score in zip(group, scores)
+            if row[5] != score
+        ]
+        if updates:
+            changed.extend(updates)
+            per_room[room_code] = len(updates)
+    if changed:
+        DebateTurn.objects.bulk_update(changed, ["turn_score"], batch_size=batch_size)
+    return per_room
+
+
+def decide_winner(room: DebateRoom) -> str | None:
+    """Email of the side with the higher total score, or None on a tie."""
+    totals = {DebateTurn.SPEAKER_ATTACKER: 0, DebateTurn.SPEAKER_DEFENDER: 0}
+    for role, score in DebateTurn.objects.filter(room=room).values_list("speaker_role", "turn_score"):
+        totals[role] = totals.get(role, 0) + score
+
+    attacker = totals[DebateTurn.SPEAKER_ATTACKER]
+    defender = totals[DebateTurn.SPEAKER_DEFENDER]
+    if attacker > defender:
+        return room.attacker_email
+    if defender > attacker and room.defender_email:
+        return room.defender_email
+    return None
+
+
+def close_room(room: DebateRoom) -> DebateRoom:
+    """
+    Rescore the room, set its winner and closed_at, and send debate_closed.
+    Closing an already closed room is a no-op.
+    """
+    from .signals import debate_closed
+
+    with transaction.atomic():
+        room = DebateRoom.objects.select_for_update().get(pk=room.pk)
+        if room.closed_at is not None:
+            return room
+        rescore_rooms([room.room_code])
+        room.winner_email = decide_winner(room)
+        room.closed_at = room.last_activity_at = timezone.now()
+        room.state = DebateRoom.STATE_FINISHED
+        room.save(update_fields=["winner_email", "closed_at", "state", "last_activity_at"])
+
+    debate_closed.send(sender=DebateRoom, room=room)
+    return room
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "SCORING_WORKERS", 2),
+                thread_name_prefix="scoring",
+            )
+        return _executor
+
+
+def _score_in_background(turn_id: int):
+    try:
+        score_turn(turn_id)
+    except Exception:
+        logger.exception("Scoring turn %s failed", turn_id)
+    finally:
+        from django.db import connection
+
+        connection.close()
+
+
+def schedule_turn(turn_id: int):
+    """
+    Score a turn once the surrounding transaction commits. Runs on a small
+    background pool unless settings.SCORING_ASYNC is False.
+    """
+    def run():
+        if getattr(settings, "SCORING_ASYNC", True):
+            _get_executor().submit(_score_in_background, turn_id)
+        else:
+            score_turn(turn_id)
+
+    transaction.on_commit(run)
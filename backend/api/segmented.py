@@ -0,0 +1,174 @@
+"""
+Parallel segmented transcription for long recordings.
+
+The preprocessed 16 kHz signal is split at low-energy (silent) frames into
+segments of roughly settings.TRANSCRIPTION_SEGMENT_SECONDS, each padded with a
+short overlap on both sides so words at a cut are not lost. Segments are
+transcribed concurrently on a bounded pool and stitched back together in
+order, dropping words repeated across an overlap.
+
+Progress is reported as soon as the next in-order segment finishes, so the
+start of a long clip is available before the whole clip is done.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from . import audio as audio_stage
+from .transcription import TranscriptionResult
+
+MAX_OVERLAP_WORDS = 12
+_word_re = re.compile(r"[^\w']+")
+
+
+def split_points(samples, rate: int, segment_seconds: float, search_seconds: float = 3.0) -> list[int]:
+    """
+    Sample offsets to cut at: near every ``segment_seconds`` boundary, pick the
+    quietest frame within ``search_seconds`` either side.
+    """
+    np = audio_stage.np
+    frame = rate * audio_stage.FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    seg_frames = int(segment_seconds * 1000 / audio_stage.FRAME_MS)
+    if n_frames <= seg_frames * 1.5:
+        return []
+
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    energy = np.mean(frames * frames, axis=1)
+    search = int(search_seconds * 1000 / audio_stage.FRAME_MS)
+
+    cuts = []
+    start = 0
+    while n_frames - start > seg_frames * 1.5:
+        target = start + seg_frames
+        lo, hi = max(start + 1, target - search), min(n_frames - 1, target + search)
+        cut = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(cut * frame)
+        start = cut
+    return cuts
+
+
+def segment_bounds(n_samples: int, cuts: list[int], overlap: int) -> list[tuple[int, int]]:
+    edges = [0, *cuts, n_samples]
+    return [
+        (max(0, edges[i] - overlap), min(n_samples, edges[i + 1] + overlap))
+        for i in range(len(edges) - 1)
+    ]
+
+
+def _normalize(word: str) -> str:
+    return _word_re.sub("", word.lower())
+
+
+def merge_overlap(left: list[str], right: list[str], max_words: int = MAX_OVERLAP_WORDS) -> list[str]:
+    """Return ``right`` without the leading words that repeat the end of ``left``."""
+    tail = [_normalize(w) for w in left[-max_words:]]
+    head = [_normalize(w) for w in right[:max_words]]
+    for k in range(min(len(tail), len(head)), 0, -1):
+        if tail[-k:] == head[:k]:
+            return right[k:]
+    return right
+
+
+def stitch(texts: list[str]) -> str:
+    words: list[str] = []
+    for text in texts:
+        words.extend(merge_overlap(words, text.split()))
+    return " ".join(words)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_segment_pool() -> ThreadPoolExecutor:
+    """
+    Pool for segment calls. Kept separate from the job pool so a job waiting
+    on its segments can never starve them of threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "TRANSCRIPTION_SEGMENT_WORKERS", 4),
+                thread_name_prefix="transcribe-segment",
+            )
+        return _pool
+
+
+def transcribe_segmented(audio, transcriber, on_progress=None) -> TranscriptionResult:
+    """
+    Transcribe a binary file object segment by segment. ``on_progress`` is
+    called with a dict (done, total, index, text) each time the stitched
+    prefix grows. Falls back to a single call when the audio cannot be
+    decoded or is short enough for one segment.
+    """
+    if isinstance(audio, str) or not audio_stage.preprocessing_enabled():
+        return audio_stage.transcribe_audio(audio, transcriber)
+
+    started = time.perf_counter()
+    try:
+        samples, original_duration = audio_stage.load_samples(audio)
+    except audio_stage.AudioDecodeError:
+        audio.seek(0)
+        return transcriber.transcribe(audio)
+    rate = audio_stage.TARGET_RATE
+    preprocess_ms = (time.perf_counter() - started) * 1000
+
+    stats = {
+        "originalDuration": round(original_duration, 3),
+        "trimmedDuration": round(len(samples) / rate, 3),
+        "removedDuration": round(original_duration - len(samples) / rate, 3),
+        "preprocessMs": round(preprocess_ms, 2),
+    }
+    if len(samples) == 0:
+        return TranscriptionResult(text="", audio_duration=0.0, preprocessing=stats)
+
+    cuts = split_points(samples, rate, getattr(settings, "TRANSCRIPTION_SEGMENT_SECONDS", 20.0))
+    overlap = int(getattr(settings, "TRANSCRIPTION_SEGMENT_OVERLAP", 1.0) * rate)
+    bounds = segment_bounds(len(samples), cuts, overlap)
+    stats["segments"] = len(bounds)
+
+    if len(bounds) == 1:
+        result = transcriber.transcribe(audio_stage.encode_wav(samples))
+        result.preprocessing = stats
+        if on_progress:
+            on_progress({"done": 1, "total": 1, "index": 0, "text": result.text})
+        return result
+
+    pool = get_segment_pool()
+    futures = {
+        pool.submit(transcriber.transcribe, audio_stage.encode_wav(samples[start:end])): index
+        for index, (start, end) in enumerate(bounds)
+    }
+
+    texts: list[str | None] = [None] * len(bounds)
+    emitted = 0
+    done = 0
+    try:
+        for future in as_completed(futures):
+            index = futures[future]
+            texts[index] = future.result().text
+            done += 1
+            ready = emitted
+            while ready < len(texts) and texts[ready] is not None:
+                ready += 1
+            if ready > emitted:
+                emitted = ready
+                if on_progress:
+                    on_progress(
+                        {"done": done, "total": len(bounds), "index": index, "text": stitch(texts[:emitted])}
+                    )
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+    return TranscriptionResult(
+        text=stitch(texts),
+        audio_duration=len(samples) / rate,
+        preprocessing=stats,
+    )
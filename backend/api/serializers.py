@@ -16,5 +16,6 @@ class DebateTurnSerializer(serializers.ModelSerializer):
             "text",
             "turn_number",
             "turn_score",
+            "duration_seconds",
             "timestamp",
         ]
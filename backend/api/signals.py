@@ -1,7 +1,11 @@
+from django.db import transaction
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import DebateTurn, UserProfile
+
+# Sent with ``room`` once a debate is closed and its winner decided.
+debate_closed = Signal()
 
 
 @receiver(post_save, sender=User)
@@ -15,3 +19,56 @@ def create_user_profile(sender, instance, created, **kwargs):
             user=instance,
             kinde_id=instance.username  # We store Kinde ID in username
         )
+
+
+@receiver(post_save, sender=DebateTurn)
+def score_new_turn(sender, instance, created, **kwargs):
+    """
+    Score each new turn after its transaction commits, off the request path.
+    """
+    if created:
+        from .scoring import schedule_turn
+
+        schedule_turn(instance.pk)
+
+
+@receiver(post_save, sender=DebateTurn)
+def broadcast_new_turn(sender, instance, created, **kwargs):
+    """
+    Tell the room's sockets (players and spectators) about a stored turn once
+    it commits.
+    """
+    if created:
+        from .transcription_jobs import notify_room
+
+        event = {
+            "type": "turn_saved",
+            "turn": {
+                "id": instance.pk,
+                "turnNumber": instance.turn_number,
+                "speakerRole": instance.speaker_role,
+                "text": instance.text,
+                "durationSeconds": instance.duration_seconds,
+            },
+        }
+        transaction.on_commit(lambda: notify_room(instance.room_id, event))
+
+
+@receiver(debate_closed)
+def rate_closed_debate(sender, room, **kwargs):
+    """
+    Update both players' ratings and the leaderboard once the winner is set.
+    """
+    from .ratings import apply_result
+
+    apply_result(room)
+
+
+@receiver(debate_closed)
+def build_closed_replay(sender, room, **kwargs):
+    """
+    Precompute the debate's replay off the request path.
+    """
+    from .replay import schedule_replay
+
+    schedule_replay(room.room_code)
@@ -0,0 +1,196 @@
+"""
+Spectator fan-out.
+
+Spectators (ws/room/<code>/watch/) do not take a seat and never join the
+room's channel-layer group themselves. Instead each process keeps one
+RoomFeed per watched room: the feed joins the group once, buffers the room's
+events, and every SPECTATOR_TICK_MS sends them to all local spectators as a
+single ``batch`` frame. Transient events (speaking/audio status, partial live
+transcripts, transcription progress) are coalesced so only the latest per key
+goes out; chat, turns and results are kept in order, up to
+SPECTATOR_MAX_BATCH_EVENTS per tick. The batch is JSON-encoded once and the
+same websocket.send message goes to every viewer, so an extra viewer costs
+one queue put per tick.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .metrics import SPECTATOR_BATCHES, SPECTATOR_DROPPED, SPECTATORS
+
+logger = logging.getLogger(__name__)
+
+
+def spectator_event(event: dict):
+    """
+    Map a room group event to (coalesce key or None, spectator event), or
+    None for events spectators do not see.
+    """
+    kind = event.get("type")
+    if kind == "chat_message_handler":
+        return None, {"type": "chat_message", "message": event.get("message"), "sender": event.get("sender")}
+    if kind == "speaking_status_handler":
+        user = event.get("user_id")
+        return ("speaking", user), {"type": "speaking_status", "participantId": user,
+                                    "isSpeaking": event.get("isSpeaking")}
+    if kind == "audio_status_handler":
+        user = event.get("user_id")
+        return ("audio", user), {"type": "audio_status", "participantId": user, "muted": event.get("muted")}
+    if kind == "participant_joined":
+        return None, {"type": "participant_joined", "participant": event.get("participant")}
+    if kind == "participant_left":
+        return None, {"type": "participant_left", "participantId": event.get("user_id"),
+                      "name": event.get("user_name")}
+    if kind == "live_transcript":
+        turn = event.get("turn") or {}
+        data = {"type": "live_transcript", "speaker": event.get("speaker"), "role": event.get("role"), **turn}
+        if turn.get("endOfTurn"):
+            return None, data
+        return ("live", event.get("speaker"), turn.get("turnOrder")), data
+    if kind == "transcription_progress":
+        job = event.get("job") or {}
+        return ("progress", job.get("id")), {"type": "transcription_progress", "job": job}
+    if kind == "debate_result":
+        return None, {"type": "debate_result", **event.get("result", {})}
+    if kind in ("turn_started", "turn_ended"):
+        return None, {"type": kind, **event.get("turn", {})}
+    if kind == "transcript_frame":
+        # Deltas only apply in order, so they are never coalesced.
+        return None, event.get("frame")
+    if kind in ("transcription_result", "turn_saved"):
+        return None, dict(event)
+    return None
+
+
+class RoomFeed:
+    def __init__(self, room_code: str, max_events: int | None = None):
+        self.room_code = room_code
+        self.group = f"room_{room_code}"
+        self.viewers: set = set()
+        self.max_events = max_events or getattr(settings, "SPECTATOR_MAX_BATCH_EVENTS", 200)
+        self.events: list = []
+        self.latest: dict = {}
+        self.dropped = 0
+        self.tick = 0
+        self.channel = None
+        self._tasks: list = []
+
+    def add(self, event: dict):
+        mapped = spectator_event(event)
+        if mapped is None:
+            return
+        key, data = mapped
+        if key is not None:
+            self.latest.pop(key, None)
+            self.latest[key] = data
+        elif len(self.events) < self.max_events:
+            self.events.append(data)
+        else:
+            self.dropped += 1
+
+    def take_batch(self) -> dict | None:
+        """The websocket.send message for this tick, or None when nothing happened."""
+        if not self.events and not self.latest:
+            return None
+        self.tick += 1
+        batch = {
+            "type": "batch",
+            "tick": self.tick,
+            "viewers": len(self.viewers),
+            "events": self.events + list(self.latest.values()),
+        }
+        if self.dropped:
+            batch["dropped"] = self.dropped
+            SPECTATOR_DROPPED.inc(self.dropped)
+        self.events, self.latest, self.dropped = [], {}, 0
+        return {"type": "websocket.send", "text": json.dumps(batch)}
+
+    async def flush(self):
+        message = self.take_batch()
+        if message is None:
+            return
+        SPECTATOR_BATCHES.inc()
+        for viewer in tuple(self.viewers):
+            try:
+                await viewer.send_batch(message)
+            except Exception:
+                logger.debug("Dropping spectator %r after failed send", viewer, exc_info=True)
+                self.viewers.discard(viewer)
+
+    async def start(self, channel_layer):
+        self.channel = await channel_layer.new_channel("spectators.")
+        await channel_layer.group_add(self.group, self.channel)
+        self._tasks = [
+            asyncio.create_task(self._read(channel_layer)),
+            asyncio.create_task(self._tick(getattr(settings, "SPECTATOR_TICK_MS", 250) / 1000)),
+        ]
+
+    async def stop(self, channel_layer):
+        for task in self._tasks:
+            task.cancel()
+        if self.channel:
+            await channel_layer.group_discard(self.group, self.channel)
+
+    async def _read(self, channel_layer):
+        while True:
+            self.add(await channel_layer.receive(self.channel))
+
+    async def _tick(self, interval: float):
+        next_at = time.monotonic()
+        while True:
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Spectator flush for %s failed", self.room_code)
+
+
+class SpectatorHub:
+    """This process's RoomFeeds, created on the first viewer and removed with the last."""
+
+    def __init__(self):
+        self.feeds: dict[str, RoomFeed] = {}
+
+    def viewer_count(self, room_code: str | None = None) -> int:
+        if room_code is not None:
+            feed = self.feeds.get(room_code)
+            return len(feed.viewers) if feed else 0
+        return sum(len(feed.viewers) for feed in self.feeds.values())
+
+    async def join(self, room_code: str, viewer) -> RoomFeed:
+        feed = self.feeds.get(room_code)
+        if feed is None:
+            feed = self.feeds[room_code] = RoomFeed(room_code)
+            await feed.start(get_channel_layer())
+        feed.viewers.add(viewer)
+        return feed
+
+    async def leave(self, room_code: str, viewer):
+        feed = self.feeds.get(room_code)
+        if feed is None:
+            return
+        feed.viewers.discard(viewer)
+        if not feed.viewers:
+            self.feeds.pop(room_code, None)
+            await feed.stop(get_channel_layer())
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub() -> SpectatorHub:
+    """The hub for the running event loop (one per process under daphne)."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = SpectatorHub()
+    return hub
+
+
+SPECTATORS.set_function(lambda: sum(hub.viewer_count() for hub in list(_hubs.values())))
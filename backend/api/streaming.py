@@ -0,0 +1,262 @@
+"""
+Real-time transcription sessions.
+
+A streaming backend opens a session that accepts raw audio frames and reports
+TurnUpdate objects (partial and final turns) through a callback, which may be
+called from any thread. The active backend is chosen by
+settings.STREAMING_TRANSCRIPTION_BACKEND, either a short name from
+STREAMING_BACKENDS or a dotted import path.
+
+The WebSocket side lives in consumers.TranscriptionStreamConsumer.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .optional import optional_import
+
+logger = logging.getLogger(__name__)
+
+STREAMING_BACKENDS = {
+    "assemblyai": "api.streaming.AssemblyAIStreamingBackend",
+    "fake": "api.streaming.FakeStreamingBackend",
+}
+
+ENCODING_PCM = "pcm_s16le"
+ENCODING_OPUS = "opus"
+
+
+class StreamingUnavailable(Exception):
+    """The streaming backend cannot be used on this server."""
+
+
+@dataclass
+class TurnUpdate:
+    transcript: str
+    end_of_turn: bool
+    turn_order: int = 0
+    formatted: bool = False
+
+    def as_dict(self) -> dict:
+        return {
+            "transcript": self.transcript,
+            "endOfTurn": self.end_of_turn,
+            "turnOrder": self.turn_order,
+            "formatted": self.formatted,
+        }
+
+
+class OpusDecoder:
+    """
+    Decode raw Opus packets to 16-bit PCM. Needs the optional ``opuslib``
+    package; browsers that capture PCM with an AudioWorklet do not need it.
+    """
+
+    frame_ms = 60
+
+    def __init__(self, sample_rate: int, channels: int = 1):
+        try:
+            import opuslib  # type: ignore
+        except Exception as exc:
+            raise StreamingUnavailable("opus frames need the opuslib package") from exc
+        self.sample_rate = sample_rate
+        self._decoder = opuslib.Decoder(sample_rate, channels)
+
+    def decode(self, packet: bytes) -> bytes:
+        return self._decoder.decode(packet, self.sample_rate * self.frame_ms // 1000)
+
+
+class AssemblyAIStreamingSession:
+    def __init__(self, client):
+        self._client = client
+
+    def send_audio(self, frame: bytes):
+        # StreamingClient queues the frame for its writer thread.
+        self._client.stream(frame)
+
+    def close(self):
+        self._client.disconnect(terminate=True)
+
+
+class AssemblyAIStreamingBackend:
+    """
+    Relay audio to AssemblyAI's v3 streaming API. ``open`` and ``close`` block
+    on the network and should be called off the event loop.
+    """
+
+    api_host = "streaming.assemblyai.com"
+
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key
+
+    def open(self, on_update, sample_rate: int = 16000) -> AssemblyAIStreamingSession:
+        sdk = optional_import("assemblyai.streaming.v3")
+        if sdk is None:
+            raise StreamingUnavailable("assemblyai package not installed")
+
+        api_key = self.api_key or os.getenv("ASSEMBLYAI_API_KEY")
+        if not api_key:
+            raise StreamingUnavailable("ASSEMBLYAI_API_KEY not set on server")
+
+        client = sdk.StreamingClient(sdk.StreamingClientOptions(api_key=api_key, api_host=self.api_host))
+
+        def on_turn(client, event):
+            on_update(
+                TurnUpdate(
+                    transcript=event.transcript,
+                    end_of_turn=event.end_of_turn,
+                    turn_order=getattr(event, "turn_order", 0),
+                    formatted=bool(getattr(event, "turn_is_formatted", False)),
+                )
+            )
+            # Ask AssemblyAI to format the current turn once end_of_turn is reached
+            if event.end_of_turn and not event.turn_is_formatted:
+                client.set_params(sdk.StreamingSessionParameters(format_turns=True))
+
+        def on_error(client, error):
+            logger.error("Streaming error: %s", error)
+
+        client.on(sdk.StreamingEvents.Turn, on_turn)
+        client.on(sdk.StreamingEvents.Error, on_error)
+        client.connect(sdk.StreamingParameters(sample_rate=sample_rate, format_turns=True))
+        return AssemblyAIStreamingSession(client)
+
+
+class FakeStreamingSession:
+    def __init__(self, on_update, words_per_frame: int, frames_per_turn: int):
+        self._on_update = on_update
+        self._words_per_frame = words_per_frame
+        self._frames_per_turn = frames_per_turn
+        self._words: list[str] = []
+        self._frames = 0
+        self._turn_order = 0
+        self._lock = threading.Lock()
+        self.bytes_received = 0
+        self.closed = False
+
+    def send_audio(self, frame: bytes):
+        with self._lock:
+            self.bytes_received += len(frame)
+            self._frames += 1
+            self._words.extend(
+                f"w{self._frames}_{i}" for i in range(self._words_per_frame)
+            )
+            final = self._frames % self._frames_per_turn == 0
+            update = self._take(final)
+        self._on_update(update)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            update = self._take(True) if self._words else None
+        if update:
+            self._on_update(update)
+
+    def _take(self, final: bool) -> TurnUpdate:
+        update = TurnUpdate(
+            transcript=" ".join(self._words),
+            end_of_turn=final,
+            turn_order=self._turn_order,
+            formatted=final,
+        )
+        if final:
+            self._words = []
+            self._turn_order += 1
+        return update
+
+
+class FakeStreamingBackend:
+    """
+    Offline backend for tests: every frame adds ``words_per_frame`` words to
+    the current turn and reports a partial; every ``frames_per_turn`` frames
+    (and on close) the turn is reported as final.
+    """
+
+    def __init__(self, words_per_frame: int = 1, frames_per_turn: int = 5):
+        self.words_per_frame = words_per_frame
+        self.frames_per_turn = frames_per_turn
+        self.sessions: list[FakeStreamingSession] = []
+
+    def open(self, on_update, sample_rate: int = 16000) -> FakeStreamingSession:
+        session = FakeStreamingSession(on_update, self.words_per_frame, self.frames_per_turn)
+        self.sessions.append(session)
+        return session
+
+
+_backend = None
+
+
+def get_streaming_backend():
+    """Return the process-wide streaming backend configured in settings."""
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "STREAMING_TRANSCRIPTION_BACKEND", "assemblyai")
+        _backend = import_string(STREAMING_BACKENDS.get(name, name))()
+    return _backend
+
+
+def set_streaming_backend(backend):
+    """Swap the process-wide streaming backend (e.g. for tests)."""
+    global _backend
+    _backend = backend
+
+
+class SessionLimitReached(Exception):
+    pass
+
+
+class StreamingSessionRegistry:
+    """
+    Bounds live streaming sessions per room and per process. Only touched from
+    the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_per_room: int = 2, max_total: int = 200):
+        self.max_per_room = max_per_room
+        self.max_total = max_total
+        self._rooms: dict[str, set[str]] = {}
+        self._total = 0
+
+    def acquire(self, room_code: str, owner: str):
+        owners = self._rooms.setdefault(room_code, set())
+        if owner in owners:
+            return
+        if len(owners) >= self.max_per_room or self._total >= self.max_total:
+            if not owners:
+                self._rooms.pop(room_code, None)
+            raise SessionLimitReached(room_code)
+        owners.add(owner)
+        self._total += 1
+
+    def release(self, room_code: str, owner: str):
+        owners = self._rooms.get(room_code)
+        if not owners or owner not in owners:
+            return
+        owners.discard(owner)
+        self._total -= 1
+        if not owners:
+            del self._rooms[room_code]
+
+    def count(self, room_code: str | None = None) -> int:
+        if room_code is None:
+            return self._total
+        return len(self._rooms.get(room_code, ()))
+
+
+_registry = None
+
+
+def get_session_registry() -> StreamingSessionRegistry:
+    global _registry
+    if _registry is None:
+        _registry = StreamingSessionRegistry(
+            max_per_room=getattr(settings, "STREAMING_MAX_SESSIONS_PER_ROOM", 2),
+            max_total=getattr(settings, "STREAMING_MAX_SESSIONS", 200),
+        )
+    return _registry
@@ -0,0 +1,18 @@
+"""
+Test runner for ``manage.py test``: runs the suite with QUERY_BUDGET_STRICT
+on, so a view or consumer handler that outgrows its @query_budget fails its
+test instead of logging a warning.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class StrictQueryBudgetRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._strict_budgets = override_settings(QUERY_BUDGET_STRICT=True)
+        self._strict_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._strict_budgets.disable()
+        super().teardown_test_environment(**kwargs)
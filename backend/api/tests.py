@@ -1,3 +1,1634 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import importlib
+import io
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, resolve
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+
+from .clock import TimerWheel
+from . import admission, audio, metrics, profiling, ratings, segmented, spectators
+from .audio import TARGET_RATE
+from .async_views import AsyncRoomCreateView
+from .channel_layer import BatchingChannelLayer, ChannelLayerServer, ChannelQueue
+from .consumers import SPECTATOR_CLOSE_NOT_FOUND
+from .eventlog import EventLogWriter, read_events, write_events
+from .lifecycle import expire_idle_rooms
+from .live_transcripts import (
+    LIVE_TRANSCRIPTS, TranscriptBuffer, common_prefix, drop_buffer, get_buffer, room_snapshots,
+)
+from .metrics import MetricsConsumerMixin
+from .models import DebateReplay, DebateRoom, DebateTurn, LeaderboardVersion, PlayerRating, RoomEvent
+from .optional import optional_import
+from .querybudget import QueryBudgetExceeded, audit_queries, query_budget
+from .ratelimit import MemoryBackend, RateLimiter, load_policies, reset_limiter
+from .replay import decode_replay, store_replay
+from .routing import websocket_urlpatterns
+from .spectators import RoomFeed
+from .streaming import (
+    AssemblyAIStreamingBackend, FakeStreamingBackend, StreamingSessionRegistry, StreamingUnavailable,
+    set_streaming_backend,
+)
+from .urls import build_urlpatterns
+from .transcription import (
+    AssemblyAITranscriber, FakeTranscriber, TranscriptionError, TranscriptionResult, TranscriptionUnavailable,
+    get_transcriber, set_transcriber,
+)
+from .transcription_cache import TranscriptCache, audio_digest, transcription_key
+from .transcription_client import CircuitBreaker, ConcurrencyLimiter, TranscriptionBusy, TranscriptionClient
+from .transcription_jobs import JobQueueFull, TranscriptionJob, TranscriptionJobManager
+from .uploads import clean_audio_url
+from .views import LeaderboardView
+
+
+class TimerWheelTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("api.clock.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wheel = TimerWheel(tick=0.1, slots=8)
+        self.fired = []
+
+    def test_fires_after_delay_not_before(self):
+        self.wheel.schedule("room", 0.25, lambda: self.fired.append(self.now))
+        self.now += 0.2
+        self.wheel.advance(self.now)
+        self.assertEqual(self.fired, [])
+        self.now += 0.15
+        self.wheel.advance(self.now)
+        self.assertEqual(len(self.fired), 1)
+
+    def test_delays_longer_than_a_revolution(self):
+        self.wheel.schedule("room", 2.0, lambda: self.fired.append(self.now))
+        for _ in range(19):
+            self.now += 0.1
+            self.wheel.advance(self.now)
+        self.assertEqual(self.fired, [])
+        self.now += 0.25
+        self.wheel.advance(self.now)
+        self.assertEqual(len(self.fired), 1)
+
+    def test_reschedule_replaces_and_cancel_removes(self):
+        self.wheel.schedule("room", 0.1, lambda: self.fired.append("old"))
+        self.wheel.schedule("room", 0.3, lambda: self.fired.append("new"))
+        self.assertEqual(len(self.wheel), 1)
+        self.now += 0.5
+        self.wheel.advance(self.now)
+        self.assertEqual(self.fired, ["new"])
+        self.wheel.schedule("other", 0.1, lambda: self.fired.append("other"))
+        self.assertTrue(self.wheel.cancel("other"))
+        self.now += 0.5
+        self.wheel.advance(self.now)
+        self.assertEqual(self.fired, ["new"])
+
+
+class TimerWheelRunTests(SimpleTestCase):
+    def test_schedule_after_idle_is_not_delayed_by_idle_time(self):
+        # The wheel starts with the first player and stays empty until the second joins.
+        async def scenario():
+            wheel = TimerWheel(tick=0.02, slots=64)
+            wheel.start()
+            await asyncio.sleep(0.4)
+            fired = asyncio.get_running_loop().create_future()
+            started = time.monotonic()
+            wheel.schedule("room", 0.1, lambda: fired.set_result(time.monotonic() - started))
+            try:
+                return await asyncio.wait_for(fired, 2)
+            finally:
+                wheel._task.cancel()
+
+        elapsed = asyncio.run(scenario())
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertLess(elapsed, 0.3)
+
+
+@override_settings(ROOM_WAITING_TTL=1800, ROOM_LIVE_TTL=7200)
+class ExpireIdleRoomsTests(TestCase):
+    def room(self, code, state, idle, defender=""):
+        return DebateRoom.objects.create(
+            room_code=code,
+            attacker_email="a@example.com",
+            defender_email=defender,
+            state=state,
+            last_activity_at=timezone.now() - timedelta(seconds=idle),
+        )
+
+    def turn(self, room):
+        user = User.objects.create(username=f"kinde-{room.room_code}", email="a@example.com")
+        DebateTurn.objects.create(
+            room=room, speaker=user.userprofile, speaker_role=DebateTurn.SPEAKER_ATTACKER,
+            text="Opening.", turn_number=1,
+        )
+
+    def test_rooms_without_turns_expire(self):
+        self.room("EMPTY", DebateRoom.STATE_WAITING, 2000)
+        self.room("FRESH", DebateRoom.STATE_WAITING, 60)
+        self.room("SILENT", DebateRoom.STATE_LIVE, 8000, defender="d@example.com")
+        self.room("JOINED", DebateRoom.STATE_LIVE, 2000, defender="d@example.com")
+
+        self.assertEqual(expire_idle_rooms(), (2, 0))
+        self.assertEqual(set(DebateRoom.objects.values_list("room_code", flat=True)), {"FRESH", "JOINED"})
+
+    def test_idle_rooms_with_turns_close(self):
+        self.turn(self.room("STALE", DebateRoom.STATE_LIVE, 8000, defender="d@example.com"))
+        self.turn(self.room("ACTIVE", DebateRoom.STATE_LIVE, 60, defender="d@example.com"))
+
+        self.assertEqual(expire_idle_rooms(), (0, 1))
+        states = dict(DebateRoom.objects.values_list("room_code", "state"))
+        self.assertEqual(states, {"STALE": DebateRoom.STATE_FINISHED, "ACTIVE": DebateRoom.STATE_LIVE})
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        ratings._board = None
+        self.addCleanup(setattr, ratings, "_board", None)
+        cache.clear()
+        PlayerRating.objects.bulk_create(
+            PlayerRating(email=f"p{index}@example.com", rating=1000 + index * 10) for index in range(7)
+        )
+
+    def test_pages_follow_rating_order(self):
+        page = ratings.top_page(page=2, page_size=3)
+        self.assertEqual(page["total"], 7)
+        self.assertEqual(
+            [player["email"] for player in page["players"]],
+            ["p3@example.com", "p2@example.com", "p1@example.com"],
+        )
+        self.assertEqual([player["rank"] for player in page["players"]], [4, 5, 6])
+
+    @override_settings(LEADERBOARD_VERSION_CHECK_SECONDS=2)
+    def test_warm_lookups_run_no_query(self):
+        with mock.patch("api.ratings.time.monotonic", return_value=100.0):
+            board = ratings.get_leaderboard()
+            with self.assertNumQueries(0):
+                self.assertIs(ratings.get_leaderboard(), board)
+                self.assertEqual(board.rating_of("p6@example.com"), 1060)
+
+    @override_settings(LEADERBOARD_VERSION_CHECK_SECONDS=2)
+    def test_change_from_another_process_reloads_the_board(self):
+        now = 100.0
+        with mock.patch("api.ratings.time.monotonic", side_effect=lambda: now):
+            board = ratings.get_leaderboard()
+            # Another process: the row and the shared version change, this process's board does not.
+            PlayerRating.objects.filter(email="p0@example.com").update(rating=2000)
+            LeaderboardVersion.objects.update_or_create(pk=1, defaults={"version": board.version + 1})
+
+            self.assertIs(ratings.get_leaderboard(), board)
+            now += 2
+            fresh = ratings.get_leaderboard()
+        self.assertIsNot(fresh, board)
+        self.assertEqual(fresh.rank_of("p0@example.com"), 1)
+        self.assertEqual(ratings.top_page(page_size=1)["players"][0]["email"], "p0@example.com")
+
+    def test_local_change_moves_the_player(self):
+        board = ratings.get_leaderboard()
+        PlayerRating.objects.filter(email="p2@example.com").update(rating=1500)
+        ratings.invalidate([("p2@example.com", 1500.0)])
+        self.assertIs(ratings.get_leaderboard(), board)
+        self.assertEqual(board.emails(0, 2), ["p2@example.com", "p6@example.com"])
+
+
+class TranscriptCacheTests(SimpleTestCase):
+    def test_disk_entries_survive_a_new_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            TranscriptCache(directory=directory).put("key", TranscriptionResult("Hello there."))
+
+            fresh = TranscriptCache(directory=directory)
+            self.assertEqual(fresh.get("key").text, "Hello there.")
+            self.assertEqual(fresh.get("key").text, "Hello there.")
+            self.assertEqual((fresh.stats["disk_hits"], fresh.stats["memory_hits"]), (1, 1))
+
+    def test_compute_runs_once_per_key(self):
+        cache = TranscriptCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return TranscriptionResult("Rebuttal.")
+
+        self.assertEqual(cache.get_or_compute("key", compute)[1], False)
+        self.assertEqual(cache.get_or_compute("key", compute)[1], True)
+        self.assertEqual(len(calls), 1)
+
+    def test_url_keys_are_the_url_string(self):
+        transcriber = FakeTranscriber()
+        with mock.patch("urllib.request.urlopen") as urlopen, mock.patch("os.path.exists", return_value=True):
+            first = transcription_key("https://example.com/turn.webm", transcriber)
+            self.assertEqual(transcription_key("https://example.com/turn.webm", transcriber), first)
+            self.assertNotEqual(transcription_key("https://example.com/other.webm", transcriber), first)
+        urlopen.assert_not_called()
+
+    def test_audio_urls_must_be_http(self):
+        self.assertEqual(
+            clean_audio_url(" HTTPS://Example.COM:443/a/turn.webm?take=2#t=3 "),
+            "https://example.com/a/turn.webm?take=2",
+        )
+        self.assertEqual(clean_audio_url("http://example.com:8080"), "http://example.com:8080/")
+        refused = ("file:///etc/passwd", "/etc/passwd", "ftp://example.com/a", "https://", "http://u:p@example.com/")
+        for value in refused:
+            with self.subTest(value=value), self.assertRaises(ParseError):
+                clean_audio_url(value)
+
+
+
+class OptionalImportTests(SimpleTestCase):
+    def setUp(self):
+        self.modules = {}
+        patcher = mock.patch("api.optional._modules", self.modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_modules_are_imported_once_and_missing_ones_remembered(self):
+        with mock.patch("api.optional.importlib.import_module", wraps=importlib.import_module) as import_module:
+            self.assertIs(optional_import("json"), json)
+            self.assertIs(optional_import("json"), json)
+            self.assertIsNone(optional_import("api_no_such_module"))
+            self.assertIsNone(optional_import("api_no_such_module"))
+        self.assertEqual([call.args[0] for call in import_module.call_args_list], ["json", "api_no_such_module"])
+
+    def test_missing_sdk_answers_unavailable(self):
+        self.modules.update({"assemblyai": None, "assemblyai.streaming.v3": None})
+        with self.assertRaisesMessage(TranscriptionUnavailable, "not installed"):
+            AssemblyAITranscriber(api_key="key").transcribe(b"")
+        with self.assertRaisesMessage(StreamingUnavailable, "not installed"):
+            AssemblyAIStreamingBackend(api_key="key").open(lambda update: None)
+
+    def test_startup_leaves_heavy_integrations_unloaded(self):
+        script = (
+            "import json, sys, django; django.setup(); import debate_hub.asgi\n"
+            "from django.urls import get_resolver; get_resolver().url_patterns\n"
+            "print(json.dumps([name for name in sys.argv[1:] if name in sys.modules]))"
+        )
+        watched = ["assemblyai", "numpy", "jwt", "cryptography"]
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "debate_hub.settings"}
+        output = subprocess.run([sys.executable, "-c", script, *watched], capture_output=True, check=True,
+                                text=True, env=env, cwd=settings.BASE_DIR).stdout
+        self.assertEqual(json.loads(output.splitlines()[-1]), [])
+
+
+class TranscribeUrlTests(SimpleTestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        self.transcriber = FakeTranscriber(text="From the link.")
+        set_transcriber(self.transcriber)
+        self.addCleanup(set_transcriber, None)
+        patcher = mock.patch("api.transcription_cache._cache", TranscriptCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_non_http_urls_are_refused_before_transcribing(self):
+        for endpoint in ("/api/transcribe/", "/api/transcribe/jobs/"):
+            with self.subTest(endpoint=endpoint):
+                response = self.client.post(
+                    endpoint, {"audio_url": "file:///etc/passwd"}, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.transcriber.calls, 0)
+
+    def test_url_transcripts_are_cached(self):
+        body = {"audio_url": "https://example.com/turn.webm"}
+        first = self.client.post("/api/transcribe/", body, content_type="application/json").json()
+        second = self.client.post("/api/transcribe/", body, content_type="application/json").json()
+        self.assertEqual((first["transcript"], first["cached"], second["cached"]), ("From the link.", False, True))
+        self.assertEqual(self.transcriber.calls, 1)
+
+
+def wav_bytes(seconds: float, byte_rate: int = 16000) -> bytes:
+    """A PCM WAV header (8 kHz, 16-bit mono) followed by ``seconds`` of silence."""
+    data = bytes(int(seconds * byte_rate))
+    header = (
+        b"RIFF" + (36 + len(data)).to_bytes(4, "little") + b"WAVEfmt "
+        + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+        + (8000).to_bytes(4, "little") + byte_rate.to_bytes(4, "little")
+        + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+        + b"data" + len(data).to_bytes(4, "little")
+    )
+    return header + data
+
+
+@override_settings(TRANSCRIPTION_PREPROCESS=False)
+class TranscribeUploadTests(SimpleTestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        self.transcriber = FakeTranscriber(text="Uploaded.")
+        set_transcriber(self.transcriber)
+        self.addCleanup(set_transcriber, None)
+        patcher = mock.patch("api.transcription_cache._cache", TranscriptCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, data: bytes, **extra):
+        audio = SimpleUploadedFile("turn.wav", data, content_type="audio/wav")
+        return self.client.post("/api/transcribe/", {"audio": audio, "speaker": "a@example.com"}, **extra)
+
+    @override_settings(TRANSCRIPTION_MAX_UPLOAD_BYTES=1024)
+    def test_oversized_upload_is_413(self):
+        response = self.upload(bytes(4096))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.transcriber.calls, 0)
+
+    @override_settings(TRANSCRIPTION_MAX_DURATION_SECONDS=1)
+    def test_declared_duration_over_the_limit_is_413(self):
+        response = self.upload(bytes(64), HTTP_X_AUDIO_DURATION="5")
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.transcriber.calls, 0)
+
+    @override_settings(TRANSCRIPTION_MAX_DURATION_SECONDS=1)
+    def test_wav_longer_than_the_limit_is_413(self):
+        self.assertEqual(self.upload(wav_bytes(0.5)).status_code, 200)
+        self.assertEqual(self.upload(wav_bytes(2)).status_code, 413)
+        self.assertEqual(self.transcriber.calls, 1)
+
+    def test_raw_body_upload_reads_fields_from_the_query_string(self):
+        self.transcriber.text = None
+        response = self.client.post(
+            "/api/transcribe/?speaker=a@example.com", b"\x1aE\xdf\xa3webm", content_type="audio/webm"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["transcript"].endswith("(8 bytes)"))
+
+    def test_uploads_are_keyed_on_the_hash_taken_while_streaming(self):
+        with mock.patch("api.transcription_cache.audio_digest", wraps=audio_digest) as digest:
+            first = self.upload(wav_bytes(0.25)).json()
+            second = self.upload(wav_bytes(0.25)).json()
+        self.assertTrue(all(hasattr(call.args[0], "sha256") for call in digest.call_args_list))
+        self.assertEqual((first["cached"], second["cached"]), (False, True))
+        self.assertEqual(self.transcriber.calls, 1)
+
+
+def tone_wav(segments, rate=TARGET_RATE, channels=1) -> bytes:
+    """16-bit WAV of (seconds, amplitude) segments of a 440 Hz tone; amplitude 0 is silence."""
+    np = audio.np
+    samples = np.concatenate([
+        amplitude * np.sin(2 * np.pi * 440 * np.arange(int(seconds * rate)) / rate) for seconds, amplitude in segments
+    ])
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.repeat(samples, channels) * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+
+@skipUnless(audio.numpy_available(), "needs numpy")
+class AudioPreprocessingTests(SimpleTestCase):
+    def test_resample_to_16_khz(self):
+        np = audio.np
+        samples = np.ones(48000, dtype=np.float32)
+        self.assertIs(audio.resample(samples, TARGET_RATE), samples)
+        self.assertEqual(len(audio.resample(samples, 48000)), 16000)
+        interpolated = audio.resample(np.linspace(0, 1, 44100, dtype=np.float32), 44100)
+        self.assertEqual(len(interpolated), 16000)
+        self.assertAlmostEqual(float(interpolated[8000]), 0.5, places=3)
+
+    def test_stereo_wav_decodes_to_mono(self):
+        samples, rate = audio.decode(tone_wav([(0.5, 0.5)], rate=48000, channels=2))
+        self.assertEqual((len(samples), rate), (24000, 48000))
+        self.assertAlmostEqual(float(abs(samples).max()), 0.5, places=2)
+
+    def test_silence_is_trimmed_and_long_pauses_shortened(self):
+        config = audio.VadConfig()
+        samples, rate = audio.decode(tone_wav([(0.5, 0), (1, 0.3), (2, 0), (1, 0.3), (0.5, 0)]))
+        kept = len(audio.trim_silence(samples, rate, config)) / rate
+        # Two seconds of speech, the pause cut to keep_gap, padding around the speech.
+        self.assertGreater(kept, 2 + config.keep_gap)
+        self.assertLess(kept, 2 + config.keep_gap + 4 * config.padding + 0.1)
+        self.assertEqual(len(audio.trim_silence(audio.np.zeros(16000, dtype=audio.np.float32), rate)), 0)
+
+    @override_settings(TRANSCRIPTION_PREPROCESS=True)
+    def test_transcribe_audio_sends_the_trimmed_wav(self):
+        transcriber = FakeTranscriber()
+        result = audio.transcribe_audio(io.BytesIO(tone_wav([(1, 0), (1, 0.3), (1, 0)], rate=48000)), transcriber)
+        self.assertEqual(result.preprocessing["originalDuration"], 3.0)
+        self.assertLess(result.preprocessing["trimmedDuration"], 1.5)
+
+        silent = audio.transcribe_audio(io.BytesIO(tone_wav([(1, 0)])), transcriber)
+        self.assertEqual((silent.text, transcriber.calls), ("", 1))
+
+    @override_settings(TRANSCRIPTION_PREPROCESS=True)
+    def test_undecodable_audio_goes_through_untouched(self):
+        transcriber = FakeTranscriber()
+        with mock.patch("api.audio.shutil.which", return_value=None):
+            result = audio.transcribe_audio(io.BytesIO(b"\x1aE\xdf\xa3webm"), transcriber)
+        self.assertTrue(result.text.endswith("(8 bytes)"))
+        self.assertIsNone(result.preprocessing)
+
+
+
+class LoudnessTranscriber(FakeTranscriber):
+    """Transcribes a segment as its peak amplitude ("a5" for 0.5), sleeping ``delays[word]`` first."""
+
+    def __init__(self, delays=None):
+        super().__init__()
+        self.delays = delays or {}
+
+    def transcribe(self, audio_file) -> TranscriptionResult:
+        self.calls += 1
+        samples, _ = audio.decode(audio_file.getvalue())
+        word = f"a{round(float(abs(samples).max()) * 10)}"
+        time.sleep(self.delays.get(word, 0))
+        return TranscriptionResult(text=word)
+
+
+@skipUnless(audio.numpy_available(), "needs numpy")
+@override_settings(TRANSCRIPTION_PREPROCESS=True, TRANSCRIPTION_SEGMENT_SECONDS=5, TRANSCRIPTION_SEGMENT_OVERLAP=0)
+class SegmentedTranscriptionTests(SimpleTestCase):
+    # Three five-second phrases at different loudness, split by short pauses.
+    phrases = [(5, 0.5), (0.5, 0), (5, 0.6), (0.5, 0), (5, 0.7)]
+    # With enough leading and trailing silence for the VAD noise floor.
+    recording = [(1, 0), *phrases, (1, 0)]
+
+    def test_cuts_land_in_the_pauses(self):
+        samples, rate = audio.decode(tone_wav(self.phrases))
+        cuts = [cut / rate for cut in segmented.split_points(samples, rate, 5)]
+        self.assertEqual(len(cuts), 2)
+        self.assertTrue(5 <= cuts[0] <= 5.5 and 10.5 <= cuts[1] <= 11, cuts)
+        self.assertEqual(segmented.split_points(samples, rate, 20), [])
+
+    def test_segment_bounds_overlap_and_clamp(self):
+        self.assertEqual(segmented.segment_bounds(100, [40, 70], 5), [(0, 45), (35, 75), (65, 100)])
+
+    def test_overlapping_words_are_stitched_once(self):
+        self.assertEqual(segmented.merge_overlap("so we agree,".split(), "Agree that it".split()), ["that", "it"])
+        self.assertEqual(segmented.stitch(["one two three", "two three four", "five"]), "one two three four five")
+        self.assertEqual(segmented.stitch(["no overlap", "here"]), "no overlap here")
+
+    def test_segments_are_stitched_in_order_and_progress_waits_for_the_prefix(self):
+        transcriber = LoudnessTranscriber(delays={"a6": 0.3})
+        progress = []
+        result = segmented.transcribe_segmented(io.BytesIO(tone_wav(self.recording)), transcriber, progress.append)
+
+        self.assertEqual(result.text, "a5 a6 a7")
+        self.assertEqual((transcriber.calls, result.preprocessing["segments"]), (3, 3))
+        # The last phrase finishes before the slow middle one, so it is only reported with it.
+        self.assertEqual([(p["done"], p["text"]) for p in progress], [(1, "a5"), (3, "a5 a6 a7")])
+        self.assertTrue(all(p["total"] == 3 for p in progress))
+
+    def test_short_audio_is_one_call(self):
+        transcriber = LoudnessTranscriber()
+        progress = []
+        result = segmented.transcribe_segmented(io.BytesIO(tone_wav([(0.5, 0), (2, 0.5), (0.5, 0)])), transcriber, progress.append)
+        self.assertEqual((result.text, transcriber.calls, result.preprocessing["segments"]), ("a5", 1, 1))
+        self.assertEqual(progress, [{"done": 1, "total": 1, "index": 0, "text": "a5"}])
+
+
+class RescoreTurnsTests(TestCase):
+    def test_replays_of_rescored_rooms_are_rebuilt(self):
+        room = DebateRoom.objects.create(
+            room_code="CLOSED", attacker_email="a@example.com", defender_email="d@example.com",
+            state=DebateRoom.STATE_FINISHED, closed_at=timezone.now(),
+        )
+        user = User.objects.create(username="kinde-a", email="a@example.com")
+        DebateTurn.objects.create(
+            room=room, speaker=user.userprofile, speaker_role=DebateTurn.SPEAKER_ATTACKER,
+            text="Because the data shows a clear trend, the policy works.", turn_number=1, turn_score=999,
+        )
+        store_replay(room)
+
+        call_command("rescore_turns", stdout=StringIO())
+
+        score = DebateTurn.objects.get(room=room).turn_score
+        self.assertNotEqual(score, 999)
+        replay = json.loads(decode_replay(DebateReplay.objects.get(room=room).payload))
+        self.assertEqual(replay["turns"]["score"], [score])
+
+    def test_redecide_rerates_players(self):
+        room = DebateRoom.objects.create(
+            room_code="FLIP", attacker_email="a@example.com", defender_email="d@example.com",
+            state=DebateRoom.STATE_FINISHED, closed_at=timezone.now(), winner_email="d@example.com",
+        )
+        user = User.objects.create(username="kinde-a", email="a@example.com")
+        DebateTurn.objects.create(
+            room=room, speaker=user.userprofile, speaker_role=DebateTurn.SPEAKER_ATTACKER,
+            text="Because the data shows a clear trend, the policy works.", turn_number=1,
+        )
+        ratings.apply_result(room)
+        self.assertEqual(PlayerRating.objects.get(email="d@example.com").wins, 1)
+
+        call_command("rescore_turns", "--redecide", stdout=StringIO())
+
+        room.refresh_from_db()
+        self.assertEqual(room.winner_email, "a@example.com")
+        attacker = PlayerRating.objects.get(email="a@example.com")
+        defender = PlayerRating.objects.get(email="d@example.com")
+        self.assertEqual((attacker.wins, defender.losses, defender.wins), (1, 1, 0))
+        self.assertGreater(attacker.rating, defender.rating)
+
+
+class AdmissionTests(SimpleTestCase):
+    def test_thread_queue_depth_counts_queued_work(self):
+        executor = mock.Mock()
+        executor._work_queue.qsize.return_value = 3
+        fake = mock.Mock(single_thread_executor=executor, context_to_thread_executor={"ctx": executor})
+        with mock.patch.object(admission, "SyncToAsync", fake):
+            self.assertEqual(admission.thread_queue_depth(), 6)
+
+    def test_thread_queue_depth_degrades_to_zero_without_asgiref_internals(self):
+        with mock.patch.object(admission, "SyncToAsync", object()):
+            self.assertEqual(admission.thread_queue_depth(), 0)
+        fake = mock.Mock(single_thread_executor=object(), context_to_thread_executor=None)
+        with mock.patch.object(admission, "SyncToAsync", fake):
+            self.assertEqual(admission.thread_queue_depth(), 0)
+
+    def test_guarded_writes_are_checked_once(self):
+        controller = admission.AdmissionController(max_loop_lag=0, max_thread_queue=0, max_inflight=10)
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        with mock.patch("api.middleware.get_admission", return_value=controller), \
+                mock.patch.object(controller, "check", wraps=controller.check) as check:
+            self.assertEqual(self.client.post("/api/rooms/", {}, content_type="application/json").status_code, 400)
+            self.assertEqual(check.call_count, 1)
+
+            controller.inflight = 15
+            response = self.client.post("/api/rooms/", {}, content_type="application/json")
+            self.assertEqual((response.status_code, response["Retry-After"]), (503, "4"))
+            self.assertEqual(check.call_count, 2)
+            self.assertEqual(self.client.get("/api/rooms/").status_code, 405)
+            self.assertEqual(check.call_count, 2)
+
+    def test_live_work_is_shed_after_new_work(self):
+        controller = admission.AdmissionController(max_loop_lag=0, max_thread_queue=0, max_inflight=10)
+        controller.inflight = 15
+        self.assertFalse(controller.check("http.join", admission.AdmissionThrottle.priority).admitted)
+        self.assertTrue(controller.check("http.turn", admission.LiveAdmissionThrottle.priority).admitted)
+
+
+class ChannelLayerSweepTests(SimpleTestCase):
+    def test_sweep_evicts_only_unread_channels(self):
+        layer = BatchingChannelLayer(expiry=10)
+        now = time.time()
+        for channel, read_at, waiter in (
+            ("specific.x!idle", now - 60, None),
+            ("specific.x!busy", now - 1, None),
+            ("specific.x!waiting", now - 60, object()),
+        ):
+            queue = layer._queue(channel)
+            queue.items.append((now - 5, b"{}"))
+            queue.read_at, queue.waiter = read_at, waiter
+            layer.groups.setdefault("room_ABC", {})[channel] = now
+        layer._next_sweep = 0
+
+        layer._maybe_sweep()
+        self.assertEqual(set(layer.groups["room_ABC"]), {"specific.x!busy", "specific.x!waiting"})
+
+    def test_put_from_another_thread_wakes_the_reader(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            queue = ChannelQueue(capacity=10)
+            queue.waiter = loop.create_future()
+            await loop.run_in_executor(None, queue.put, time.time() + 10, b"{}")
+            await asyncio.wait_for(queue.waiter, 1)
+            return len(queue.items)
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+
+
+class TranscriptionJobTests(SimpleTestCase):
+    URL = "https://example.com/turn.webm"
+
+    def manager(self, **kwargs):
+        manager = TranscriptionJobManager(**kwargs)
+        self.addCleanup(manager.shutdown)
+        return manager
+
+    def wait_for(self, manager, job_id):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = manager.get(job_id)
+            if job.finished:
+                return job
+            time.sleep(0.01)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_submit_then_poll(self):
+        manager = self.manager(max_workers=1, transcriber=FakeTranscriber(text="The motion stands."))
+        job = self.wait_for(manager, manager.submit(self.URL, speaker="a@example.com").id)
+        self.assertEqual((job.status, job.transcript), (TranscriptionJob.STATUS_DONE, "The motion stands."))
+
+    def test_errors_are_reported_on_the_job(self):
+        manager = self.manager(max_workers=1, transcriber=FakeTranscriber(fail="provider down"))
+        job = self.wait_for(manager, manager.submit(self.URL).id)
+        self.assertEqual((job.status, job.error), (TranscriptionJob.STATUS_ERROR, "provider down"))
+
+    def test_queue_full(self):
+        manager = self.manager(max_workers=1, max_pending=1, transcriber=FakeTranscriber(delay=0.3))
+        manager.submit(self.URL)
+        manager.submit(self.URL)
+        with self.assertRaises(JobQueueFull):
+            manager.submit(self.URL)
+        self.assertEqual(manager.in_flight, 2)
+
+
+
+
+class TranscriptionJobViewTests(SimpleTestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        set_transcriber(FakeTranscriber(text="Point of order.", delay=0.05))
+        self.addCleanup(set_transcriber, None)
+        manager = TranscriptionJobManager(max_workers=1)
+        self.addCleanup(manager.shutdown)
+        for target, value in (("api.views.get_job_manager", lambda: manager),
+                              ("api.transcription_cache._cache", TranscriptCache())):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_submit_then_poll(self):
+        response = self.client.post(
+            "/api/transcribe/jobs/", {"audio_url": "https://example.com/a.webm", "speaker": "a@example.com"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        url = f"/api/transcribe/jobs/{response.json()['jobId']}/"
+        deadline = time.monotonic() + 5
+        while (job := self.client.get(url).json())["status"] != TranscriptionJob.STATUS_DONE:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual((job["transcript"], job["speaker"]), ("Point of order.", "a@example.com"))
+
+    def test_bad_requests(self):
+        response = self.client.post("/api/transcribe/jobs/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/transcribe/jobs/nope/").status_code, 404)
+
+    def test_open_breaker_answers_503(self):
+        breaker = get_transcriber().breaker
+        breaker._open(time.monotonic())
+        response = self.client.post(
+            "/api/transcribe/jobs/", {"audio_url": "https://example.com/a.webm"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(int(response["Retry-After"]), 5)
+
+
+class RoomViewTests(TestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        ratings._board = None
+        self.addCleanup(setattr, ratings, "_board", None)
+        cache.clear()
+        self.attacker = User.objects.create(username="kinde-a", email="a@example.com").userprofile
+        self.room = DebateRoom.objects.create(
+            room_code="ROOM", attacker_email="a@example.com", defender_email="d@example.com",
+            state=DebateRoom.STATE_LIVE,
+        )
+
+    def post(self, path, body, sub="kinde-a", email="a@example.com"):
+        with mock.patch("api.views.verify_kinde_jwt", return_value={"sub": sub, "email": email}):
+            return self.client.post(path, body, content_type="application/json")
+
+    def test_join_seats_and_refusals(self):
+        code = self.post("/api/rooms/", {"email": "x@example.com"}).json()["roomCode"]
+        replies = [
+            self.post(f"/api/rooms/{code}/join/", {"email": email})
+            for email in ("x@example.com", "y@example.com", "z@example.com")
+        ]
+        self.assertEqual([reply.status_code for reply in replies], [200, 200, 400])
+        self.assertEqual([reply.json().get("youAre") for reply in replies[:2]], ["ATTACKER", "DEFENDER"])
+        self.assertEqual(DebateRoom.objects.get(room_code=code).state, DebateRoom.STATE_LIVE)
+
+        DebateRoom.objects.filter(room_code=code).update(defender_email="", state=DebateRoom.STATE_FINISHED)
+        self.assertEqual(self.post(f"/api/rooms/{code}/join/", {"email": "z@example.com"}).status_code, 409)
+        self.assertEqual(self.post(f"/api/rooms/{code}/join/", {"email": "x@example.com"}).status_code, 200)
+
+    def test_events_are_paged_by_seq(self):
+        RoomEvent.objects.bulk_create(
+            RoomEvent(room=self.room, kind=RoomEvent.KIND_CHAT, actor="a@example.com", text=str(n)) for n in range(3)
+        )
+        first = self.client.get("/api/rooms/ROOM/events/?limit=2").json()
+        rest = self.client.get(f"/api/rooms/ROOM/events/?after={first['next']}&limit=2").json()
+        self.assertEqual([event["text"] for event in first["events"] + rest["events"]], ["0", "1", "2"])
+        self.assertIsNone(rest["next"])
+        self.assertEqual(first["events"][0]["type"], "chat")
+        self.assertEqual(self.client.get("/api/rooms/ROOM/events/?after=x").status_code, 400)
+        self.assertEqual(self.client.get("/api/rooms/NOPE/events/").status_code, 404)
+
+    def test_turn_writes_are_checked(self):
+        body = {"speaker_user_id": self.attacker.id, "text": "Opening."}
+        self.assertEqual(self.post("/api/rooms/ROOM/turns/", body, sub="kinde-d").status_code, 403)
+        self.assertEqual(self.post("/api/rooms/ROOM/turns/", {**body, "speaker_user_id": 999999}).status_code, 404)
+        self.assertEqual(self.post("/api/rooms/NOPE/turns/", body).status_code, 404)
+        saved = self.post("/api/rooms/ROOM/turns/", {**body, "speaker_role": ""})
+        self.assertEqual((saved.status_code, saved.json()["turn"]["speaker_role"]), (201, "ATTACKER"))
+        DebateRoom.objects.filter(room_code="ROOM").update(state=DebateRoom.STATE_FINISHED)
+        self.assertEqual(self.post("/api/rooms/ROOM/turns/", body).status_code, 409)
+
+    def test_only_participants_close_a_room(self):
+        self.assertEqual(self.post("/api/rooms/ROOM/close/", {}, email="x@example.com").status_code, 403)
+        self.assertEqual(self.post("/api/rooms/NOPE/close/", {}).status_code, 404)
+        self.assertEqual(DebateRoom.objects.get(room_code="ROOM").state, DebateRoom.STATE_LIVE)
+
+    def test_player_rating(self):
+        self.assertEqual(self.client.get("/api/leaderboard/a@example.com/").status_code, 404)
+        PlayerRating.objects.bulk_create([
+            PlayerRating(email="a@example.com", rating=1210.44, games=3, wins=2, losses=1),
+            PlayerRating(email="d@example.com", rating=1300),
+        ])
+        self.assertEqual(self.client.get("/api/leaderboard/a@example.com/").json(), {
+            "email": "a@example.com", "rating": 1210.4, "rank": 2, "games": 3, "wins": 2, "losses": 1, "draws": 0,
+        })
+
+
+class FlakyBackend:
+    """Raises ``error`` while it is set, else answers "ok"."""
+
+    def __init__(self):
+        self.error = None
+
+    def transcribe(self, audio):
+        if self.error:
+            raise self.error
+        return TranscriptionResult(text="ok")
+
+
+class TranscriptionClientTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("api.transcription_client.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_breaker_opens_on_failures_then_probes_once(self):
+        breaker = CircuitBreaker(window=60, min_calls=4, error_rate=0.5, open_seconds=30)
+        for ok in (True, True, False):
+            breaker.record(ok, 0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(False, 0.1)
+        self.assertEqual((breaker.state, breaker.trips), (CircuitBreaker.OPEN, 1))
+
+        self.now += 10
+        with self.assertRaises(TranscriptionBusy) as busy:
+            breaker.before_call()
+        self.assertEqual(busy.exception.retry_after, 20)
+
+        self.now += 20
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(TranscriptionBusy):
+            breaker.before_call()
+        breaker.record(False, 0.1)
+        self.assertEqual((breaker.state, breaker.trips), (CircuitBreaker.OPEN, 2))
+
+        self.now += 30
+        breaker.before_call()
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.before_call()
+
+    def test_breaker_opens_on_slow_calls_and_forgets_old_ones(self):
+        breaker = CircuitBreaker(window=60, min_calls=2, slow_seconds=5, slow_rate=0.5)
+        breaker.record(False, 0.1)
+        self.now += 61
+        breaker.record(True, 0.1)
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(True, 6)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(True, 6)
+        self.assertTrue(breaker.is_open)
+        self.now += 30
+        self.assertFalse(breaker.is_open)
+
+    def test_limiter_queues_then_rejects(self):
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=1, wait_timeout=5)
+        limiter.acquire()
+        waiter_done = threading.Event()
+
+        def wait_for_slot():
+            limiter.acquire()
+            waiter_done.set()
+
+        waiter = threading.Thread(target=wait_for_slot)
+        waiter.start()
+        while limiter.waiting == 0:
+            time.sleep(0.001)
+        with self.assertRaisesMessage(TranscriptionBusy, "queue is full"):
+            limiter.acquire()
+
+        limiter.release()
+        waiter.join(timeout=5)
+        self.assertTrue(waiter_done.is_set())
+        self.assertEqual((limiter.active, limiter.waiting), (1, 0))
+        limiter.release()
+
+    def test_limiter_wait_times_out(self):
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=1, wait_timeout=0.01)
+        limiter.acquire()
+        with self.assertRaisesMessage(TranscriptionBusy, "Timed out"):
+            limiter.acquire()
+        self.assertEqual((limiter.active, limiter.waiting), (1, 0))
+
+    def test_client_only_counts_provider_failures_against_the_breaker(self):
+        backend = FlakyBackend()
+        client = TranscriptionClient(backend, breaker=CircuitBreaker(min_calls=2, error_rate=0.5))
+        backend.error = TranscriptionError("unsupported audio")
+        for _ in range(2):
+            with self.assertRaises(TranscriptionError):
+                client.transcribe(b"")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+        backend.error = ConnectionError("provider down")
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                client.transcribe(b"")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(TranscriptionBusy):
+            client.transcribe(b"")
+
+        snapshot = client.snapshot()
+        self.assertEqual(
+            {key: snapshot[key] for key in ("calls", "successes", "failures", "rejected_busy", "active")},
+            {"calls": 4, "successes": 2, "failures": 2, "rejected_busy": 1, "active": 0},
+        )
+
+    def test_probe_is_released_when_the_limiter_rejects(self):
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=0)
+        breaker = CircuitBreaker(open_seconds=30)
+        breaker._open(self.now)
+        client = TranscriptionClient(FlakyBackend(), limiter=limiter, breaker=breaker)
+
+        self.now += 30
+        limiter.acquire()
+        with self.assertRaises(TranscriptionBusy):
+            client.transcribe(b"")
+        limiter.release()
+        self.assertEqual(client.transcribe(b"").text, "ok")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TranscriptionStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.backend = FakeStreamingBackend(words_per_frame=2, frames_per_turn=2)
+        set_streaming_backend(self.backend)
+        self.addCleanup(set_streaming_backend, None)
+        DebateRoom.objects.create(room_code="LIVE", attacker_email="a@example.com", defender_email="d@example.com")
+
+    def test_frames_become_live_transcripts(self):
+        async def scenario():
+            layer = get_channel_layer()
+            listener = await layer.new_channel()
+            await layer.group_add("room_LIVE", listener)
+
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), "/ws/room/LIVE/transcribe/?email=a@example.com"
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual(json.loads(await communicator.receive_from())["type"], "stream_started")
+
+            for _ in range(3):
+                await communicator.send_to(bytes_data=b"\x00" * 320)
+            await communicator.send_to(text_data=json.dumps({"type": "stop"}))
+            events = [await asyncio.wait_for(layer.receive(listener), 2) for _ in range(4)]
+            await communicator.disconnect()
+            return events
+
+        events = asyncio.run(scenario())
+        turns = [event["turn"] for event in events]
+        self.assertEqual({event["role"] for event in events}, {"Challenger"})
+        self.assertEqual([turn["endOfTurn"] for turn in turns], [False, True, False, True])
+        self.assertEqual(turns[1]["transcript"], "w1_0 w1_1 w2_0 w2_1")
+        self.assertEqual(turns[3]["transcript"], "w3_0 w3_1")
+        self.assertTrue(self.backend.sessions[0].closed)
+
+    def test_non_participants_are_refused(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), "/ws/room/LIVE/transcribe/?email=x@example.com"
+            )
+            return await communicator.connect()
+
+        self.assertEqual(asyncio.run(scenario()), (False, 4403))
+
+    def stream(self, query):
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/room/LIVE/transcribe/?{query}")
+
+    def test_unsupported_encodings_and_rates_are_refused(self):
+        async def scenario():
+            results = []
+            for query in ("encoding=mp3", "sample_rate=1000", "sample_rate=fast"):
+                results.append(await self.stream(f"email=a@example.com&{query}").connect())
+            return results
+
+        self.assertEqual(asyncio.run(scenario()), [(False, 4415)] * 3)
+        self.assertEqual(self.backend.sessions, [])
+
+    @override_settings(STREAMING_MAX_FRAME_BYTES=100)
+    def test_oversized_frames_close_the_stream(self):
+        registry = StreamingSessionRegistry()
+
+        async def scenario():
+            communicator = self.stream("email=a@example.com")
+            await communicator.connect()
+            await communicator.receive_from()
+            await communicator.send_to(bytes_data=b"\x00" * 101)
+            closed = await communicator.receive_output()
+            await communicator.disconnect(code=4413)
+            return closed
+
+        with mock.patch("api.streaming._registry", registry):
+            self.assertEqual(asyncio.run(scenario()), {"type": "websocket.close", "code": 4413})
+        self.assertTrue(self.backend.sessions[0].closed)
+        self.assertEqual(registry.count("LIVE"), 0)
+
+    def test_streams_beyond_the_room_limit_are_busy(self):
+        async def scenario():
+            first = self.stream("email=a@example.com")
+            await first.connect()
+            busy = await self.stream("email=d@example.com").connect()
+            await first.disconnect()
+            again = self.stream("email=d@example.com")
+            freed = await again.connect()
+            await again.disconnect()
+            return busy, freed
+
+        with mock.patch("api.streaming._registry", StreamingSessionRegistry(max_per_room=1)):
+            busy, freed = asyncio.run(scenario())
+        self.assertEqual(busy, (False, 4429))
+        self.assertTrue(freed[0])
+
+
+class HubConsumerTests(TransactionTestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        DebateRoom.objects.create(room_code="FULL", attacker_email="a@example.com", defender_email="d@example.com")
+
+    def test_rejected_join_leaves_the_socket_free_to_matchmake(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), "/ws/hub/?email=x@example.com"
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_json_to({"stream": "room", "type": "join", "room_code": "FULL"})
+            rejected = await communicator.receive_json_from()
+            await communicator.send_json_to({"stream": "room", "type": "chat_message", "message": "hi"})
+            await communicator.send_json_to({"stream": "matchmaking", "action": "find_match"})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return rejected, reply
+
+        rejected, reply = asyncio.run(scenario())
+        self.assertEqual(rejected, {"stream": "room", "type": "join_rejected", "room_code": "FULL"})
+        self.assertEqual((reply["stream"], reply["status"]), ("matchmaking", "waiting"))
+
+
+
+class RecordingViewer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.messages = []
+
+    async def send_batch(self, message):
+        if self.fail:
+            raise ConnectionError("gone")
+        self.messages.append(message)
+
+
+def speaking(user, is_speaking):
+    return {"type": "speaking_status_handler", "user_id": user, "isSpeaking": is_speaking}
+
+
+def chat(message):
+    return {"type": "chat_message_handler", "message": message, "sender": "a"}
+
+
+class SpectatorFeedTests(SimpleTestCase):
+    def batch(self, feed):
+        return json.loads(feed.take_batch()["text"])
+
+    def test_transient_events_are_coalesced_after_ordered_ones(self):
+        feed = RoomFeed("ROOM", max_events=10)
+        for event in (speaking(1, True), chat("one"), speaking(2, True), speaking(1, False), chat("two"),
+                      {"type": "ping"}):
+            feed.add(event)
+        events = self.batch(feed)["events"]
+        self.assertEqual([event.get("message") for event in events[:2]], ["one", "two"])
+        self.assertEqual(
+            [(event["participantId"], event["isSpeaking"]) for event in events[2:]], [(2, True), (1, False)]
+        )
+        self.assertIsNone(feed.take_batch())
+
+    def test_partial_transcripts_coalesce_but_end_of_turn_is_kept(self):
+        feed = RoomFeed("ROOM", max_events=10)
+        for text, end in (("we", False), ("we should", False), ("we should act", True)):
+            feed.add({"type": "live_transcript", "speaker": "a", "turn": {"turnOrder": 1, "text": text,
+                                                                         "endOfTurn": end}})
+        events = self.batch(feed)["events"]
+        self.assertEqual([(event["text"], event["endOfTurn"]) for event in events],
+                         [("we should act", True), ("we should", False)])
+
+    def test_ordered_events_past_the_cap_are_counted_as_dropped(self):
+        feed = RoomFeed("ROOM", max_events=2)
+        for n in range(5):
+            feed.add(chat(str(n)))
+        batch = self.batch(feed)
+        self.assertEqual(([event["message"] for event in batch["events"]], batch["dropped"]), (["0", "1"], 3))
+        self.assertEqual(batch["tick"], 1)
+        feed.add(chat("5"))
+        batch = self.batch(feed)
+        self.assertEqual((batch["tick"], "dropped" in batch), (2, False))
+
+    def test_one_encoded_message_goes_to_every_viewer(self):
+        feed = RoomFeed("ROOM")
+        first, second, broken = RecordingViewer(), RecordingViewer(), RecordingViewer(fail=True)
+        feed.viewers.update({first, second, broken})
+        feed.add(chat("hi"))
+        asyncio.run(feed.flush())
+        self.assertIs(first.messages[0], second.messages[0])
+        self.assertEqual(json.loads(first.messages[0]["text"])["viewers"], 3)
+        self.assertEqual(feed.viewers, {first, second})
+        asyncio.run(feed.flush())
+        self.assertEqual(len(first.messages), 1)
+
+
+@override_settings(SPECTATOR_TICK_MS=20)
+class SpectatorConsumerTests(TransactionTestCase):
+    def setUp(self):
+        DebateRoom.objects.create(room_code="WATCH", attacker_email="a@example.com", defender_email="d@example.com")
+
+    async def receive_until_quiet(self, viewer):
+        batches = [await viewer.receive_json_from(timeout=2)]
+        while not await viewer.receive_nothing(timeout=0.1):
+            batches.append(await viewer.receive_json_from())
+        return batches
+
+    def test_viewers_get_the_room_in_batches(self):
+        async def scenario():
+            viewers = [WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/room/WATCH/watch/")
+                       for _ in range(2)]
+            for viewer in viewers:
+                connected, _ = await viewer.connect()
+                self.assertTrue(connected)
+            states = [await viewer.receive_json_from() for viewer in viewers]
+            hub = spectators.get_hub()
+            self.assertEqual(hub.viewer_count("WATCH"), 2)
+
+            layer = get_channel_layer()
+            for event in (speaking(1, True), chat("hi"), speaking(1, False)):
+                await layer.group_send("room_WATCH", event)
+            batches = [await self.receive_until_quiet(viewer) for viewer in viewers]
+            for viewer in viewers:
+                await viewer.disconnect()
+            return states, batches, hub.viewer_count("WATCH"), "WATCH" in hub.feeds
+
+        states, batches, left, feed_kept = asyncio.run(scenario())
+        self.assertEqual([state["type"] for state in states], ["spectator_state"] * 2)
+        self.assertEqual(batches[0], batches[1])
+        events = [event for batch in batches[0] for event in batch["events"]]
+        self.assertEqual(events[-1], {"type": "speaking_status", "participantId": 1, "isSpeaking": False})
+        self.assertIn({"type": "chat_message", "message": "hi", "sender": "a"}, events)
+        # All three events normally land in one tick, where the two speaking updates coalesce.
+        self.assertLessEqual(len(events), 3)
+        self.assertEqual((left, feed_kept), (0, False))
+
+    def test_unknown_room_is_refused(self):
+        async def scenario():
+            viewer = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/room/NOPE/watch/")
+            connected, code = await viewer.connect()
+            return connected, code
+
+        self.assertEqual(asyncio.run(scenario()), (False, SPECTATOR_CLOSE_NOT_FOUND))
+
+
+class CountingConsumer(MetricsConsumerMixin, AsyncWebsocketConsumer):
+    @query_budget(1)
+    async def count_rooms(self, event):
+        for _ in range(event["times"]):
+            await database_sync_to_async(DebateRoom.objects.count)()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, SCORING_ASYNC=False, REPLAY_ASYNC=False)
+class QueryBudgetTests(TransactionTestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        cache.clear()
+        patcher = mock.patch("api.ratings._board", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_closing_a_room_stays_within_budget(self):
+        room = DebateRoom.objects.create(
+            room_code="BUDGET", attacker_email="a@example.com", defender_email="d@example.com",
+            state=DebateRoom.STATE_LIVE,
+        )
+        for number, email in enumerate(["a@example.com", "d@example.com"] * 3, start=1):
+            user, _ = User.objects.get_or_create(username=email, email=email)
+            DebateTurn.objects.create(
+                room=room, speaker=user.userprofile, turn_number=number,
+                speaker_role=DebateTurn.SPEAKER_ATTACKER if email.startswith("a") else DebateTurn.SPEAKER_DEFENDER,
+                text="Because the evidence shows it, the claim holds. " * number,
+            )
+        # Stale scores, so closing rescores every turn.
+        DebateTurn.objects.update(turn_score=0)
+
+        with mock.patch("api.views.verify_kinde_jwt", return_value={"email": "a@example.com"}):
+            response = self.client.post("/api/rooms/BUDGET/close/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(DebateReplay.objects.filter(room_id="BUDGET").exists())
+        self.assertEqual(PlayerRating.objects.count(), 2)
+
+    def test_cold_leaderboard_stays_within_budget(self):
+        PlayerRating.objects.create(email="a@example.com", rating=1300)
+        response = self.client.get("/api/leaderboard/")
+        self.assertEqual(response.json()["players"][0]["email"], "a@example.com")
+
+    def test_middleware_raises_when_a_view_exceeds_its_budget(self):
+        PlayerRating.objects.create(email="a@example.com", rating=1300)
+        with mock.patch.object(LeaderboardView.get, "query_budget", 1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "GET leaderboard ran 3 queries (budget 1)"):
+                self.client.get("/api/leaderboard/")
+
+    def test_consumer_handlers_are_held_to_their_budget(self):
+        consumer = CountingConsumer()
+        consumer.scope = {"type": "websocket", "path": "/ws/count/", "headers": []}
+        asyncio.run(consumer.dispatch({"type": "count.rooms", "times": 1}))
+        with self.assertRaisesMessage(QueryBudgetExceeded, "CountingConsumer.count_rooms ran 2 queries (budget 1)"):
+            asyncio.run(consumer.dispatch({"type": "count.rooms", "times": 2}))
+
+    def test_repeated_query_shapes_are_reported_as_n_plus_one(self):
+        codes = [f"R{n}" for n in range(5)]
+        with self.assertLogs("api.queries", "WARNING") as logs:
+            with self.assertRaisesMessage(QueryBudgetExceeded, "; repeated: 5 x SELECT"):
+                with audit_queries("rooms", budget=3) as audit:
+                    for code in codes:
+                        DebateRoom.objects.filter(room_code=code).exists()
+                    DebateRoom.objects.filter(room_code__in=codes).exists()
+                    DebateRoom.objects.filter(room_code__in=codes[:2]).exists()
+        self.assertEqual([n for _, n in audit.shapes.most_common()], [5, 2])
+        self.assertIn("Possible N+1 in rooms: 5 x SELECT", logs.output[0])
+
+
+def spin(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@override_settings(PROFILING_ENABLED=False, PROFILING_TOKEN="secret")
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiling.reset_state()
+        self.addCleanup(profiling.reset_state)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def written(self, name):
+        profiling._writer.submit(lambda: None).result()
+        with open(f"{self.directory}/{name}") as fh:
+            return fh.read()
+
+    def test_sessions_write_collapsed_stacks_of_attached_threads(self):
+        with override_settings(PROFILING_DIR=self.directory):
+            session = profiling.start("GET /api/rooms/")
+            spin(0.05)
+            # Executor threads see the session through the copied context, as with sync_to_async.
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(profiling.traced(spin), 0.05))
+            worker.start()
+            worker.join()
+            name = profiling.stop(session)
+        stacks = self.written(name)
+        self.assertTrue(all(line.startswith("GET /api/rooms/;") for line in stacks.splitlines()))
+        self.assertIn("test_sessions_write_collapsed_stacks_of_attached_threads;api.tests:spin", stacks)
+        self.assertIn("threading:Thread.run;api.profiling:traced.<locals>.wrapper;api.tests:spin", stacks)
+
+    def test_old_profiles_are_rotated_out(self):
+        for index in range(4):
+            with open(f"{self.directory}/{index}.folded", "w") as fh:
+                fh.write("a;b 1\n")
+            os.utime(f"{self.directory}/{index}.folded", (index, index))
+        profiling._rotate(self.directory, keep=2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["2.folded", "3.folded"])
+
+    def test_sampling_follows_the_runtime_state(self):
+        self.assertFalse(profiling.should_profile("/api/rooms/ABC/"))
+        self.assertTrue(profiling.should_profile("/api/rooms/ABC/", profiling.header_forces("secret")))
+        self.assertFalse(profiling.header_forces("wrong"))
+
+        profiling.set_state(True, sample_rate=1.0, paths=["/api/rooms/"])
+        self.assertTrue(profiling.should_profile("/api/rooms/ABC/"))
+        self.assertFalse(profiling.should_profile("/api/leaderboard/"))
+
+    def test_toggle_endpoint_reports_a_per_process_switch(self):
+        self.assertEqual(self.client.get("/api/profiling/").status_code, 403)
+        admin = User.objects.create(username="admin", is_staff=True)
+        self.client.force_login(admin)
+
+        state = self.client.post(
+            "/api/profiling/", {"enabled": True, "sampleRate": 2, "paths": ["/ws/"]}, content_type="application/json"
+        ).json()
+        self.assertEqual(state, {"enabled": True, "sampleRate": 1.0, "paths": ["/ws/"], "shared": False})
+        self.assertTrue(self.client.get("/api/profiling/").json()["enabled"])
+        self.assertFalse(self.client.delete("/api/profiling/").json()["enabled"])
+        response = self.client.post("/api/profiling/", {"enabled": "yes"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class SyncUrls:
+    urlpatterns = [path("api/", include(build_urlpatterns(False)))]
+
+
+class AsyncUrls:
+    urlpatterns = [path("api/", include(build_urlpatterns(True)))]
+
+
+class AsyncViewParityTests(TestCase):
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        self.addCleanup(random.seed)
+        self.speaker = User.objects.create(username="kinde-a", email="a@example.com").userprofile
+        for module in ("views", "async_views"):
+            patcher = mock.patch(f"api.{module}.verify_kinde_jwt", return_value={"sub": "kinde-a"})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def exchange(self, urlconf):
+        """Run one debate's requests against ``urlconf``; returns every (status, body), rolled back."""
+        replies = []
+
+        def call(method, path, body=None):
+            with override_settings(ROOT_URLCONF=urlconf):
+                response = getattr(self.client, method)(path, body, content_type="application/json")
+            text = response.content.decode()
+            # Timestamps differ between runs; their format must not.
+            text = re.sub(r"\d{4}-\d\d-\d\dT[\d:.]+(Z|[+-]\d\d:\d\d)?", lambda m: re.sub(r"\d", "0", m[0]), text)
+            replies.append((method, path, response.status_code, text))
+            return response
+
+        random.seed(0)  # the same room code in both runs
+        with transaction.atomic():
+            call("post", "/api/rooms/", {})
+            code = call("post", "/api/rooms/", {"email": "a@example.com"}).json()["roomCode"]
+            call("post", "/api/rooms/NOPE/join/", {"email": "d@example.com"})
+            call("post", f"/api/rooms/{code}/join/", {"email": "d@example.com"})
+            call("post", f"/api/rooms/{code}/join/", {"email": "x@example.com"})
+            call("post", f"/api/rooms/{code}/turns/", {"speaker_user_id": self.speaker.id})
+            call("post", f"/api/rooms/{code}/turns/", {
+                "speaker_user_id": self.speaker.id, "text": "Opening.", "duration_seconds": "abc",
+            })
+            call("post", f"/api/rooms/{code}/turns/", {
+                "speaker_user_id": self.speaker.id, "text": "Opening.", "duration_seconds": 12,
+            })
+            call("get", f"/api/rooms/{code}/turns/")
+            call("get", "/api/turns/")
+            call("get", f"/api/rooms/{code}/?include_turns=true")
+            call("get", "/api/rooms/NOPE/")
+            call("post", "/api/transcribe_text/", {})
+            transaction.set_rollback(True)
+        return replies
+
+    def test_async_views_answer_like_the_sync_views(self):
+        with override_settings(ROOT_URLCONF=AsyncUrls):
+            self.assertIs(resolve("/api/rooms/").func.view_class, AsyncRoomCreateView)
+        sync, async_ = self.exchange(SyncUrls), self.exchange(AsyncUrls)
+        self.assertEqual(
+            [status for *_, status, _ in sync], [400, 201, 404, 200, 400, 400, 400, 201, 200, 400, 200, 404, 400]
+        )
+        for expected, actual in zip(sync, async_):
+            with self.subTest(request=expected[:2]):
+                self.assertEqual(json.loads(actual[3]), json.loads(expected[3]))
+                self.assertEqual(actual[2], expected[2])
+
+
+
+class EventLogTests(TransactionTestCase):
+    def setUp(self):
+        for code in ("KEEP", "GONE"):
+            DebateRoom.objects.create(room_code=code, attacker_email="a@example.com")
+
+    def row(self, room, text):
+        return room, RoomEvent.KIND_CHAT, "a@example.com", text, None, timezone.now()
+
+    def test_events_of_deleted_rooms_are_dropped(self):
+        rows = [self.row("KEEP", "one"), self.row("GONE", "lost"), self.row("KEEP", "two"), self.row("GONE", "x")]
+        DebateRoom.objects.filter(room_code="GONE").delete()
+        with mock.patch("api.eventlog.EVENT_LOG_DROPPED") as dropped:
+            self.assertEqual(write_events(rows), 2)
+        dropped.inc.assert_called_once_with(2)
+        self.assertEqual([event["text"] for event in read_events("KEEP")], ["one", "two"])
+        self.assertFalse(RoomEvent.objects.filter(room_id="GONE").exists())
+
+    def test_writer_flushes_batches_and_caps_pending(self):
+        async def scenario():
+            writer = EventLogWriter(batch_size=100, flush_interval=60, max_pending=3)
+            with mock.patch("api.eventlog.EVENT_LOG_DROPPED") as dropped:
+                for n in range(4):
+                    writer.append("KEEP", RoomEvent.KIND_CHAT, "a@example.com", str(n))
+            pending = len(writer.pending)
+            written = await writer.flush()
+            writer._task.cancel()
+            return pending, written, dropped.inc.call_count, len(writer.pending)
+
+        self.assertEqual(asyncio.run(scenario()), (3, 3, 1, 0))
+        events = read_events("KEEP")
+        self.assertEqual([(event["type"], event["text"]) for event in events],
+                         [("chat", "0"), ("chat", "1"), ("chat", "2")])
+        self.assertEqual(read_events("KEEP", after=events[0]["seq"], limit=1)[0]["text"], "1")
+
+
+
+def apply_frame(client: dict, frame: dict) -> bool:
+    """Client side of the live transcript protocol; False when a delta arrives out of sequence."""
+    if frame["type"] == "transcript_snapshot":
+        client.update(seq=frame["seq"], text=frame["text"])
+        return True
+    if frame["seq"] != client["seq"] + 1:
+        return False
+    client.update(seq=frame["seq"], text=client["text"][: frame["at"]] + frame["text"])
+    return True
+
+
+class LiveTranscriptTests(SimpleTestCase):
+    def test_common_prefix(self):
+        self.assertEqual(common_prefix("we should", "we shall"), 5)
+        self.assertEqual(common_prefix("abc", "abcdef"), 3)
+        self.assertEqual(common_prefix("", "x"), 0)
+
+    def test_deltas_rebuild_the_text_with_consecutive_seqs(self):
+        buffer = TranscriptBuffer("a@example.com", "attacker", snapshot_every=100)
+        client = {"seq": 0, "text": ""}
+        frames = [
+            buffer.update("we"),
+            buffer.update("we should"),
+            buffer.update("we shall act", final=True),
+            buffer.update("now"),
+            buffer.update("no"),
+        ]
+        self.assertIsNone(buffer.update("no"))
+        for frame in frames:
+            self.assertTrue(apply_frame(client, frame))
+        self.assertEqual(client, {"seq": 5, "text": "we shall act no"})
+        self.assertEqual((frames[2]["at"], frames[2]["text"]), (5, "all act"))
+        self.assertEqual((frames[4]["at"], frames[4]["text"]), (len("we shall act no"), ""))
+
+    def test_snapshots_resync_a_client_that_missed_a_delta(self):
+        buffer = TranscriptBuffer("a@example.com", "attacker", snapshot_every=4)
+        client = {"seq": 0, "text": ""}
+        self.assertTrue(apply_frame(client, buffer.update("one")))
+        buffer.update("one two")
+        self.assertFalse(apply_frame(client, buffer.update("one two three")))
+
+        snapshot = buffer.update("one two three four")
+        self.assertEqual((snapshot["type"], snapshot["seq"]), ("transcript_snapshot", 4))
+        self.assertTrue(apply_frame(client, snapshot))
+        self.assertTrue(apply_frame(client, buffer.update("one two three four five")))
+        self.assertEqual(client, {"seq": 5, "text": "one two three four five"})
+
+    def test_finish_closes_the_turn_with_a_final_snapshot(self):
+        LIVE_TRANSCRIPTS.clear()
+        self.addCleanup(LIVE_TRANSCRIPTS.clear)
+        buffer = get_buffer("ROOM", "a@example.com", "attacker")
+        buffer.update("opening", final=True)
+        buffer.update("statement")
+        self.assertEqual(room_snapshots("ROOM"), [{
+            "type": "transcript_snapshot", "speaker": "a@example.com", "role": "attacker", "seq": 2,
+            "text": "opening statement", "final": False,
+        }])
+
+        text, frame = buffer.finish()
+        self.assertEqual((text, frame["text"]), ("opening statement", "opening statement"))
+        self.assertEqual((frame["seq"], frame["final"]), (3, True))
+        self.assertEqual(room_snapshots("ROOM"), [])
+        # The next turn continues the sequence, so a late delta from the old turn is detected.
+        self.assertEqual((buffer.update("rebuttal")["seq"], buffer.update("rebuttal")), (4, None))
+        self.assertIs(drop_buffer("ROOM", "a@example.com"), buffer)
+        self.assertNotIn("ROOM", LIVE_TRANSCRIPTS)
+
+
+class ReplayDocumentTests(TestCase):
+    def setUp(self):
+        self.origin = datetime(2026, 10, 19, 12, 0, tzinfo=dt_timezone.utc)
+        room = DebateRoom.objects.create(
+            room_code="REPLAY", attacker_email="a@example.com", defender_email="d@example.com",
+            winner_email="d@example.com", state=DebateRoom.STATE_FINISHED,
+            closed_at=self.origin + timedelta(seconds=120),
+        )
+        DebateRoom.objects.filter(pk=room.pk).update(created_at=self.origin)
+        self.room = DebateRoom.objects.get(pk=room.pk)
+        attacker = User.objects.create(username="kinde-a", email="a@example.com").userprofile
+        defender = User.objects.create(username="kinde-d", email="d@example.com").userprofile
+        for number, (speaker, role, at, duration, score) in enumerate([
+            (attacker, DebateTurn.SPEAKER_ATTACKER, 30, 20, 10),
+            (defender, DebateTurn.SPEAKER_DEFENDER, 70, 30, 15),
+            (attacker, DebateTurn.SPEAKER_ATTACKER, 100, 20, 5),
+        ], start=1):
+            turn = DebateTurn.objects.create(
+                room=self.room, speaker=speaker, speaker_role=role, text="word " * number,
+                turn_number=number, duration_seconds=duration, turn_score=score,
+            )
+            DebateTurn.objects.filter(pk=turn.pk).update(timestamp=self.origin + timedelta(seconds=at))
+        RoomEvent.objects.bulk_create([
+            RoomEvent(room=self.room, kind=RoomEvent.KIND_JOIN, actor="a@example.com",
+                      created_at=self.origin + timedelta(seconds=1)),
+            RoomEvent(room=self.room, kind=RoomEvent.KIND_CHAT, actor="a@example.com", text="hi",
+                      created_at=self.origin + timedelta(seconds=2)),
+        ])
+
+    def test_replay_document(self):
+        self.assertEqual(self.client.get("/api/rooms/REPLAY/replay/").status_code, 404)
+        store_replay(self.room)
+        document = self.client.get("/api/rooms/REPLAY/replay/").json()
+
+        self.assertEqual(
+            (document["createdAt"], document["closedAt"]), ("2026-10-19T12:00:00Z", "2026-10-19T12:02:00Z")
+        )
+        self.assertEqual(document["createdAt"], self.client.get("/api/rooms/REPLAY/").json()["createdAt"])
+        self.assertEqual(document["durationSeconds"], 120.0)
+        self.assertEqual(document["turns"]["at"], [30.0, 70.0, 100.0])
+        self.assertEqual(document["turns"]["speaker"], ["a@example.com", "d@example.com", "a@example.com"])
+        self.assertEqual(document["turns"]["words"], [1, 2, 3])
+        self.assertEqual(document["scores"], {"attacker": [10, 10, 15], "defender": [0, 15, 15]})
+        # No debate clock ran: speaking time comes from each turn's duration.
+        self.assertEqual(document["speaking"]["start"], [10.0, 40.0, 80.0])
+        self.assertEqual(document["talkTime"], {"attacker": 40.0, "defender": 30.0})
+        self.assertEqual(
+            document["timeline"], {"at": [1.0, 2.0], "type": ["join", "chat"], "actor": ["a@example.com"] * 2}
+        )
+        self.assertEqual(document["topTurns"], [1, 0, 2])
+
+    def test_clock_events_give_the_speaking_intervals(self):
+        RoomEvent.objects.bulk_create([
+            RoomEvent(room=self.room, kind=kind, actor=role, created_at=self.origin + timedelta(seconds=at))
+            for kind, role, at in [
+                (RoomEvent.KIND_TURN_STARTED, DebateTurn.SPEAKER_ATTACKER, 5),
+                (RoomEvent.KIND_TURN_STARTED, DebateTurn.SPEAKER_DEFENDER, 35),
+                (RoomEvent.KIND_TURN_ENDED, DebateTurn.SPEAKER_DEFENDER, 65),
+                (RoomEvent.KIND_TURN_STARTED, DebateTurn.SPEAKER_ATTACKER, 90),
+            ]
+        ])
+        document = json.loads(decode_replay(store_replay(self.room).payload))
+        self.assertEqual(document["speaking"]["start"], [5.0, 35.0, 90.0])
+        self.assertEqual(document["speaking"]["end"], [35.0, 65.0, 120.0])
+        self.assertEqual(document["talkTime"], {"attacker": 60.0, "defender": 30.0})
+
+    def test_running_debates_have_no_replay(self):
+        DebateRoom.objects.filter(pk="REPLAY").update(state=DebateRoom.STATE_LIVE)
+        self.assertEqual(self.client.get("/api/rooms/REPLAY/replay/").status_code, 409)
+        self.assertEqual(self.client.get("/api/rooms/NOPE/replay/").status_code, 404)
+
+
+class MetricsTests(SimpleTestCase):
+    def registry(self):
+        registry = metrics.Registry()
+        requests = metrics.Counter("requests_total", "Requests.", ["view"], registry=registry)
+        requests.labels('room "A"').inc(2)
+        metrics.Gauge("open", "Open sockets.", registry=registry).set(3)
+        latency = metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+        for seconds in (0.05, 0.5, 5):
+            latency.observe(seconds)
+        return registry
+
+    def test_render_prometheus_text(self):
+        text = metrics.render(self.registry().collect())
+        self.assertIn("# TYPE requests_total counter\n", text)
+        self.assertIn('requests_total{view="room \\"A\\""} 2\n', text)
+        self.assertIn("open 3\n", text)
+        for line in ('latency_seconds_bucket{le="0.1"} 1', 'latency_seconds_bucket{le="1"} 2',
+                     'latency_seconds_bucket{le="+Inf"} 3', "latency_seconds_sum 5.55", "latency_seconds_count 3"):
+            self.assertIn(line + "\n", text)
+
+    def test_processes_are_merged_and_exited_ones_folded(self):
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        snapshot = self.registry().collect()
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            for name in (f"{socket.gethostname()}-{exited.pid}.json", "other-host-1.json"):
+                with open(os.path.join(directory, name), "w") as fh:
+                    json.dump(snapshot, fh)
+
+            for _ in range(2):
+                merged = metrics.collect_all(self.registry())
+                samples = {name: dict((tuple(k), v) for k, v in m["samples"]) for name, m in merged.items()}
+                self.assertEqual(samples["requests_total"][('room "A"',)], 6)
+                self.assertEqual(samples["latency_seconds"][()]["counts"], [3, 3, 3])
+                # The exited process's gauge is gone; the other host's is fresh.
+                self.assertEqual(samples["open"][()], 6)
+
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if not name.startswith(".")),
+                sorted(["other-host-1.json", f"{socket.gethostname()}-dead.json",
+                        f"{socket.gethostname()}-{os.getpid()}.json"]),
+            )
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("api.ratelimit.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = RateLimiter(MemoryBackend(), load_policies({"ws.chat_message": "1/s:2"}))
+
+    def check(self):
+        return self.limiter.check("ws.chat_message", "a@example.com")
+
+    def test_burst_then_rejection_then_refill(self):
+        self.assertTrue(self.check().allowed)
+        self.assertTrue(self.check().allowed)
+        rejected = self.check()
+        self.assertFalse(rejected.allowed)
+        self.assertAlmostEqual(rejected.retry_after, 1.0)
+
+        self.now += 1.0
+        self.assertTrue(self.check().allowed)
+        self.assertFalse(self.check().allowed)
+
+    def test_buckets_are_per_key_and_unknown_policies_pass(self):
+        for _ in range(2):
+            self.limiter.check("ws.chat_message", "a@example.com")
+        self.assertTrue(self.limiter.check("ws.chat_message", "b@example.com").allowed)
+        self.assertTrue(self.limiter.check("ws.unknown", "a@example.com").allowed)
+        decision = self.limiter.check_all([("ws.unknown", "a@example.com"), ("ws.chat_message", "a@example.com")])
+        self.assertFalse(decision.allowed)
+
+
+class BatchingChannelLayerTests(SimpleTestCase):
+    async def members(self, layer, group, count):
+        channels = [await layer.new_channel() for _ in range(count)]
+        for channel in channels:
+            await layer.group_add(group, channel)
+        return channels
+
+    def test_group_fan_out_and_discard(self):
+        async def scenario():
+            layer = BatchingChannelLayer()
+            channels = await self.members(layer, "room_ABC", 3)
+            await layer.group_send("room_ABC", {"type": "chat.message", "text": "Point one."})
+            received = [await asyncio.wait_for(layer.receive(channel), 1) for channel in channels]
+
+            await layer.group_discard("room_ABC", channels[0])
+            await layer.group_send("room_ABC", {"type": "chat.message", "text": "Point two."})
+            second = [await asyncio.wait_for(layer.receive(channel), 1) for channel in channels[1:]]
+            return received, second, layer.queues.get(channels[0])
+
+        received, second, discarded = asyncio.run(scenario())
+        self.assertEqual([message["text"] for message in received], ["Point one."] * 3)
+        self.assertEqual([message["text"] for message in second], ["Point two."] * 2)
+        self.assertIsNone(discarded)
+
+    def test_server_mode_shares_groups_between_processes(self):
+        async def scenario():
+            hub = ChannelLayerServer()
+            server = await hub.start("127.0.0.1", 0)
+            address = f"127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            first, second = BatchingChannelLayer(server=address), BatchingChannelLayer(server=address)
+            try:
+                local = await self.members(first, "room_ABC", 1)
+                remote = await self.members(second, "room_ABC", 2)
+                # Connect the second process so deliveries to it have a route.
+                readers = [asyncio.ensure_future(second.receive(channel)) for channel in remote]
+                await asyncio.sleep(0.05)
+                await first.group_send("room_ABC", {"type": "chat.message", "text": "Shared."})
+                messages = await asyncio.wait_for(asyncio.gather(first.receive(local[0]), *readers), 2)
+            finally:
+                await first.close()
+                await second.close()
+                # Let the server's handlers see the disconnects before the loop goes away.
+                for _ in range(100):
+                    if not hub.clients:
+                        break
+                    await asyncio.sleep(0.01)
+                server.close()
+                await server.wait_closed()
+            return messages
+
+        self.assertEqual([message["text"] for message in asyncio.run(scenario())], ["Shared."] * 3)
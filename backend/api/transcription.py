@@ -0,0 +1,153 @@
+"""
+Pluggable transcription backends.
+
+A backend exposes ``transcribe(audio)`` where ``audio`` is a public URL, a
+local file path or a binary file object, and returns a TranscriptionResult.
+The active backend is chosen by settings.TRANSCRIPTION_BACKEND, either one of
+the short names in TRANSCRIPTION_BACKENDS or a dotted import path, and is
+reached through a TranscriptionClient (see transcription_client) that bounds
+concurrency and trips a circuit breaker when the provider degrades.
+"""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .optional import optional_import
+
+
+TRANSCRIPTION_BACKENDS = {
+    "assemblyai": "api.transcription.AssemblyAITranscriber",
+    "fake": "api.transcription.FakeTranscriber",
+}
+
+
+class TranscriptionError(Exception):
+    """The backend was reached but could not produce a transcript."""
+
+
+class TranscriptionUnavailable(TranscriptionError):
+    """The backend is not usable on this server (missing package or key)."""
+
+
+@dataclass
+class TranscriptionResult:
+    text: str
+    audio_duration: float | None = None
+    preprocessing: dict | None = None
+
+
+class AssemblyAITranscriber:
+    """
+    Transcribe with the AssemblyAI SDK. Blocks until AssemblyAI finishes polling.
+    The SDK transcriber is configured once and reused across calls and threads.
+    """
+
+    speech_models = ["universal"]
+
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key
+        self._transcriber = None
+        self._lock = threading.Lock()
+
+    def _get_sdk_transcriber(self):
+        with self._lock:
+            if self._transcriber is None:
+                aai = optional_import("assemblyai")
+                if aai is None:
+                    raise TranscriptionUnavailable("assemblyai package not installed")
+
+                api_key = self.api_key or os.getenv("ASSEMBLYAI_API_KEY")
+                if not api_key:
+                    raise TranscriptionUnavailable("ASSEMBLYAI_API_KEY not set on server")
+
+                aai.settings.api_key = api_key
+                self._transcriber = aai.Transcriber(
+                    config=aai.TranscriptionConfig(speech_models=self.speech_models)
+                )
+            return self._transcriber
+
+    def cache_config(self) -> dict:
+        return {"backend": "assemblyai", "speech_models": self.speech_models}
+
+    def transcribe(self, audio) -> TranscriptionResult:
+        transcript = self._get_sdk_transcriber().transcribe(audio)
+
+        if transcript.status == "error":
+            raise TranscriptionError(transcript.error)
+
+        return TranscriptionResult(
+            text=transcript.text or "",
+            audio_duration=getattr(transcript, "audio_duration", None),
+        )
+
+
+class FakeTranscriber:
+    """
+    Offline backend for tests and local development.
+
+    Returns ``text`` when given, otherwise a deterministic string derived from
+    the audio, after sleeping ``delay`` seconds to mimic provider latency.
+    """
+
+    def __init__(self, text: str | None = None, delay: float = 0.0, fail: str | None = None):
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def cache_config(self) -> dict:
+        return {"backend": "fake", "text": self.text, "fail": self.fail}
+
+    def transcribe(self, audio) -> TranscriptionResult:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise TranscriptionError(self.fail)
+        if self.text is not None:
+            return TranscriptionResult(text=self.text)
+
+        if hasattr(audio, "read"):
+            data = audio.read()
+        elif isinstance(audio, str) and os.path.exists(audio):
+            with open(audio, "rb") as fh:
+                data = fh.read()
+        else:
+            data = str(audio).encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()[:8]
+        return TranscriptionResult(text=f"fake transcript {digest} ({len(data)} bytes)")
+
+
+_transcriber = None
+
+
+_transcriber_lock = threading.Lock()
+
+
+def get_transcriber():
+    """Return the process-wide TranscriptionClient for the configured backend."""
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            from .transcription_client import build_client
+
+            name = getattr(settings, "TRANSCRIPTION_BACKEND", "assemblyai")
+            _transcriber = build_client(import_string(TRANSCRIPTION_BACKENDS.get(name, name))())
+        return _transcriber
+
+
+def set_transcriber(backend):
+    """
+    Swap the process-wide backend (e.g. for a FakeTranscriber in tests). It is
+    wrapped in a fresh TranscriptionClient.
+    """
+    from .transcription_client import build_client
+
+    global _transcriber
+    with _transcriber_lock:
+        _transcriber = build_client(backend)
@@ -0,0 +1,302 @@
+"""
+Content-addressed cache for finished transcripts.
+
+Entries are keyed by a SHA-256 of the audio bytes together with the
+backend's transcription config, so a client re-uploading the same blob after
+a network error is answered without another paid provider call. An
+``audio_url`` (checked and normalized by uploads.clean_audio_url) is keyed on
+the URL string itself: the request path never fetches or probes it, so new
+content behind the same URL is only picked up once the entry expires.
+
+Finished transcripts are kept in a bounded in-memory LRU and mirrored to JSON
+files on local disk; both expire after settings.TRANSCRIPTION_CACHE_TTL.
+Concurrent requests for the same key share a single in-flight call.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from . import audio as audio_stage
+from .segmented import transcribe_segmented
+from .transcription import TranscriptionResult
+
+logger = logging.getLogger(__name__)
+
+
+def audio_digest(audio) -> str:
+    """
+    Return the SHA-256 hex digest for ``audio``: a URL string (hashed as a
+    string, never opened), a SpooledAudioFile (already hashed while it was
+    uploaded) or any file object.
+    """
+    if isinstance(audio, str):
+        return hashlib.sha256(b"url:" + audio.encode("utf-8")).hexdigest()
+
+    digest = getattr(audio, "sha256", None)
+    if digest:
+        return digest
+
+    sha = hashlib.sha256()
+    audio.seek(0)
+    for chunk in iter(lambda: audio.read(64 * 1024), b""):
+        sha.update(chunk)
+    audio.seek(0)
+    return sha.hexdigest()
+
+
+def cache_key(digest: str, config: dict) -> str:
+    """Combine an audio digest and a transcription config into a cache key."""
+    config_blob = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{digest}:{config_blob}".encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Two-tier LRU/TTL cache of TranscriptionResult objects with single-flight
+    deduplication. ``directory`` may be None for a memory-only cache.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 86400,
+                 directory: str | None = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries: OrderedDict[str, tuple[float, TranscriptionResult]] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "inflight_joins": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> TranscriptionResult | None:
+        """
+        Return a cached result or None. Only hits are counted here; a miss is
+        counted once the caller falls through to get_or_compute().
+        """
+        with self._lock:
+            result = self._get_memory(key)
+        if result is not None:
+            return result
+
+        # Disk reads happen outside the lock so they don't stall other keys.
+        now = time.time()
+        disk = self._read_disk(key, now)
+        if disk is None:
+            return None
+        stored_at, result = disk
+        with self._lock:
+            self._put_memory(key, result, stored_at)
+            self.stats["disk_hits"] += 1
+        return result
+
+    def put(self, key: str, result: TranscriptionResult):
+        with self._lock:
+            self._put_memory(key, result, time.time())
+        self._write_disk(key, result)
+
+    def get_or_compute(self, key: str, compute) -> tuple[TranscriptionResult, bool]:
+        """
+        Return ``(result, cached)``. On a miss ``compute()`` is called once per
+        key; concurrent callers for the same key wait for that call instead of
+        starting their own. Errors are not cached.
+        """
+        result = self.get(key)
+        if result is not None:
+            return result, True
+        with self._lock:
+            # Filled in by another caller since get()?
+            result = self._get_memory(key)
+            if result is not None:
+                return result, True
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["inflight_joins"] += 1
+                owner = False
+            else:
+                self.stats["misses"] += 1
+                future = self._inflight[key] = Future()
+                owner = True
+
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.put(key, result)
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "inflight": len(self._inflight)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.stats["memory_hits"] += 1
+        return result
+
+    def _put_memory(self, key, result, stored_at):
+        self._entries[key] = (stored_at, result)
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key, now):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if now - data["stored_at"] > self.ttl:
+            self._remove(path)
+            return None
+        # Touch so disk pruning drops the least recently used files first.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data["stored_at"], TranscriptionResult(
+            data["text"], data.get("audio_duration"), data.get("preprocessing")
+        )
+
+    def _write_disk(self, key, result):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(
+                    {
+                        "stored_at": time.time(),
+                        "text": result.text,
+                        "audio_duration": result.audio_duration,
+                        "preprocessing": result.preprocessing,
+                    },
+                    fh,
+                )
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("Could not write transcript cache entry %s", key, exc_info=True)
+            self._remove(tmp_path)
+            return
+        # Listing the directory is O(files), so only prune every few writes.
+        self._disk_writes += 1
+        if self._disk_writes % 64 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return
+        excess = len(names) - self.max_disk_entries
+        if excess <= 0:
+            return
+        paths = [os.path.join(self.directory, n) for n in names]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in paths[:excess]:
+            self._remove(path)
+            self.stats["evictions"] += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = getattr(settings, "TRANSCRIPTION_CACHE_DIR", None)
+            _cache = TranscriptCache(
+                max_entries=getattr(settings, "TRANSCRIPTION_CACHE_ENTRIES", 512),
+                ttl=getattr(settings, "TRANSCRIPTION_CACHE_TTL", 86400),
+                directory=str(directory) if directory else None,
+                max_disk_entries=getattr(settings, "TRANSCRIPTION_CACHE_DISK_ENTRIES", 10000),
+            )
+        return _cache
+
+
+def transcription_key(audio, transcriber, segmented: bool = False) -> str:
+    """Cache key for transcribing ``audio`` with ``transcriber``."""
+    config = getattr(transcriber, "cache_config", None)
+    config = config() if callable(config) else {"backend": type(transcriber).__name__}
+    preprocess = audio_stage.cache_config()
+    if preprocess and not isinstance(audio, str):
+        config = {**config, "preprocess": preprocess}
+        if segmented:
+            config["segmented"] = {
+                "seconds": getattr(settings, "TRANSCRIPTION_SEGMENT_SECONDS", 20.0),
+                "overlap": getattr(settings, "TRANSCRIPTION_SEGMENT_OVERLAP", 1.0),
+            }
+    return cache_key(audio_digest(audio), config)
+
+
+def run_transcription(audio, transcriber, segmented: bool = False, on_progress=None) -> TranscriptionResult:
+    """Preprocess and transcribe ``audio``, in parallel segments when asked."""
+    if segmented:
+        return transcribe_segmented(audio, transcriber, on_progress=on_progress)
+    return audio_stage.transcribe_audio(audio, transcriber)
+
+
+def transcribe_cached(audio, transcriber, key: str | None = None, segmented: bool = False,
+                      on_progress=None) -> tuple[TranscriptionResult, bool]:
+    """Transcribe through the cache. Returns ``(result, cached)``."""
+    key = key or transcription_key(audio, transcriber, segmented)
+    return get_transcript_cache().get_or_compute(
+        key, lambda: run_transcription(audio, transcriber, segmented, on_progress)
+    )
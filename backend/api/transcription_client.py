@@ -0,0 +1,253 @@
+"""
+Outbound transcription client: concurrency limit and circuit breaker.
+
+Every call to the transcription provider goes through one process-wide
+TranscriptionClient. It caps concurrent outbound calls with a semaphore and a
+bounded wait queue, and fails fast with TranscriptionBusy when the queue is
+full or the circuit breaker is open. The breaker trips when, within a rolling
+window, too many calls fail or take longer than the slow-call threshold, so a
+degraded provider cannot pin every worker thread.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .metrics import TRANSCRIPTION_REJECTED, TRANSCRIPTION_SECONDS
+from .transcription import TranscriptionError
+
+
+class TranscriptionBusy(TranscriptionError):
+    """Rejected without calling the provider; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    At most ``max_concurrent`` calls run at once and at most ``max_waiting``
+    more wait, each for up to ``wait_timeout`` seconds. Anything beyond that is
+    rejected immediately.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_waiting: int = 16, wait_timeout: float = 10):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    def acquire(self):
+        if self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+            return
+
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                raise TranscriptionBusy("Transcription queue is full")
+            self.waiting += 1
+        try:
+            acquired = self._semaphore.acquire(timeout=self.wait_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            raise TranscriptionBusy("Timed out waiting for a transcription slot")
+        with self._lock:
+            self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when, over the last ``window`` seconds and at least
+    ``min_calls`` calls, the failure rate or the slow-call rate reaches its
+    threshold. Open rejects calls for ``open_seconds``, then half-open lets a
+    single probe through: success closes the breaker, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: float = 60, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_seconds: float = 45, slow_rate: float = 0.5, open_seconds: float = 30):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    raise TranscriptionBusy("Transcription provider circuit is open", retry_after=remaining)
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise TranscriptionBusy("Transcription provider is being probed", retry_after=1)
+                self._probing = True
+
+    def record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.slow_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok and not slow:
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok, slow))
+            cutoff = now - self.window
+            while self._calls and self._calls[0][0] < cutoff:
+                self._calls.popleft()
+
+            total = len(self._calls)
+            if self.state == self.CLOSED and total >= self.min_calls:
+                failures = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+                if failures / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+                    self._open(now)
+
+    def cancel_probe(self):
+        """The call allowed by before_call() never happened."""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() < self._opened_at + self.open_seconds
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self.trips += 1
+        self._calls.clear()
+
+
+class TranscriptionClient:
+    """
+    Wraps a transcription backend with the limiter and breaker and keeps call
+    metrics. Exposes the same ``transcribe``/``cache_config`` interface.
+    """
+
+    def __init__(self, backend, limiter: ConcurrencyLimiter | None = None,
+                 breaker: CircuitBreaker | None = None):
+        self.backend = backend
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "rejected_busy": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def cache_config(self) -> dict:
+        config = getattr(self.backend, "cache_config", None)
+        return config() if callable(config) else {"backend": type(self.backend).__name__}
+
+    def transcribe(self, audio):
+        try:
+            self.breaker.before_call()
+        except TranscriptionBusy:
+            self._count("rejected_busy")
+            raise
+        try:
+            self.limiter.acquire()
+        except TranscriptionBusy:
+            self.breaker.cancel_probe()
+            self._count("rejected_busy")
+            raise
+
+        started = time.monotonic()
+        ok = False
+        outcome = "failure"
+        try:
+            result = self.backend.transcribe(audio)
+            ok = True
+            outcome = "ok"
+            return result
+        except TranscriptionError:
+            # The provider answered; a bad recording says nothing about its health.
+            ok = True
+            outcome = "error"
+            raise
+        finally:
+            latency = time.monotonic() - started
+            self.limiter.release()
+            self.breaker.record(ok, latency)
+            TRANSCRIPTION_SECONDS.labels(outcome).observe(latency)
+            with self._lock:
+                self.metrics["calls"] += 1
+                self.metrics["successes" if ok else "failures"] += 1
+                self.metrics["latency_total"] += latency
+                self.metrics["latency_max"] = max(self.metrics["latency_max"], latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+        calls = metrics.pop("calls")
+        latency_total = metrics.pop("latency_total")
+        return {
+            "calls": calls,
+            **metrics,
+            "latency_avg": latency_total / calls if calls else 0.0,
+            "active": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "breaker_state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+        }
+
+    def _count(self, name):
+        if name == "rejected_busy":
+            TRANSCRIPTION_REJECTED.inc()
+        with self._lock:
+            self.metrics[name] += 1
+
+
+def build_client(backend) -> TranscriptionClient:
+    """Wrap ``backend`` with a limiter and breaker configured from settings."""
+    return TranscriptionClient(
+        backend,
+        limiter=ConcurrencyLimiter(
+            max_concurrent=getattr(settings, "TRANSCRIPTION_MAX_CONCURRENCY", 8),
+            max_waiting=getattr(settings, "TRANSCRIPTION_MAX_WAITING", 16),
+            wait_timeout=getattr(settings, "TRANSCRIPTION_WAIT_TIMEOUT", 10),
+        ),
+        breaker=CircuitBreaker(
+            window=getattr(settings, "TRANSCRIPTION_BREAKER_WINDOW", 60),
+            min_calls=getattr(settings, "TRANSCRIPTION_BREAKER_MIN_CALLS", 10),
+            error_rate=getattr(settings, "TRANSCRIPTION_BREAKER_ERROR_RATE", 0.5),
+            slow_seconds=getattr(settings, "TRANSCRIPTION_BREAKER_SLOW_SECONDS", 45),
+            slow_rate=getattr(settings, "TRANSCRIPTION_BREAKER_SLOW_RATE", 0.5),
+            open_seconds=getattr(settings, "TRANSCRIPTION_BREAKER_OPEN_SECONDS", 30),
+        ),
+    )
@@ -0,0 +1,239 @@
+"""
+Background transcription jobs.
+
+Submitting a job returns immediately with a job id. A bounded thread pool runs
+the transcriber; when a job finishes its result is pushed to the room's
+WebSocket group ("room_<code>") as a ``transcription_result`` event and kept
+for polling until it expires. Segmented jobs also push
+``transcription_progress`` events as their stitched text grows.
+
+Jobs live in process memory, so the status endpoint only knows about jobs that
+were submitted to the same worker process.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .metrics import GROUP_SENDS
+from .neon_store import store_transcript
+from .transcription import TranscriptionError, get_transcriber
+from .transcription_cache import get_transcript_cache, run_transcription
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the pool already holds the maximum number of pending jobs."""
+
+
+@dataclass
+class TranscriptionJob:
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_ERROR = "error"
+
+    id: str
+    room_code: str | None = None
+    speaker: str | None = None
+    status: str = STATUS_QUEUED
+    transcript: str | None = None
+    error: str | None = None
+    cached: bool = False
+    segmented: bool = False
+    progress: dict | None = None
+    preprocessing: dict | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.STATUS_DONE, self.STATUS_ERROR)
+
+    def as_dict(self) -> dict:
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "roomCode": self.room_code,
+            "speaker": self.speaker,
+            "transcript": self.transcript,
+            "error": self.error,
+            "cached": self.cached,
+            "progress": self.progress,
+            "preprocessing": self.preprocessing,
+        }
+
+
+class TranscriptionJobManager:
+    """
+    Runs transcriptions on at most ``max_workers`` threads with at most
+    ``max_pending`` further jobs waiting. Finished jobs are dropped after ``ttl``
+    seconds.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, ttl: float = 900, transcriber=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.transcriber = transcriber
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="transcribe"
+        )
+        self._jobs: dict[str, TranscriptionJob] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, audio, room_code=None, speaker=None, cleanup=None, cache_key=None,
+               segmented=False) -> TranscriptionJob:
+        """
+        Queue ``audio`` (URL, local path or file object) for transcription.
+        ``cleanup`` is called once the job is done with the audio, whether or
+        not it ran. With a ``cache_key`` a cached transcript completes the job
+        immediately, and identical audio already in flight is not sent twice.
+        ``segmented`` transcribes long audio in parallel segments.
+        """
+        if cache_key:
+            cached = get_transcript_cache().get(cache_key)
+            if cached is not None:
+                if cleanup:
+                    cleanup()
+                return self._complete_cached(cached, room_code, speaker)
+
+        with self._lock:
+            self._prune()
+            if self._in_flight >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many transcription jobs in flight")
+            self._in_flight += 1
+            job = TranscriptionJob(
+                id=uuid.uuid4().hex, room_code=room_code, speaker=speaker, segmented=segmented
+            )
+            self._jobs[job.id] = job
+
+        try:
+            self._executor.submit(self._run, job, audio, cleanup, cache_key)
+        except RuntimeError:
+            with self._lock:
+                self._in_flight -= 1
+                self._jobs.pop(job.id, None)
+            if cleanup:
+                cleanup()
+            raise
+        return job
+
+    def get(self, job_id: str) -> TranscriptionJob | None:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _complete_cached(self, result, room_code, speaker) -> TranscriptionJob:
+        job = TranscriptionJob(
+            id=uuid.uuid4().hex,
+            room_code=room_code,
+            speaker=speaker,
+            status=TranscriptionJob.STATUS_DONE,
+            transcript=result.text,
+            cached=True,
+            preprocessing=result.preprocessing,
+            finished_at=time.time(),
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+        store_transcript(job.transcript, speaker=speaker, room_code=room_code)
+        self._publish(job)
+        return job
+
+    def _run(self, job: TranscriptionJob, audio, cleanup, cache_key=None):
+        job.status = TranscriptionJob.STATUS_RUNNING
+        try:
+            transcriber = self.transcriber or get_transcriber()
+            on_progress = (lambda progress: self._progress(job, progress)) if job.segmented else None
+
+            def compute():
+                return run_transcription(audio, transcriber, job.segmented, on_progress)
+
+            if cache_key:
+                result, job.cached = get_transcript_cache().get_or_compute(cache_key, compute)
+            else:
+                result = compute()
+            job.transcript = result.text
+            job.preprocessing = result.preprocessing
+            job.status = TranscriptionJob.STATUS_DONE
+        except TranscriptionError as exc:
+            job.error = str(exc)
+            job.status = TranscriptionJob.STATUS_ERROR
+        except Exception as exc:
+            logger.exception("Transcription job %s failed", job.id)
+            job.error = str(exc)
+            job.status = TranscriptionJob.STATUS_ERROR
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._in_flight -= 1
+            if cleanup:
+                cleanup()
+
+        if job.status == TranscriptionJob.STATUS_DONE:
+            store_transcript(job.transcript, speaker=job.speaker, room_code=job.room_code)
+        self._publish(job)
+
+    def _progress(self, job: TranscriptionJob, progress: dict):
+        job.progress = {"done": progress["done"], "total": progress["total"]}
+        job.transcript = progress["text"]
+        notify_room(job.room_code, {"type": "transcription_progress", "job": job.as_dict()})
+
+    def _publish(self, job: TranscriptionJob):
+        notify_room(job.room_code, {"type": "transcription_result", "job": job.as_dict()})
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def notify_room(room_code: str | None, event: dict):
+    """Send ``event`` to the room's WebSocket group from a worker thread."""
+    if not room_code:
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    GROUP_SENDS.labels(event["type"]).inc()
+    try:
+        async_to_sync(channel_layer.group_send)(f"room_{room_code}", event)
+    except Exception:
+        logger.exception("Could not notify room %s", room_code)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> TranscriptionJobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = TranscriptionJobManager(
+                max_workers=getattr(settings, "TRANSCRIPTION_WORKERS", 4),
+                max_pending=getattr(settings, "TRANSCRIPTION_MAX_PENDING", 32),
+                ttl=getattr(settings, "TRANSCRIPTION_JOB_TTL", 900),
+            )
+        return _manager
@@ -0,0 +1,237 @@
+"""
+Bounded audio uploads that stream straight to the transcriber.
+
+Uploaded audio is written into a SpooledTemporaryFile, which stays in memory
+up to settings.TRANSCRIPTION_UPLOAD_SPILL_BYTES and only then rolls over to
+disk. The resulting file object is handed to the transcription backend as is,
+so small recordings never touch local disk.
+
+Size and duration limits are checked while the body is still arriving, so an
+oversized upload is rejected with 413 before it is fully buffered. Duration is
+known up front when the client sends an X-Audio-Duration header, and is
+tracked chunk by chunk for PCM WAV uploads (read from the RIFF header).
+
+An ``audio_url`` is only accepted as an absolute http(s) URL (clean_audio_url),
+so request strings never reach the transcriber as local paths or file:// URLs.
+"""
+import hashlib
+import io
+import struct
+from tempfile import SpooledTemporaryFile
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles
+
+AUDIO_FIELD = "audio"
+
+# Slack for multipart boundaries and the small form fields sent with the file.
+MULTIPART_OVERHEAD = 64 * 1024
+WAV_HEADER_SIZE = 44
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Audio upload is too large."
+    default_code = "upload_too_large"
+
+
+class AudioLimits:
+    """
+    Maximum upload size in bytes and maximum duration in seconds.
+    A limit of None or 0 disables that check.
+    """
+
+    def __init__(self, max_bytes: int | None = None, max_duration: float | None = None):
+        self.max_bytes = max_bytes or None
+        self.max_duration = max_duration or None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_bytes=getattr(settings, "TRANSCRIPTION_MAX_UPLOAD_BYTES", None),
+            max_duration=getattr(settings, "TRANSCRIPTION_MAX_DURATION_SECONDS", None),
+        )
+
+    def check_size(self, size: int | None, slack: int = 0):
+        if self.max_bytes and size and size > self.max_bytes + slack:
+            raise UploadTooLarge(f"Audio upload exceeds {self.max_bytes} bytes")
+
+    def check_duration(self, seconds: float | None):
+        if self.max_duration and seconds and seconds > self.max_duration:
+            raise UploadTooLarge(f"Audio is longer than {self.max_duration:g} seconds")
+
+    def check_headers(self, META):
+        """Reject early from Content-Length and a client-declared X-Audio-Duration."""
+        try:
+            declared = float(META.get("HTTP_X_AUDIO_DURATION") or 0)
+        except ValueError:
+            declared = 0
+        self.check_duration(declared)
+
+
+def clean_audio_url(value) -> str:
+    """
+    ``value`` as a normalized http(s) URL (lower-case scheme and host, no
+    default port, no fragment); ParseError (400) for anything else.
+    """
+    try:
+        parts = urlsplit(str(value).strip())
+        port = parts.port
+    except ValueError:
+        raise ParseError("audio_url must be an http or https URL")
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        raise ParseError("audio_url must be an http or https URL")
+    host = parts.hostname
+    if ":" in host:
+        host = f"[{host}]"
+    if port and port != {"http": 80, "https": 443}[scheme]:
+        host = f"{host}:{port}"
+    if parts.username or parts.password:
+        raise ParseError("audio_url must not carry credentials")
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def wav_byte_rate(header: bytes) -> int | None:
+    """Return the byte rate from a RIFF/WAVE header, or None if it is not WAV."""
+    if len(header) < 32 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    (byte_rate,) = struct.unpack_from("<I", header, 28)
+    return byte_rate or None
+
+
+class AudioSpool:
+    """
+    Accumulates audio chunks in a SpooledTemporaryFile, enforcing the limits
+    on every write and hashing the bytes for the transcript cache.
+    """
+
+    def __init__(self, limits: AudioLimits | None = None, spill_bytes: int | None = None):
+        self.limits = limits or AudioLimits.from_settings()
+        if spill_bytes is None:
+            spill_bytes = getattr(settings, "TRANSCRIPTION_UPLOAD_SPILL_BYTES", 2 * 1024 * 1024)
+        self.file = SpooledTemporaryFile(max_size=spill_bytes)
+        self.size = 0
+        self.hash = hashlib.sha256()
+        self._header = b""
+        self._byte_rate = None
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self.limits.check_size(self.size)
+
+        if len(self._header) < WAV_HEADER_SIZE:
+            self._header += chunk[: WAV_HEADER_SIZE - len(self._header)]
+            self._byte_rate = wav_byte_rate(self._header)
+        if self._byte_rate:
+            self.limits.check_duration((self.size - WAV_HEADER_SIZE) / self._byte_rate)
+
+        self.hash.update(chunk)
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class SpooledAudioFile(UploadedFile):
+    """An UploadedFile backed by an AudioSpool."""
+
+    def __init__(self, spool: AudioSpool, name, content_type, charset=None, content_type_extra=None):
+        spool.file.seek(0)
+        super().__init__(spool.file, name, content_type, spool.size, charset, content_type_extra)
+        self.sha256 = spool.hash.hexdigest()
+
+    def detach(self):
+        """
+        Take ownership of the underlying file, rewound to the start, so that
+        Django closing the request's uploads does not close it.
+        """
+        file = self.file
+        self.file = io.BytesIO()
+        file.seek(0)
+        return file
+
+
+class AudioUploadHandler(FileUploadHandler):
+    """
+    Upload handler for the 'audio' multipart field. Other file fields are dropped.
+    """
+
+    def __init__(self, request=None, limits: AudioLimits | None = None, spill_bytes: int | None = None):
+        super().__init__(request)
+        self.limits = limits or AudioLimits.from_settings()
+        self.spill_bytes = spill_bytes
+        self.spool = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.limits.check_size(content_length, slack=MULTIPART_OVERHEAD)
+        self.limits.check_headers(META)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.spool = AudioSpool(self.limits, self.spill_bytes) if field_name == AUDIO_FIELD else None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.spool is not None:
+            self.spool.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.spool is None:
+            return None
+        return SpooledAudioFile(
+            self.spool,
+            self.file_name,
+            self.content_type,
+            self.charset,
+            self.content_type_extra,
+        )
+
+
+class RawAudioParser(BaseParser):
+    """
+    Accept a raw audio request body (e.g. Content-Type: audio/webm) as the
+    'audio' upload. Other fields such as speaker and room_code are read from
+    the query string.
+    """
+
+    media_type = "audio/*"
+    chunk_size = FileUploadHandler.chunk_size
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        limits = AudioLimits.from_settings()
+        limits.check_size(int(request.META.get("CONTENT_LENGTH") or 0))
+        limits.check_headers(request.META)
+
+        if stream is None:
+            raise ParseError("Empty audio body")
+
+        spool = AudioSpool(limits)
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+
+        upload = SpooledAudioFile(spool, "audio", media_type)
+        return DataAndFiles(request.query_params.dict(), {AUDIO_FIELD: upload})
+
+
+class AudioUploadMixin:
+    """
+    APIView mixin installing AudioUploadHandler before DRF parses the body.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        request._request.upload_handlers = [AudioUploadHandler(request._request)]
+        super().initial(request, *args, **kwargs)
+
+    def get_parsers(self):
+        return super().get_parsers() + [RawAudioParser()]
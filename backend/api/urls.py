@@ -1,25 +1,70 @@
+from django.conf import settings
 from django.urls import path
 
+from .async_views import (
+    AsyncRoomCreateView,
+    AsyncRoomDetailView,
+    AsyncRoomJoinView,
+    AsyncRoomTurnsView,
+    AsyncTextTranscriptView,
+)
 from .views import (
+    LeaderboardView,
+    MetricsView,
+    PlayerRatingView,
+    ProfilingView,
     ProtectedView,
     RoomCreateView,
+    RoomCloseView,
     RoomDetailView,
+    RoomEventsView,
     RoomJoinView,
+    RoomReplayView,
     RoomTurnsView,
     AssemblyTranscribeView,
     TextTranscriptView,
+    TranscriptionCacheStatsView,
+    TranscriptionClientStatsView,
+    TranscriptionJobCreateView,
+    TranscriptionJobDetailView,
 )
 
-urlpatterns = [
-    path("protected/", ProtectedView.as_view(), name="protected"),
-    path("rooms/", RoomCreateView.as_view(), name="create_room"),
-    path("rooms/<str:room_code>/", RoomDetailView.as_view(), name="room_detail"),
-    path("rooms/<str:room_code>/join/", RoomJoinView.as_view(), name="join_room"),
-    path("rooms/<str:room_code>/turns/", RoomTurnsView.as_view(), name="room_turns"),
-    path("turns/", RoomTurnsView.as_view(), name="room_turns_query"),
-    # Compatibility aliases for existing frontend calls
-    path("save_turn/", RoomTurnsView.as_view(), name="save_turn"),
-    path("get_room_turns/", RoomTurnsView.as_view(), name="get_room_turns"),
-    path("transcribe/", AssemblyTranscribeView.as_view(), name="assembly_transcribe"),
-    path("transcribe_text/", TextTranscriptView.as_view(), name="transcribe_text"),
-]
+
+def build_urlpatterns(use_async: bool) -> list:
+    """API routes, with the hot room/turn/transcript endpoints sync or async."""
+    if use_async:
+        create, detail, join, turns, text = (
+            AsyncRoomCreateView, AsyncRoomDetailView, AsyncRoomJoinView, AsyncRoomTurnsView,
+            AsyncTextTranscriptView,
+        )
+    else:
+        create, detail, join, turns, text = (
+            RoomCreateView, RoomDetailView, RoomJoinView, RoomTurnsView, TextTranscriptView,
+        )
+    return [
+        path("metrics/", MetricsView.as_view(), name="metrics"),
+        path("profiling/", ProfilingView.as_view(), name="profiling"),
+        path("protected/", ProtectedView.as_view(), name="protected"),
+        path("rooms/", create.as_view(), name="create_room"),
+        path("rooms/<str:room_code>/", detail.as_view(), name="room_detail"),
+        path("rooms/<str:room_code>/join/", join.as_view(), name="join_room"),
+        path("rooms/<str:room_code>/close/", RoomCloseView.as_view(), name="close_room"),
+        path("rooms/<str:room_code>/turns/", turns.as_view(), name="room_turns"),
+        path("rooms/<str:room_code>/events/", RoomEventsView.as_view(), name="room_events"),
+        path("rooms/<str:room_code>/replay/", RoomReplayView.as_view(), name="room_replay"),
+        path("turns/", turns.as_view(), name="room_turns_query"),
+        # Compatibility aliases for existing frontend calls
+        path("save_turn/", turns.as_view(), name="save_turn"),
+        path("get_room_turns/", turns.as_view(), name="get_room_turns"),
+        path("leaderboard/", LeaderboardView.as_view(), name="leaderboard"),
+        path("leaderboard/<str:email>/", PlayerRatingView.as_view(), name="player_rating"),
+        path("transcribe/", AssemblyTranscribeView.as_view(), name="assembly_transcribe"),
+        path("transcribe/cache/", TranscriptionCacheStatsView.as_view(), name="transcription_cache"),
+        path("transcribe/client/", TranscriptionClientStatsView.as_view(), name="transcription_client"),
+        path("transcribe/jobs/", TranscriptionJobCreateView.as_view(), name="transcription_jobs"),
+        path("transcribe/jobs/<str:job_id>/", TranscriptionJobDetailView.as_view(), name="transcription_job"),
+        path("transcribe_text/", text.as_view(), name="transcribe_text"),
+    ]
+
+
+urlpatterns = build_urlpatterns(getattr(settings, "ASYNC_VIEWS", False))
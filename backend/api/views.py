@@ -1,26 +1,39 @@
+import hmac
 import json
-import os
 import random
 import string
-import tempfile
 
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .clock import turn_refusal
+from .eventlog import read_events
 from .kinde_auth import verify_kinde_jwt
-from .models import DebateRoom, DebateTurn, UserProfile
+from .lifecycle import is_active, room_scores, room_turns, touch
+from .metrics import CONTENT_TYPE, collect_all, render
+from .models import DebateReplay, DebateRoom, DebateTurn, PlayerRating, UserProfile
 from .serializers import DebateTurnSerializer
 from .neon_store import store_transcript
-
-try:
-    import assemblyai as aai  # type: ignore
-except Exception:
-    aai = None
+from . import profiling
+from .admission import AdmissionThrottle, LiveAdmissionThrottle
+from .querybudget import query_budget
+from .ratelimit import TranscribeThrottle, TurnThrottle
+from .ratings import get_leaderboard, top_page
+from .replay import decode_replay
+from .scoring import close_room
+from .transcription import TranscriptionUnavailable, get_transcriber
+from .transcription_cache import get_transcript_cache, transcribe_cached, transcription_key
+from .transcription_client import TranscriptionBusy
+from .transcription_jobs import JobQueueFull, get_job_manager, notify_room
+from .uploads import AudioUploadMixin, clean_audio_url
 
 def generate_room_code(length: int = 6) -> str:
     """Return a unique room code."""
@@ -35,6 +48,7 @@ class ProtectedView(APIView):
     Verify a Kinde token, ensure a Django User/UserProfile exist, and return user info.
     """
 
+    @query_budget(6)
     def get(self, request):
         payload = verify_kinde_jwt(request)
         kinde_id = payload.get("sub")
@@ -43,14 +57,18 @@ class ProtectedView(APIView):
         if not kinde_id:
             raise AuthenticationFailed("Invalid Kinde token")
 
-        user_obj, created_user = User.objects.get_or_create(
-            username=kinde_id, defaults={"email": email}
-        )
+        # Returning users: one query instead of two get_or_create round trips.
+        profile = UserProfile.objects.filter(kinde_id=kinde_id).first()
+        created_user = created_profile = False
+        if profile is None:
+            user_obj, created_user = User.objects.get_or_create(
+                username=kinde_id, defaults={"email": email}
+            )
 
-        profile, created_profile = UserProfile.objects.get_or_create(
-            kinde_id=kinde_id,
-            defaults={"user": user_obj, "email": email},
-        )
+            profile, created_profile = UserProfile.objects.get_or_create(
+                kinde_id=kinde_id,
+                defaults={"user": user_obj, "email": email},
+            )
 
         return Response(
             {
@@ -68,6 +86,9 @@ class RoomCreateView(APIView):
     Create a room with the requester as the attacker.
     """
 
+    throttle_classes = [AdmissionThrottle]
+
+    @query_budget(3)
     def post(self, request):
         email = request.data.get("email")
         if not email:
@@ -96,6 +117,9 @@ class RoomJoinView(APIView):
     Join an existing room. Fills defender slot if empty, otherwise ensures the user is part of the room.
     """
 
+    throttle_classes = [AdmissionThrottle]
+
+    @query_budget(2)
     def post(self, request, room_code: str):
         email = request.data.get("email")
         if not email:
@@ -110,10 +134,14 @@ class RoomJoinView(APIView):
             you_are = "ATTACKER"
         elif email == room.defender_email:
             you_are = "DEFENDER"
+        elif not is_active(room):
+            return Response({"detail": "Room is closed"}, status=status.HTTP_409_CONFLICT)
         else:
             if not room.defender_email:
                 room.defender_email = email
-                room.save(update_fields=["defender_email"])
+                room.state = DebateRoom.STATE_LIVE
+                room.last_activity_at = timezone.now()
+                room.save(update_fields=["defender_email", "state", "last_activity_at"])
                 you_are = "DEFENDER"
             else:
                 return Response({"detail": "Room already full"}, status=status.HTTP_400_BAD_REQUEST)
@@ -134,6 +162,7 @@ class RoomDetailView(APIView):
     Return room details (and optional turns).
     """
 
+    @query_budget(2)
     def get(self, request, room_code: str):
         include_turns = request.query_params.get("include_turns") == "true"
         try:
@@ -147,21 +176,66 @@ class RoomDetailView(APIView):
             "defenderEmail": room.defender_email or None,
             "winnerEmail": room.winner_email,
             "createdAt": room.created_at,
+            "closedAt": room.closed_at,
+            "state": room.state,
         }
 
         if include_turns:
-            turns = DebateTurn.objects.filter(room=room).order_by("turn_number")
-            data["turns"] = DebateTurnSerializer(turns, many=True).data
+            data["turns"] = room_turns(room)
 
         return Response(data)
 
 
+class RoomEventsView(APIView):
+    """
+    GET: the room's event log, oldest first, ?after=<seq>&limit=<n> (max 1000).
+    Pass the returned ``next`` as ``after`` to get the following page.
+    """
+
+    @query_budget(2)
+    def get(self, request, room_code: str):
+        try:
+            after = int(request.query_params.get("after", 0))
+            limit = min(max(int(request.query_params.get("limit", 200)), 1), 1000)
+        except ValueError:
+            return Response({"error": "after and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not DebateRoom.objects.filter(room_code=room_code).exists():
+            return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        events = read_events(room_code, after, limit)
+        return Response({"events": events, "next": events[-1]["seq"] if len(events) == limit else None})
+
+
+class RoomReplayView(APIView):
+    """
+    GET: the precomputed replay of a finished debate (see api.replay), sent
+    as stored. 404 until it has been built, 409 while the debate is running.
+    """
+
+    @query_budget(2)
+    def get(self, request, room_code: str):
+        payload = DebateReplay.objects.filter(room_id=room_code).values_list("payload", flat=True).first()
+        if payload is not None:
+            return HttpResponse(decode_replay(payload), content_type="application/json")
+
+        room_state = DebateRoom.objects.filter(room_code=room_code).values_list("state", flat=True).first()
+        if room_state is None:
+            return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
+        if room_state in (DebateRoom.STATE_WAITING, DebateRoom.STATE_LIVE):
+            return Response({"error": "Debate is still in progress"}, status=status.HTTP_409_CONFLICT)
+        return Response({"error": "Replay is not ready yet"}, status=status.HTTP_404_NOT_FOUND)
+
+
 class RoomTurnsView(APIView):
     """
     GET: return ordered turns for a room.
     POST: create a new turn. Accepts either URL param room_code or room_code in body.
     """
 
+    throttle_classes = [LiveAdmissionThrottle, TurnThrottle]
+
+    @query_budget(2)
     def get(self, request, room_code: str | None = None):
         code = room_code or request.query_params.get("room_code")
         if not code:
@@ -172,10 +246,9 @@ class RoomTurnsView(APIView):
         except DebateRoom.DoesNotExist:
             return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        turns = DebateTurn.objects.filter(room=room).order_by("turn_number")
-        serialized = DebateTurnSerializer(turns, many=True)
-        return Response({"turns": serialized.data})
+        return Response({"turns": room_turns(room)})
 
+    @query_budget(8)
     def post(self, request, room_code: str | None = None):
         payload = verify_kinde_jwt(request)
         kinde_id = payload.get("sub")
@@ -188,6 +261,7 @@ class RoomTurnsView(APIView):
         speaker_user_id = request.data.get("speaker_user_id")
         text = request.data.get("text")
         speaker_role = (request.data.get("speaker_role") or "").upper()
+        duration = request.data.get("duration_seconds")
 
         if not code or not speaker_user_id or not text:
             return Response(
@@ -200,6 +274,9 @@ class RoomTurnsView(APIView):
         except DebateRoom.DoesNotExist:
             return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
 
+        if not is_active(room):
+            return Response({"error": "Room is closed"}, status=status.HTTP_409_CONFLICT)
+
         try:
             speaker = UserProfile.objects.get(id=speaker_user_id)
         except UserProfile.DoesNotExist:
@@ -208,6 +285,16 @@ class RoomTurnsView(APIView):
         if speaker.kinde_id != kinde_id:
             return Response({"error": "Token does not match speaker"}, status=status.HTTP_403_FORBIDDEN)
 
+        if duration not in (None, ""):
+            try:
+                duration = float(duration)
+            except (TypeError, ValueError):
+                return Response({"error": "duration_seconds must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+            if duration <= 0:
+                duration = None
+        else:
+            duration = None
+
         last_turn = DebateTurn.objects.filter(room=room).order_by("-turn_number").first()
         next_turn_number = (last_turn.turn_number + 1) if last_turn else 1
 
@@ -220,13 +307,24 @@ class RoomTurnsView(APIView):
             else:
                 speaker_role = DebateTurn.SPEAKER_ATTACKER
 
+        # The debate clock checks the seat the speaker holds, not the role claimed.
+        seat_role = {
+            room.attacker_email: DebateTurn.SPEAKER_ATTACKER,
+            room.defender_email: DebateTurn.SPEAKER_DEFENDER,
+        }.get(speaker.email, speaker_role)
+        refusal = turn_refusal(room.room_code, seat_role, duration)
+        if refusal:
+            return Response({"error": refusal}, status=status.HTTP_409_CONFLICT)
+
         turn = DebateTurn.objects.create(
             room=room,
             speaker=speaker,
             speaker_role=speaker_role,
             text=text,
             turn_number=next_turn_number,
+            duration_seconds=duration,
         )
+        touch([room.room_code])
 
         serialized = DebateTurnSerializer(turn)
         return Response(
@@ -235,29 +333,103 @@ class RoomTurnsView(APIView):
         )
 
 
-class AssemblyTranscribeView(APIView):
+class RoomCloseView(APIView):
     """
-    Transcribe audio via AssemblyAI. Expects either:
-      - multipart upload 'audio' (file)
-      - OR JSON field 'audio_url' pointing to a publicly reachable audio file
+    Close a debate: rescore its turns and decide the winner. Only the two
+    participants may close a room; closing twice returns the same result.
     """
 
-    def post(self, request):
-        if aai is None:
-            return Response(
-                {"error": "assemblyai package not installed"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+    # Worst case: the first rated game of both players, every turn rescored and
+    # the replay built in-request (REPLAY_ASYNC=False).
+    @query_budget(28)
+    def post(self, request, room_code: str):
+        payload = verify_kinde_jwt(request)
+        email = payload.get("email", "")
 
-        api_key = os.getenv("ASSEMBLYAI_API_KEY")
-        if not api_key:
-            return Response(
-                {"error": "ASSEMBLYAI_API_KEY not set on server"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        try:
+            room = DebateRoom.objects.get(room_code=room_code)
+        except DebateRoom.DoesNotExist:
+            return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not email or email not in (room.attacker_email, room.defender_email):
+            return Response({"error": "Only participants can close the room"}, status=status.HTTP_403_FORBIDDEN)
+
+        room = close_room(room)
+        result = {
+            "roomCode": room.room_code,
+            "winnerEmail": room.winner_email,
+            "closedAt": room.closed_at.isoformat(),
+            "scores": room_scores(room),
+        }
+        notify_room(room.room_code, {"type": "debate_result", "result": result})
+        return Response(result)
 
-        aai.settings.api_key = api_key
 
+class LeaderboardView(APIView):
+    """
+    GET: one page of the leaderboard (?page=1&page_size=50), best first.
+    """
+
+    # Cold: leaderboard version, the full rating load and the page's rows.
+    @query_budget(3)
+    def get(self, request):
+        try:
+            page = int(request.query_params.get("page", 1))
+            page_size = int(request.query_params.get("page_size", 50))
+        except ValueError:
+            return Response({"error": "page and page_size must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(top_page(page, page_size))
+
+
+class PlayerRatingView(APIView):
+    """
+    GET: rating, record and rank for one player.
+    """
+
+    # Cold: the player's row, then the leaderboard version and the full rating load for the rank.
+    @query_budget(3)
+    def get(self, request, email: str):
+        try:
+            player = PlayerRating.objects.get(email=email)
+        except PlayerRating.DoesNotExist:
+            return Response({"error": "Player has no rating"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                "email": player.email,
+                "rating": round(player.rating, 1),
+                "rank": get_leaderboard().rank_of_rating(player.rating),
+                "games": player.games,
+                "wins": player.wins,
+                "losses": player.losses,
+                "draws": player.draws,
+            }
+        )
+
+
+def busy_response(exc):
+    return Response(
+        {"error": str(exc)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
+
+class AssemblyTranscribeView(AudioUploadMixin, APIView):
+    """
+    Transcribe audio with the configured backend and wait for the result. Expects either:
+      - multipart upload 'audio' (file)
+      - OR a raw audio/* request body
+      - OR JSON field 'audio_url': an http(s) URL of a publicly reachable audio file
+    Uploads are streamed to the backend without temp-file staging and trimmed
+    of silence first (see api.audio); audio that was already transcribed is
+    answered from the transcript cache. With mode=segmented long uploads are
+    transcribed in parallel segments and progress is pushed to room_code's group.
+    """
+
+    throttle_classes = [AdmissionThrottle, TranscribeThrottle]
+
+    def post(self, request):
         audio_url = request.data.get("audio_url")
         file_obj = request.FILES.get("audio")
 
@@ -266,47 +438,184 @@ class AssemblyTranscribeView(APIView):
                 {"error": "Provide either audio_url or upload an audio file as 'audio'"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if audio_url:
+            audio_url = clean_audio_url(audio_url)
 
-        # Prepare input for transcriber
-        transcriber = aai.Transcriber(
-            config=aai.TranscriptionConfig(speech_models=["universal"])
-        )
+        transcriber = get_transcriber()
+        segmented = request.data.get("mode") == "segmented"
+        room_code = request.data.get("room_code")
+
+        # The upload was hashed while it streamed in; keying on it avoids reading it twice.
+        key = transcription_key(audio_url or file_obj, transcriber, segmented)
+
+        def on_progress(progress):
+            notify_room(room_code, {"type": "transcription_progress", "job": {"status": "running", **progress}})
 
         try:
-            if audio_url:
-                transcript = transcriber.transcribe(audio_url)
-            else:
-                # Write uploaded file to a temp path for the SDK (Windows-friendly)
-                tmp_path = None
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp:
-                        tmp_path = tmp.name
-                        for chunk in file_obj.chunks():
-                            tmp.write(chunk)
-                        tmp.flush()
-                    transcript = transcriber.transcribe(tmp_path)
-                finally:
-                    if tmp_path:
-                        try:
-                            os.remove(tmp_path)
-                        except OSError:
-                            pass
+            result, cached = transcribe_cached(
+                audio_url or file_obj.file, transcriber, key=key, segmented=segmented, on_progress=on_progress
+            )
+        except TranscriptionUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except TranscriptionBusy as exc:
+            return busy_response(exc)
         except Exception as exc:
             return Response(
                 {"error": "Transcription failed", "detail": str(exc)},
                 status=status.HTTP_502_BAD_GATEWAY,
             )
 
-        if transcript.status == "error":
+        text_out = result.text
+        # Cached or not, this request is a new turn's transcript.
+        store_transcript(text_out, speaker=request.data.get("speaker"), room_code=room_code)
+
+        return Response(
+            {"transcript": text_out, "cached": cached, "preprocessing": result.preprocessing}
+        )
+
+
+class TranscriptionJobCreateView(AudioUploadMixin, APIView):
+    """
+    Queue a transcription and return a job id immediately. Accepts the same
+    inputs as AssemblyTranscribeView (including mode=segmented) plus optional
+    'speaker' and 'room_code'.
+    The result is pushed to the room's WebSocket group and can be polled at
+    TranscriptionJobDetailView.
+    """
+
+    throttle_classes = [AdmissionThrottle, TranscribeThrottle]
+
+    def post(self, request):
+        audio_url = request.data.get("audio_url")
+        file_obj = request.FILES.get("audio")
+
+        if not audio_url and not file_obj:
             return Response(
-                {"error": "Transcription failed", "detail": transcript.error},
-                status=status.HTTP_502_BAD_GATEWAY,
+                {"error": "Provide either audio_url or upload an audio file as 'audio'"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        if audio_url:
+            audio_url = clean_audio_url(audio_url)
+
+        transcriber = get_transcriber()
+        if transcriber.breaker.is_open:
+            return busy_response(TranscriptionBusy("Transcription provider circuit is open"))
+
+        segmented = request.data.get("mode") == "segmented"
+        # Only hashes: the upload was hashed while it streamed in, URLs are keyed as strings.
+        key = transcription_key(audio_url or file_obj, transcriber, segmented)
+        # Uploads are closed when this request ends, so the worker takes ownership.
+        audio = audio_url or file_obj.detach()
+        cleanup = None if audio_url else audio.close
+        try:
+            job = get_job_manager().submit(
+                audio,
+                room_code=request.data.get("room_code") or None,
+                speaker=request.data.get("speaker"),
+                cleanup=cleanup,
+                cache_key=key,
+                segmented=segmented,
+            )
+        except JobQueueFull as exc:
+            if cleanup:
+                cleanup()
+            return Response(
+                {"error": str(exc)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+
+        status_code = status.HTTP_200_OK if job.finished else status.HTTP_202_ACCEPTED
+        return Response(job.as_dict(), status=status_code)
+
+
+class TranscriptionJobDetailView(APIView):
+    """
+    Poll a transcription job submitted to this worker.
+    """
+
+    def get(self, request, job_id: str):
+        job = get_job_manager().get(job_id)
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job.as_dict())
+
+
+class TranscriptionCacheStatsView(APIView):
+    """
+    Hit/miss counters for the transcript cache in this worker (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_transcript_cache().snapshot())
+
+
+class TranscriptionClientStatsView(APIView):
+    """
+    Outbound call, concurrency and circuit breaker metrics for this worker (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_transcriber().snapshot())
+
+
+class IsAdminOrMetricsToken(BasePermission):
+    """Admin users, or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``."""
 
-        text_out = transcript.text or ""
-        store_transcript(text_out, speaker=request.data.get("speaker"), room_code=request.data.get("room_code"))
+    def has_permission(self, request, view):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        header = request.headers.get("Authorization", "")
+        if token and hmac.compare_digest(header, f"Bearer {token}"):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    GET: Prometheus text-format metrics, merged across workers when
+    METRICS_MULTIPROC_DIR is set.
+    """
+
+    permission_classes = [IsAdminOrMetricsToken]
+
+    def get(self, request):
+        return HttpResponse(render(collect_all()), content_type=CONTENT_TYPE)
+
+
+class ProfilingView(APIView):
+    """
+    GET: current profiler state. POST: {"enabled", "sampleRate", "paths"} to
+    switch it at runtime. DELETE: back to settings. The switch reaches every
+    worker only when PROFILING_CACHE is shared; with the default LocMem cache
+    it applies to the serving process alone (``"shared": false``).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(profiling.get_state().as_dict())
+
+    def post(self, request):
+        enabled = request.data.get("enabled")
+        if not isinstance(enabled, bool):
+            return Response({"error": "enabled must be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+        sample_rate = request.data.get("sampleRate")
+        paths = request.data.get("paths")
+        try:
+            sample_rate = None if sample_rate is None else float(sample_rate)
+        except (TypeError, ValueError):
+            return Response({"error": "sampleRate must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if paths is not None and (not isinstance(paths, list) or not all(isinstance(p, str) for p in paths)):
+            return Response({"error": "paths must be a list of path prefixes"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(profiling.set_state(enabled, sample_rate, paths).as_dict())
 
-        return Response({"transcript": text_out})
+    def delete(self, request):
+        profiling.reset_state()
+        return Response(profiling.get_state().as_dict())
 
 
 class TextTranscriptView(APIView):
@@ -377,10 +686,14 @@ def join_room(request, room_code):
         you_are = "ATTACKER"
     elif email == room.defender_email:
         you_are = "DEFENDER"
+    elif not is_active(room):
+        return JsonResponse({"detail": "Room is closed"}, status=409)
     else:
         if not room.defender_email:
             room.defender_email = email
-            room.save(update_fields=["defender_email"])
+            room.state = DebateRoom.STATE_LIVE
+            room.last_activity_at = timezone.now()
+            room.save(update_fields=["defender_email", "state", "last_activity_at"])
             you_are = "DEFENDER"
         else:
             return JsonResponse({"detail": "Room already full"}, status=400)
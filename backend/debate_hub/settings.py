@@ -25,6 +25,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.MetricsMiddleware",
+    "api.middleware.AdmissionMiddleware",
+    "api.middleware.QueryBudgetMiddleware",
+    "api.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -72,12 +76,181 @@ REST_FRAMEWORK = {
 }
 
 # Channels configuration
-# Channels configuration (in-memory for local dev; swap to Redis in prod)
+# BatchingChannelLayer (api/channel_layer.py) coalesces a tick's sends. Set
+# CHANNEL_LAYER_SERVER=host:port (manage.py run_channel_server) to share
+# groups between processes; CHANNEL_LAYER_BACKEND swaps the backend.
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": os.getenv("CHANNEL_LAYER_BACKEND", "api.channel_layer.BatchingChannelLayer"),
+        "CONFIG": {
+            "capacity": int(os.getenv("CHANNEL_LAYER_CAPACITY", "100")),
+            "expiry": int(os.getenv("CHANNEL_LAYER_EXPIRY", "60")),
+        },
     },
 }
+if os.getenv("CHANNEL_LAYER_SERVER"):
+    CHANNEL_LAYERS["default"]["CONFIG"]["server"] = os.getenv("CHANNEL_LAYER_SERVER")
+
+# Transcription
+# Backend is "assemblyai", "fake" (offline, for tests) or a dotted path.
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "assemblyai")
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+TRANSCRIPTION_MAX_PENDING = int(os.getenv("TRANSCRIPTION_MAX_PENDING", "32"))
+TRANSCRIPTION_JOB_TTL = int(os.getenv("TRANSCRIPTION_JOB_TTL", "900"))
+# Outbound provider calls: concurrency cap, bounded wait queue and circuit breaker.
+TRANSCRIPTION_MAX_CONCURRENCY = int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "8"))
+TRANSCRIPTION_MAX_WAITING = int(os.getenv("TRANSCRIPTION_MAX_WAITING", "16"))
+TRANSCRIPTION_WAIT_TIMEOUT = float(os.getenv("TRANSCRIPTION_WAIT_TIMEOUT", "10"))
+TRANSCRIPTION_BREAKER_WINDOW = float(os.getenv("TRANSCRIPTION_BREAKER_WINDOW", "60"))
+TRANSCRIPTION_BREAKER_MIN_CALLS = int(os.getenv("TRANSCRIPTION_BREAKER_MIN_CALLS", "10"))
+TRANSCRIPTION_BREAKER_ERROR_RATE = float(os.getenv("TRANSCRIPTION_BREAKER_ERROR_RATE", "0.5"))
+TRANSCRIPTION_BREAKER_SLOW_SECONDS = float(os.getenv("TRANSCRIPTION_BREAKER_SLOW_SECONDS", "45"))
+TRANSCRIPTION_BREAKER_SLOW_RATE = float(os.getenv("TRANSCRIPTION_BREAKER_SLOW_RATE", "0.5"))
+TRANSCRIPTION_BREAKER_OPEN_SECONDS = float(os.getenv("TRANSCRIPTION_BREAKER_OPEN_SECONDS", "30"))
+# Uploads stay in memory up to the spill threshold, then roll over to a temp file.
+TRANSCRIPTION_UPLOAD_SPILL_BYTES = int(os.getenv("TRANSCRIPTION_UPLOAD_SPILL_BYTES", str(2 * 1024 * 1024)))
+TRANSCRIPTION_MAX_UPLOAD_BYTES = int(os.getenv("TRANSCRIPTION_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+TRANSCRIPTION_MAX_DURATION_SECONDS = float(os.getenv("TRANSCRIPTION_MAX_DURATION_SECONDS", "180"))
+# Decode, downsample to 16 kHz mono and trim silence before transcribing (needs numpy).
+TRANSCRIPTION_PREPROCESS = os.getenv("TRANSCRIPTION_PREPROCESS", "True") == "True"
+TRANSCRIPTION_VAD_THRESHOLD_DB = float(os.getenv("TRANSCRIPTION_VAD_THRESHOLD_DB", "-45"))
+TRANSCRIPTION_VAD_MAX_GAP = float(os.getenv("TRANSCRIPTION_VAD_MAX_GAP", "0.6"))
+TRANSCRIPTION_VAD_KEEP_GAP = float(os.getenv("TRANSCRIPTION_VAD_KEEP_GAP", "0.25"))
+# mode=segmented: split at silences, transcribe segments in parallel, stitch.
+TRANSCRIPTION_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "20"))
+TRANSCRIPTION_SEGMENT_OVERLAP = float(os.getenv("TRANSCRIPTION_SEGMENT_OVERLAP", "1.0"))
+TRANSCRIPTION_SEGMENT_WORKERS = int(os.getenv("TRANSCRIPTION_SEGMENT_WORKERS", "4"))
+# Finished transcripts keyed by audio hash; set TRANSCRIPTION_CACHE_DIR="" for memory only.
+TRANSCRIPTION_CACHE_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_ENTRIES", "512"))
+TRANSCRIPTION_CACHE_DISK_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_DISK_ENTRIES", "10000"))
+TRANSCRIPTION_CACHE_TTL = int(os.getenv("TRANSCRIPTION_CACHE_TTL", "86400"))
+TRANSCRIPTION_CACHE_DIR = os.getenv("TRANSCRIPTION_CACHE_DIR", str(BASE_DIR / ".cache" / "transcripts"))
+
+# Real-time transcription over ws/room/<code>/transcribe/
+STREAMING_TRANSCRIPTION_BACKEND = os.getenv("STREAMING_TRANSCRIPTION_BACKEND", "assemblyai")
+STREAMING_MAX_SESSIONS_PER_ROOM = int(os.getenv("STREAMING_MAX_SESSIONS_PER_ROOM", "2"))
+STREAMING_MAX_SESSIONS = int(os.getenv("STREAMING_MAX_SESSIONS", "200"))
+STREAMING_IDLE_SECONDS = float(os.getenv("STREAMING_IDLE_SECONDS", "20"))
+STREAMING_MAX_SESSION_SECONDS = float(os.getenv("STREAMING_MAX_SESSION_SECONDS", "900"))
+STREAMING_MAX_FRAME_BYTES = int(os.getenv("STREAMING_MAX_FRAME_BYTES", str(32 * 1024)))
+
+# Turn scoring runs on a small background pool after each turn commits.
+SCORING_ASYNC = os.getenv("SCORING_ASYNC", "True") == "True"
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "2"))
+
+# Serve the hot room/turn/transcript endpoints from api.async_views (native
+# async under ASGI) instead of the DRF views. Opt-in.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# Spectators (ws/room/<code>/watch/) get room events batched every tick.
+SPECTATOR_TICK_MS = int(os.getenv("SPECTATOR_TICK_MS", "250"))
+SPECTATOR_MAX_BATCH_EVENTS = int(os.getenv("SPECTATOR_MAX_BATCH_EVENTS", "200"))
+SPECTATOR_MAX_PER_ROOM = int(os.getenv("SPECTATOR_MAX_PER_ROOM", "5000"))
+
+# Server-side debate clock: alternating speaking windows per live room.
+DEBATE_TURN_SECONDS = float(os.getenv("DEBATE_TURN_SECONDS", "60"))
+DEBATE_TURN_GRACE_SECONDS = float(os.getenv("DEBATE_TURN_GRACE_SECONDS", "5"))
+DEBATE_MAX_TURNS = int(os.getenv("DEBATE_MAX_TURNS", "0"))  # 0 = until the room closes
+DEBATE_CLOCK_TICK_MS = int(os.getenv("DEBATE_CLOCK_TICK_MS", "100"))
+DEBATE_CLOCK_SLOTS = int(os.getenv("DEBATE_CLOCK_SLOTS", "512"))
+
+# Room event log (joins, leaves, chat, mutes, turns), written in batches.
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "True") == "True"
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "200"))
+EVENT_LOG_FLUSH_MS = int(os.getenv("EVENT_LOG_FLUSH_MS", "500"))
+EVENT_LOG_MAX_PENDING = int(os.getenv("EVENT_LOG_MAX_PENDING", "20000"))
+
+# Live transcripts over the room socket: deltas with a full snapshot every N updates.
+LIVE_TRANSCRIPT_SNAPSHOT_EVERY = int(os.getenv("LIVE_TRANSCRIPT_SNAPSHOT_EVERY", "20"))
+LIVE_TRANSCRIPT_MAX_CHARS = int(os.getenv("LIVE_TRANSCRIPT_MAX_CHARS", "20000"))
+
+# Admission control: shed new connects and expensive requests (503 /
+# close 1013 with a retry hint) while the process is saturated. A limit of 0
+# disables that signal; reconnects to live rooms get RECONNECT_HEADROOM times
+# the limits, spectators LOW_HEADROOM times.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True") == "True"
+ADMISSION_MAX_LOOP_LAG_MS = int(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "250"))
+ADMISSION_MAX_THREAD_QUEUE = int(os.getenv("ADMISSION_MAX_THREAD_QUEUE", "64"))
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "400"))
+ADMISSION_RECONNECT_HEADROOM = float(os.getenv("ADMISSION_RECONNECT_HEADROOM", "2.0"))
+ADMISSION_LOW_HEADROOM = float(os.getenv("ADMISSION_LOW_HEADROOM", "0.5"))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+ADMISSION_MAX_RETRY_AFTER = float(os.getenv("ADMISSION_MAX_RETRY_AFTER", "30"))
+
+# Room lifecycle (manage.py sweep_rooms): empty waiting rooms are deleted and
+# idle debates closed after their TTL; finished debates are archived.
+ROOM_WAITING_TTL = float(os.getenv("ROOM_WAITING_TTL", "1800"))
+ROOM_LIVE_TTL = float(os.getenv("ROOM_LIVE_TTL", "7200"))
+ROOM_ARCHIVE_AFTER = float(os.getenv("ROOM_ARCHIVE_AFTER", "86400"))
+ROOM_SWEEP_BATCH = int(os.getenv("ROOM_SWEEP_BATCH", "200"))
+ROOM_PARTICIPANT_SWEEP_SECONDS = float(os.getenv("ROOM_PARTICIPANT_SWEEP_SECONDS", "60"))
+
+# Debate replays (api.replay) are built in the background when a room closes,
+# REPLAY_DELAY_SECONDS later so the event log has flushed.
+REPLAY_ASYNC = os.getenv("REPLAY_ASYNC", "True") == "True"
+REPLAY_DELAY_SECONDS = float(os.getenv("REPLAY_DELAY_SECONDS", "2"))
+REPLAY_TOP_TURNS = int(os.getenv("REPLAY_TOP_TURNS", "3"))
+
+# Elo ratings, leaderboard page cache and rating-based matchmaking.
+RATING_INITIAL = float(os.getenv("RATING_INITIAL", "1200"))
+RATING_K_FACTOR = float(os.getenv("RATING_K_FACTOR", "32"))
+LEADERBOARD_CACHE_SECONDS = int(os.getenv("LEADERBOARD_CACHE_SECONDS", "60"))
+# How stale a worker's leaderboard may get after another worker rates a game.
+LEADERBOARD_VERSION_CHECK_SECONDS = float(os.getenv("LEADERBOARD_VERSION_CHECK_SECONDS", "2"))
+MATCH_RATING_WINDOW = float(os.getenv("MATCH_RATING_WINDOW", "150"))
+MATCH_RATING_WIDEN_PER_SECOND = float(os.getenv("MATCH_RATING_WIDEN_PER_SECOND", "20"))
+
+# Token-bucket rate limits, "<count>/<s|m|h>[:<burst>]" per policy (see
+# api.ratelimit). Override entries with RATE_LIMITS="ws.chat_message=2/s:5,...".
+# RATE_LIMIT_BACKEND=cache shares buckets between workers through RATE_LIMIT_CACHE.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True") == "True"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_CACHE = os.getenv("RATE_LIMIT_CACHE", "default")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMITS = {
+    "ws.message": "30/s:60",
+    "ws.chat_message": "5/s:10",
+    "ws.room.chat_message": "20/s:40",
+    "ws.transcript_update": "15/s:30",
+    "ws.toggle_audio": "5/s:10",
+    "ws.speaking_status": "20/s:40",
+    "ws.room.speaking_status": "60/s:120",
+    "ws.find_match": "1/s:5",
+    "http.transcribe": "10/m:5",
+    "http.turns": "60/m:20",
+    "http.room.turns": "120/m:30",
+}
+RATE_LIMITS.update(
+    item.split("=", 1) for item in os.getenv("RATE_LIMITS", "").split(",") if "=" in item
+)
+
+# Metrics at /api/metrics/ (admin users, or a bearer METRICS_TOKEN for scrapers).
+# With several workers, point METRICS_MULTIPROC_DIR at a directory they share.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", "60"))
+
+# Query auditing: slow-query log, N+1 detection and @query_budget enforcement.
+# QUERY_BUDGET_STRICT raises QueryBudgetExceeded instead of logging; the test
+# runner turns it on for the whole suite.
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "100"))
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "False") == "True"
+TEST_RUNNER = "api.testrunner.StrictQueryBudgetRunner"
+
+# Sampling profiler (collapsed stacks for flame graphs). Also switchable at
+# runtime from /api/profiling/; any request with "X-Profile: <PROFILING_TOKEN>" is profiled.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False") == "True"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_PATHS = [p for p in os.getenv("PROFILING_PATHS", "/api/rooms/,/ws/room/").split(",") if p]
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", str(BASE_DIR / ".cache" / "profiles"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+# Cache holding the runtime toggle. Only a shared backend switches every
+# worker; with the default LocMem cache the toggle is per-process.
+PROFILING_CACHE = os.getenv("PROFILING_CACHE", "default")
 
 # CORS settings (frontend dev ports)
 CORS_ALLOWED_ORIGINS = [
@@ -28,6 +28,11 @@ export default function Room() {
   const messageInputRef = useRef(null);
   const liveRecognizerRef = useRef(null);
   const currentEmailRef = useRef("You");
+  // Last transcript seq applied per speaker; a gap means a missed delta.
+  const transcriptSeqRef = useRef({});
+  const selfCommittedRef = useRef("");
+  // "ATTACKER" or "DEFENDER", as the debate clock names the sides.
+  const selfRoleRef = useRef(null);
 
   const API_BASE =
     import.meta.env.VITE_API_BASE_URL || "http://localhost:8000/api";
@@ -62,6 +67,8 @@ export default function Room() {
   const [participants, setParticipants] = useState([]);
   const [selfId, setSelfId] = useState(null);
   const [selfName, setSelfName] = useState("You");
+  const [clock, setClock] = useState(null);
+  const [clockNow, setClockNow] = useState(Date.now());
 
   // Use audio detection hook
   const isSpeaking = useAudioDetection(isMuted, 30);
@@ -105,6 +112,9 @@ export default function Room() {
 
       if (data.type === "room_state") {
         setSelfId(data.self.id);
+        selfRoleRef.current =
+          data.self.role === "Challenger" ? "ATTACKER" : "DEFENDER";
+        setClock(data.clock || null);
 
         // Remove duplicate self entries
         const others = data.participants.filter((p) => p.id !== data.self.id);
@@ -138,11 +148,61 @@ export default function Room() {
         if (data.user_id === "opponent") {
           setIsOpponentSpeaking(data.isSpeaking);
         }
-      } else if (data.type === "speech_transcript") {
+      } else if (data.type === "transcript_snapshot") {
+        transcriptSeqRef.current[data.speaker] = data.seq;
+        setLiveTranscripts((prev) => ({ ...prev, [data.speaker]: data.text }));
+      } else if (data.type === "transcript_delta") {
+        const last = transcriptSeqRef.current[data.speaker];
+        if (last === undefined || data.seq !== last + 1) {
+          socket.send(JSON.stringify({ type: "transcript_resync" }));
+          return;
+        }
+        transcriptSeqRef.current[data.speaker] = data.seq;
         setLiveTranscripts((prev) => ({
           ...prev,
-          [data.sender || "Opponent"]: data.transcript || "",
+          [data.speaker]: (prev[data.speaker] || "").slice(0, data.at) + data.text,
+        }));
+      } else if (data.type === "turn_started") {
+        setClock({
+          turnNumber: data.turnNumber,
+          speakerRole: data.speakerRole,
+          endsAt: data.endsAt,
+          running: true,
+          finished: false,
+        });
+        setChatMessages((prev) => [
+          ...prev,
+          {
+            id: Date.now(),
+            sender: "System",
+            text:
+              data.speakerRole === selfRoleRef.current
+                ? `Turn ${data.turnNumber}: you have the floor`
+                : `Turn ${data.turnNumber}: your opponent has the floor`,
+            timestamp: new Date(),
+            isSystem: true,
+          },
+        ]);
+      } else if (data.type === "turn_ended") {
+        setClock((prev) => ({
+          ...(prev || {}),
+          turnNumber: data.turnNumber,
+          speakerRole: null,
+          endsAt: null,
+          running: false,
+          finished: Boolean(data.final),
         }));
+        if (data.speakerRole === selfRoleRef.current) {
+          // The server has already closed this turn's transcript
+          try {
+            liveRecognizerRef.current?.stop();
+          } catch (err) {}
+          selfCommittedRef.current = "";
+          setIsListening(false);
+        }
+      } else if (data.type === "turn_rejected") {
+        if (data.clock) setClock(data.clock);
+        setLiveError(data.reason || "Not your turn");
       }
     };
 
@@ -169,6 +229,21 @@ export default function Room() {
     chatEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [chatMessages]);
 
+  // Tick the turn countdown while the clock runs
+  useEffect(() => {
+    if (!clock?.running) return;
+    const timer = setInterval(() => setClockNow(Date.now()), 250);
+    return () => clearInterval(timer);
+  }, [clock?.running]);
+
+  const isMyTurn = Boolean(
+    clock?.running && clock.speakerRole === selfRoleRef.current
+  );
+  const secondsLeft =
+    clock?.running && clock.endsAt
+      ? Math.max(0, Math.ceil(clock.endsAt - clockNow / 1000))
+      : null;
+
   // Send speaking status to server when it changes
   useEffect(() => {
     if (socketRef.current && socketRef.current.readyState === WebSocket.OPEN) {
@@ -191,6 +266,10 @@ export default function Room() {
     );
   }
 
+  function endTurn() {
+    socketRef.current?.send(JSON.stringify({ type: "end_turn" }));
+  }
+
   function handleLeaveRoom() {
     setShowExitModal(true);
   }
@@ -319,21 +398,23 @@ export default function Room() {
       const text = (res[0]?.transcript || "").trim();
       if (!text) return;
 
+      // Committed text plus the current hypothesis, which interim results replace
       const selfLabel = currentEmailRef.current || "You";
-      setLiveTranscripts((prev) => {
-        const existing = prev[selfLabel] || "";
-        const updated = existing ? `${existing} ${text}` : text;
-        return { ...prev, [selfLabel]: updated };
-      });
-
+      const committed = selfCommittedRef.current;
+      const updated = committed ? `${committed} ${text}` : text;
       if (res.isFinal) {
-        socketRef.current?.send(
-          JSON.stringify({
-            type: "speech_transcript",
-            transcript: text,
-          })
-        );
+        selfCommittedRef.current = updated;
       }
+      setLiveTranscripts((prev) => ({ ...prev, [selfLabel]: updated }));
+
+      // The server keeps the canonical text and sends the opponent only deltas
+      socketRef.current?.send(
+        JSON.stringify({
+          type: "transcript_update",
+          text,
+          final: res.isFinal,
+        })
+      );
     };
 
     recognizer.onerror = (e) => {
@@ -369,22 +450,9 @@ export default function Room() {
       } catch (e) {}
     }
     setIsListening(false);
-    // Persist the latest text for "You"
-    const selfLabel = currentEmailRef.current || "You";
-    const text = liveTranscripts[selfLabel];
-    if (text && text.trim()) {
-      fetch(`${API_BASE}/transcribe_text/`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          text,
-          speaker: selfLabel,
-          room_code: roomCode || "",
-        }),
-      }).catch(() => {
-        // ignore errors here to not disrupt UI
-      });
-    }
+    // The server persists the turn's text once
+    selfCommittedRef.current = "";
+    socketRef.current?.send(JSON.stringify({ type: "transcript_end" }));
   }
 
   useEffect(() => {
@@ -682,6 +750,44 @@ export default function Room() {
           })}
         </div>
 
+        {/* Debate Clock */}
+        {clock && (clock.running || clock.finished) && (
+          <div
+            className={`mb-6 flex items-center justify-between rounded-xl border px-6 py-4 ${
+              isMyTurn
+                ? "bg-green-500/10 border-green-500/40"
+                : "bg-slate-800/50 border-purple-500/30"
+            }`}
+          >
+            <div>
+              <p className="text-white font-bold">
+                {clock.finished
+                  ? "Debate finished"
+                  : isMyTurn
+                  ? "Your turn"
+                  : "Opponent's turn"}
+              </p>
+              <p className="text-gray-400 text-sm">Turn {clock.turnNumber}</p>
+            </div>
+            <div className="flex items-center gap-4">
+              {secondsLeft !== null && (
+                <span className="text-2xl font-mono text-white">
+                  {Math.floor(secondsLeft / 60)}:
+                  {String(secondsLeft % 60).padStart(2, "0")}
+                </span>
+              )}
+              {isMyTurn && (
+                <button
+                  onClick={endTurn}
+                  className="px-4 py-2 rounded-lg bg-purple-600 hover:bg-purple-700 text-white font-semibold text-sm transition-all"
+                >
+                  End turn
+                </button>
+              )}
+            </div>
+          </div>
+        )}
+
         {/* Debate Info Panel */}
         <div className="relative group mb-8">
           <div className="absolute inset-0 bg-gradient-to-r from-purple-500 to-pink-500 rounded-2xl blur-xl opacity-20"></div>